@@ -5,95 +5,1672 @@
 # Uses encapsulation (private variables), inheritance, and polymorphism.
 # Updated to allow user-driven deposit and withdrawal operations via terminal input.
 # Currency changed to USD.
+# Every change is written to an append-only ledger, so the bank survives restarts.
+# Money is kept as integer cents, so balances never pick up floating point rounding errors.
 
-import random  # For generating random account numbers
+import argparse
+import asyncio
+import contextlib
+import csv
+import json
+import math
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batch interest accrual falls back to plain Python
+    np = None
+
+DAYS_PER_YEAR = 365
+EXACT_FLOAT_CENTS = 10 ** 15  # Below this many cents, cents / 100 still formats to the exact amount
+MAX_BALANCE_CENTS = 2 ** 63 - 1  # Largest balance the typed (64-bit) history arrays can hold
+HISTORY_MAX_ENTRIES = 1000000  # Balance changes kept in memory per account before the oldest half is dropped
+COMPOUNDING = ("daily", "simple")  # Schedules for accruing annual interest rates over a number of days
+
+# Luhn digit sums of every 3-digit group, for a group whose first and third digits are doubled
+# (LUHN_OUTER) or whose middle digit is doubled (LUHN_MIDDLE); a 9-digit payload is three groups
+_LUHN_DOUBLED = [0, 2, 4, 6, 8, 1, 3, 5, 7, 9]
+LUHN_OUTER = [_LUHN_DOUBLED[n // 100] + n // 10 % 10 + _LUHN_DOUBLED[n % 10] for n in range(1000)]
+LUHN_MIDDLE = [n // 100 + _LUHN_DOUBLED[n // 10 % 10] + n % 10 for n in range(1000)]
+
+class AccountNumberAllocator:
+    """
+    Hands out unique 10-digit account numbers: a 9-digit sequence followed by a Luhn check digit,
+    so a mistyped digit is caught before any lookup. allocate() is thread-safe; parallel creators
+    can reserve() a block of sequences once and turn them into numbers without further locking.
+    """
+    FIRST_SEQUENCE = 100000000
+    LAST_SEQUENCE = 999999999
+
+    def __init__(self, next_sequence=FIRST_SEQUENCE):
+        self._next = next_sequence
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def number_for(sequence):
+        """Account number for a sequence: the sequence with its Luhn check digit appended"""
+        total = LUHN_OUTER[sequence % 1000] + LUHN_MIDDLE[sequence // 1000 % 1000] + LUHN_OUTER[sequence // 1000000]
+        return sequence * 10 + (10 - total % 10) % 10
+
+    @classmethod
+    def is_valid(cls, number):
+        """True if number has a correct check digit"""
+        return cls.FIRST_SEQUENCE * 10 <= number <= cls.LAST_SEQUENCE * 10 + 9 and cls.number_for(number // 10) == number
+
+    def reserve(self, count):
+        """Reserve count consecutive sequences (a range) for a caller that creates accounts in parallel"""
+        with self._lock:
+            start = self._next
+            if start + count - 1 > self.LAST_SEQUENCE:
+                raise RuntimeError("Account numbers exhausted")
+            self._next = start + count
+        return range(start, start + count)
+
+    def allocate(self):
+        """The next unused account number"""
+        with self._lock:
+            sequence = self._next
+            if sequence > self.LAST_SEQUENCE:
+                raise RuntimeError("Account numbers exhausted")
+            self._next = sequence + 1
+        return self.number_for(sequence)
+
+    def observe(self, number):
+        """Make sure a number that is already in use (e.g. restored from disk) is never handed out again"""
+        with self._lock:
+            if number // 10 >= self._next:
+                self._next = number // 10 + 1
+
+account_numbers = AccountNumberAllocator()  # Numbers for new accounts in this process
+
+def to_cents(amount):
+    """Convert a USD amount (int, float, str or Decimal) to integer cents, rounding half to even"""
+    if type(amount) is int:
+        return amount * 100
+    if type(amount) is float:
+        return round(amount * 100)  # round() on a float is already banker's rounding
+    return int((Decimal(amount) * 100).to_integral_value(ROUND_HALF_EVEN))
+
+def format_usd(cents):
+    """Format integer cents as a USD amount, e.g. 123456 -> '1234.56'"""
+    if -EXACT_FLOAT_CENTS < cents < EXACT_FLOAT_CENTS:
+        return f"{cents / 100:.2f}"  # Exact in this range, and faster than divmod
+    dollars, rest = divmod(abs(cents), 100)
+    return f"{'-' if cents < 0 else ''}{dollars}.{rest:02d}"
+
+def accrued_interest(balance, rate, days, compounding="daily"):
+    """Interest in cents earned on balance (cents) at annual rate over days, rounded half to even"""
+    if compounding == "daily":
+        return round(balance * math.expm1(days * math.log1p(rate / DAYS_PER_YEAR)))
+    return round(balance * rate * days / DAYS_PER_YEAR)
+
+def to_timestamp(moment):
+    """POSIX timestamp for a datetime, a date (its midnight, local time) or a timestamp"""
+    if isinstance(moment, datetime):
+        return moment.timestamp()
+    if isinstance(moment, date):
+        return datetime.combine(moment, datetime.min.time()).timestamp()
+    return float(moment)
+
+class AccountHistory:
+    """
+    Time-ordered balance changes of one account, kept in two typed arrays (40 bytes per change):
+    the times, and for each change its signed amount, the balance after it, the other account
+    of a transfer (or 0) and its kind, so balance_at() and window() can bisect by time. Once
+    max_entries changes are held, the oldest half is dropped and replaced by a checkpoint: the time
+    up to which changes were dropped and the balance at that point. Changes before the checkpoint
+    are only available from the ledger.
+    """
+    KINDS = ("open", "deposit", "withdraw", "interest", "transfer_in", "transfer_out")
+    KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+    FIELDS = 4  # amount, balance, counterparty, kind
+
+    def __init__(self, start_balance, max_entries=HISTORY_MAX_ENTRIES):
+        self.max_entries = max_entries  # None keeps every change
+        self.checkpoint_ts = None  # Changes up to this time were dropped (None: nothing dropped)
+        self.checkpoint_balance = start_balance  # Balance before the first change that is kept
+        self.times = array('d')
+        self.changes = array('q')  # FIELDS values per change, amounts and balances in cents
+
+    def append(self, ts, kind, amount, balance, counterparty=0):
+        times = self.times
+        if times and ts < times[-1]:
+            ts = times[-1]  # Keep the history sorted even if the clock steps back
+        if self.max_entries and len(times) >= self.max_entries:
+            self._checkpoint()
+        times.append(ts)
+        self.changes.extend((amount, balance, counterparty, self.KIND_CODES[kind]))
+
+    def _checkpoint(self):
+        """Drop the oldest half of the changes, remembering where the kept history starts"""
+        cut = len(self.times) // 2
+        self.checkpoint_ts = self.times[cut - 1]
+        self.checkpoint_balance = self.changes[(cut - 1) * self.FIELDS + 1]
+        del self.times[:cut]
+        del self.changes[:cut * self.FIELDS]
+
+    def _balance_before(self, i):
+        """Balance before the i-th kept change"""
+        return self.changes[(i - 1) * self.FIELDS + 1] if i else self.checkpoint_balance
+
+    def balance_at(self, ts):
+        """Balance after every change made at or before ts"""
+        return self._balance_before(bisect_right(self.times, ts))
+
+    def window(self, start, end):
+        """(opening balance, changes in [start, end) as (ts, kind, amount, balance, counterparty), closing balance)"""
+        lo = bisect_left(self.times, start)
+        hi = bisect_left(self.times, end)
+        changes = self.changes
+        listed = [(self.times[i], self.KINDS[changes[i * 4 + 3]], changes[i * 4], changes[i * 4 + 1], changes[i * 4 + 2])
+                  for i in range(lo, hi)]
+        return self._balance_before(lo), listed, self._balance_before(hi)
+
+    def nbytes(self):
+        return self.times.itemsize * len(self.times) + self.changes.itemsize * len(self.changes)
+
+class VelocityRule:
+    """
+    A limit on what an account may send (withdrawals and outgoing transfers) within a rolling window,
+    e.g. at most 5 withdrawals or 2000 USD per hour. The window is counted in buckets of
+    window / buckets seconds, so it slides one bucket at a time. Each account that sends money keeps
+    one fixed-size counter per rule: the current bucket, running count and sum, and the count and sum
+    of every bucket. Buckets that fall out of the window are subtracted as time passes them, so a check
+    is amortized O(1) and memory per account is bounded. Counters live in memory only.
+    """
+    KINDS = ("withdraw", "transfer")
+    UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+    def __init__(self, window=3600, max_count=None, max_amount=None, kinds=KINDS, buckets=12):
+        if max_count is None and max_amount is None:
+            raise ValueError("a velocity rule needs max_count or max_amount")
+        self.window = window  # Seconds
+        self.max_count = max_count
+        self.max_amount = to_cents(max_amount) if max_amount is not None else None  # In cents
+        self.kinds = tuple(kinds)
+        self.buckets = buckets
+        self.bucket_width = window / buckets
+        self._empty = array('q', [0]) * (3 + 2 * buckets)  # Bucket, count, sum, counts per bucket, sums per bucket
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Build a rule from key=value words, e.g. "window=1h max_count=5" or
+        "window=1d max_amount=10000 kinds=withdraw". Raises ValueError if invalid.
+        """
+        options = {}
+        for word in text.split():
+            key, separator, value = word.partition("=")
+            if not separator or not value:
+                raise ValueError(f"expected key=value, got {word!r}")
+            if key == "window":
+                unit = value[-1] if value[-1] in cls.UNITS else "s"
+                options["window"] = float(value.rstrip("".join(cls.UNITS))) * cls.UNITS[unit]
+            elif key in ("max_count", "buckets"):
+                options[key] = int(value)
+            elif key == "max_amount":
+                options[key] = Decimal(value)
+            elif key == "kinds":
+                options[key] = value.split(",")
+                if not set(options[key]) <= set(cls.KINDS):
+                    raise ValueError(f"kinds must be among {', '.join(cls.KINDS)}")
+            else:
+                raise ValueError(f"unknown velocity rule option {key!r}")
+        return cls(**options)
+
+    def describe(self):
+        limits = [f"{self.max_count} {'/'.join(self.kinds)}s" if self.max_count is not None else "",
+                  f"{format_usd(self.max_amount)} USD" if self.max_amount is not None else ""]
+        return f"at most {' or '.join(limit for limit in limits if limit)} per {self.window:g}s"
+
+    def new_counter(self):
+        return array('q', self._empty)
+
+    def consume(self, state, amount, ts):
+        """
+        Count amount (cents) sent at ts against the account whose counter is state, or return
+        why it would break this rule (counting nothing). Buckets that have left the window
+        are subtracted first.
+        """
+        bucket = int(ts // self.bucket_width)
+        if bucket > state[0]:
+            buckets = self.buckets
+            if bucket - state[0] >= buckets:
+                state[1:] = self._empty[1:]  # The whole window has passed
+            else:
+                for passed in range(state[0] + 1, bucket + 1):
+                    slot = passed % buckets
+                    state[1] -= state[3 + slot]
+                    state[2] -= state[3 + buckets + slot]
+                    state[3 + slot] = state[3 + buckets + slot] = 0
+            state[0] = bucket  # (A clock that steps back keeps counting in the current bucket)
+        count, total = state[1], state[2] + amount
+        if (self.max_count is not None and count >= self.max_count) or \
+                (self.max_amount is not None and total > self.max_amount):
+            return f"Velocity limit reached: {self.describe()}."
+        slot = 3 + state[0] % self.buckets
+        state[1] = count + 1
+        state[2] = total
+        state[slot] += 1
+        state[slot + self.buckets] += amount
+        return None
+
+    def refund(self, state, amount):
+        """Undo a consume() that another rule then refused"""
+        slot = 3 + state[0] % self.buckets
+        state[1] -= 1
+        state[2] -= amount
+        state[slot] -= 1
+        state[slot + self.buckets] -= amount
 
 class BankAccount:
-    def __init__(self, owner_name, initial_balance=0):
+    def __init__(self, owner_name, initial_balance=0, account_number=None):
         self.owner_name = owner_name
-        self._account_number = self._generate_account_number()  # Private variable
-        self._balance = initial_balance  # Private variable for encapsulation
+        # Private variable; an existing number is passed in when an account is restored from disk
+        if account_number:
+            account_numbers.observe(account_number)
+        self._account_number = account_number or self._generate_account_number()
+        self._balance = to_cents(initial_balance)  # Private variable for encapsulation, in cents
+        if self._balance > MAX_BALANCE_CENTS:
+            raise ValueError("Initial balance is larger than the largest supported balance.")
+        self._ledger = None  # Set by Bank.add_account; every balance change is recorded there
+        self._lock = threading.Lock()  # Held while the balance is checked and changed (and recorded)
+        self._history = None  # AccountHistory, created with the first change
+        self._limits = ()  # The bank's velocity rules, checked when money leaves the account
+        self._counters = None  # One counter per velocity rule, created when money first leaves
 
     def _generate_account_number(self):
-        """Private method to generate a random account number"""
-        return random.randint(1000000000, 9999999999)
+        """Private method to generate a new, unique account number"""
+        return account_numbers.allocate()
 
-    def deposit(self, amount):
-        if amount > 0:
+    def _remember(self, ts, kind, amount, counterparty=0):
+        """Add a change that was just applied (signed amount in cents) to the account's history"""
+        if self._history is None:
+            self._history = AccountHistory(self._balance - amount)
+        self._history.append(ts, kind, amount, self._balance, counterparty)
+
+    def _record(self, op, amount):
+        """Write a balance change (in cents) to the history and the bank's ledger (if the account belongs to a bank)"""
+        ts = time.time()
+        self._remember(ts, op, -amount if op == "withdraw" else amount)
+        if self._ledger is not None:
+            self._ledger.record(op, ts=ts, account=self._account_number, amount=amount, balance=self._balance)
+
+    def _deposit(self, amount):
+        """Deposit amount (in cents) without printing; returns why it failed, or None"""
+        if amount <= 0:
+            return "Deposit amount must be positive."
+        with self._lock:
+            if amount > MAX_BALANCE_CENTS - self._balance:
+                return "Deposit would exceed the largest supported balance."
             self._balance += amount
-            print(f"{amount} USD deposited to account {self._account_number}.")
-        else:
-            print("Deposit amount must be positive.")
+            self._record("deposit", amount)
+        return None
 
-    def withdraw(self, amount):
-        if amount > 0:
-            if self._balance >= amount:
+    def deposit(self, amount):
+        amount = to_cents(amount)
+        error = self._deposit(amount)
+        if error:
+            print(error)
+            return False
+        print(f"{format_usd(amount)} USD deposited to account {self._account_number}.")
+        return True
+
+    def _check_withdraw(self, amount):
+        """Return why amount (in cents) cannot be withdrawn, or None if it can"""
+        if amount <= 0:
+            return "Withdrawal amount must be positive."
+        if self._balance < amount:
+            return "Insufficient balance."
+        return None
+
+    def _consume_limits(self, kind, amount):
+        """Check amount (cents) against the velocity rules and count it if all pass; returns why not, or None"""
+        ts = time.time()
+        limits, counters = self._limits, self._counters
+        if counters is None or len(counters) < len(limits):
+            counters = self._counters = (counters or []) + [rule.new_counter() for rule in limits[len(counters or ()):]]
+        for index, rule in enumerate(limits):
+            if kind in rule.kinds:
+                error = rule.consume(counters[index], amount, ts)
+                if error:
+                    for earlier in range(index):  # Rare: take back what the earlier rules counted
+                        if kind in limits[earlier].kinds:
+                            limits[earlier].refund(counters[earlier], amount)
+                    return error
+        return None
+
+    def _withdraw(self, amount):
+        """Withdraw amount (in cents) without printing; returns why it failed, or None"""
+        with self._lock:
+            error = self._check_withdraw(amount)
+            if not error and self._limits:
+                error = self._consume_limits("withdraw", amount)
+            if not error:
                 self._balance -= amount
-                print(f"{amount} USD withdrawn from account {self._account_number}.")
-            else:
-                print("Insufficient balance.")
-        else:
-            print("Withdrawal amount must be positive.")
+                self._record("withdraw", amount)
+        return error
+
+    def withdraw(self, amount):
+        amount = to_cents(amount)
+        error = self._withdraw(amount)
+        if error:
+            print(error)
+            return False
+        print(f"{format_usd(amount)} USD withdrawn from account {self._account_number}.")
+        return True
 
     def get_balance(self):
+        """Balance in USD, as an exact Decimal"""
+        return Decimal(self._balance).scaleb(-2)
+
+    def get_balance_cents(self):
         return self._balance
 
     def get_account_number(self):
         return self._account_number
 
+    def to_dict(self):
+        """Account state for a snapshot (balance in cents)"""
+        return {"type": "checking", "account_number": self._account_number,
+                "owner_name": self.owner_name, "balance": self._balance}
+
     def __str__(self):
-        return f"Bank account {self._account_number} owned by {self.owner_name} with balance {self._balance} USD"
+        return f"Bank account {self._account_number} owned by {self.owner_name} with balance {format_usd(self._balance)} USD"
 
 class SavingsAccount(BankAccount):
-    def __init__(self, owner_name, initial_balance=0, interest_rate=0.05):
-        super().__init__(owner_name, initial_balance)
-        self.interest_rate = interest_rate  # Interest rate (e.g., 5%)
+    def __init__(self, owner_name, initial_balance=0, interest_rate=0.05, account_number=None, accrued_through=None):
+        super().__init__(owner_name, initial_balance, account_number)
+        self.interest_rate = interest_rate  # Interest rate (e.g., 5%); annual when interest is accrued by days
+        self.accrued_through = accrued_through or date.today()  # Interest is accrued up to this date
 
     def apply_interest(self):
-        interest = self._balance * self.interest_rate
-        self._balance += interest
-        print(f"Interest of {interest} USD applied to account {self.get_account_number()}.")
+        with self._lock:
+            interest = round(self._balance * self.interest_rate)  # Whole cents, rounded half to even
+            self._balance += interest
+            self._record("interest", interest)
+        print(f"Interest of {format_usd(interest)} USD applied to account {self.get_account_number()}.")
 
-    # Polymorphism: override withdraw method to add restriction
-    def withdraw(self, amount):
-        if amount > self._balance * 0.9:  # Cannot withdraw more than 90% of balance
-            print("Cannot withdraw more than 90% of balance in a savings account.")
-        else:
-            super().withdraw(amount)
+    def accrue_interest(self, as_of=None, compounding="daily"):
+        """Accrue the annual interest rate from accrued_through up to as_of (default today); returns the cents added"""
+        as_of = as_of or date.today()
+        with self._lock:
+            if as_of <= self.accrued_through:
+                return 0
+            interest = accrued_interest(self._balance, self.interest_rate, (as_of - self.accrued_through).days,
+                                        compounding)
+            self._balance += interest
+            self.accrued_through = as_of
+            ts = time.time()
+            self._remember(ts, "interest", interest)
+            if self._ledger is not None:
+                self._ledger.record("interest", ts=ts, account=self._account_number, amount=interest,
+                                    balance=self._balance, as_of=as_of.isoformat())
+        print(f"Interest of {format_usd(interest)} USD accrued to account {self.get_account_number()} through {as_of}.")
+        return interest
+
+    # Polymorphism: override the withdraw check to add a restriction
+    def _check_withdraw(self, amount):
+        if amount * 10 > self._balance * 9:  # Cannot withdraw more than 90% of balance
+            return "Cannot withdraw more than 90% of balance in a savings account."
+        return super()._check_withdraw(amount)
+
+    def to_dict(self):
+        return dict(super().to_dict(), type="savings", interest_rate=self.interest_rate,
+                    accrued_through=self.accrued_through.isoformat())
+
+def account_from_dict(data):
+    """Rebuild an account from a snapshot or ledger record"""
+    if data["type"] == "savings":
+        accrued_through = data.get("accrued_through")
+        account = SavingsAccount(data["owner_name"], 0, data["interest_rate"], data["account_number"],
+                                 date.fromisoformat(accrued_through) if accrued_through else None)
+    else:
+        account = BankAccount(data["owner_name"], 0, data["account_number"])
+    account._balance = data["balance"]
+    return account
+
+class Ledger:
+    """
+    Append-only transaction log (one JSON object per line) with group commit:
+    records are buffered and written with a single fsync once fsync_every records are
+    waiting, or at the latest every fsync_interval seconds (by a background thread).
+    Each record carries the resulting balance, so replaying it is idempotent. Amounts are in cents.
+    """
+
+    def __init__(self, path="bank_ledger.jsonl", fsync_every=256, fsync_interval=0.005):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.seq = 0  # Number of the last record
+        self.offset = 0  # Bytes of the ledger file that are written and synced
+        self.durable_seq = 0  # Every record up to this number is written and synced
+        self.checkpoint = None  # Called every checkpoint_every records (Bank.snapshot)
+        self.checkpoint_every = None
+        self.checkpoint_seq = 0  # seq covered by the latest snapshot
+        self._checkpoint_due = False  # A snapshot was claimed; the background thread takes it
+        self._pending = []  # Encoded records waiting for the next group commit
+        self._lock = threading.Lock()  # Protects seq and _pending
+        self._io_lock = threading.Lock()  # Serializes writes and fsyncs, so batches stay in order
+        self._file = None
+        self._stop = threading.Event()
+        self._flusher = None
+
+    def replay(self, offset=0):
+        """
+        Yield the records stored after byte offset, then open the ledger for appending.
+        A torn or corrupt tail (from a crash in the middle of a write) is cut off.
+        """
+        good_offset = offset
+        if os.path.exists(self.path):
+            for record, good_offset in self.read(offset):
+                self.seq = record["seq"]
+                yield record
+            if good_offset < os.path.getsize(self.path):
+                with open(self.path, 'r+b') as f:
+                    f.truncate(good_offset)
+                print(f"Ledger recovered: dropped incomplete data after byte {good_offset}.")
+        self.offset = good_offset
+        self.open()
+
+    def read(self, offset=0):
+        """Yield (record, offset after it) for every complete record stored after byte offset"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                offset += len(line)
+                yield record, offset
+
+    def open(self):
+        """Open the ledger for appending and start the background group-commit thread"""
+        if self._file is None:
+            self.durable_seq = self.seq
+            self._file = open(self.path, 'ab')
+            self.offset = self._file.tell()
+            self._stop.clear()
+            self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._flusher.start()
+
+    def record(self, op, ts=None, **fields):
+        """Append a record; it is durable after the next group commit. Returns its sequence number."""
+        with self._lock:
+            self.seq += 1
+            seq = self.seq
+            self._pending.append(json.dumps(dict(seq=seq, ts=ts or time.time(), op=op, **fields)))
+            full = len(self._pending) >= self.fsync_every
+            if (self.checkpoint and self.checkpoint_every and not self._checkpoint_due
+                    and seq - self.checkpoint_seq >= self.checkpoint_every):
+                # Claimed under the lock so only one snapshot starts; it runs on the background
+                # thread, not here where the caller may still hold account locks
+                self._checkpoint_due = True
+        if full:
+            self.sync()
+        return seq
+
+    def sync(self):
+        """Write and fsync every pending record now"""
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                seq = self.seq  # Every record up to here is in this batch or an earlier one
+            if batch and self._file is not None:
+                data = ("\n".join(batch) + "\n").encode()
+                self._file.write(data)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self.offset += len(data)
+                self.durable_seq = seq
+            elif batch:
+                with self._lock:
+                    self._pending[:0] = batch  # Not open yet; keep them for later
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.fsync_interval):
+            if self._pending:
+                self.sync()
+            if self._checkpoint_due:
+                try:
+                    self.checkpoint()
+                except Exception as e:  # Keep committing records; the next checkpoint tries again
+                    print(f"Snapshot failed: {e}")
+                finally:
+                    self._checkpoint_due = False
+
+    def close(self):
+        """Stop the background thread, commit everything pending and close the file"""
+        if self._file is not None:
+            self._stop.set()
+            self._flusher.join()
+            self.sync()
+            self._file.close()
+            self._file = None
 
 class Bank:
-    def __init__(self):
+    def __init__(self, ledger=None, snapshot_path=None, snapshot_every=100000):
         self.accounts = {}  # Dictionary to store accounts with account number as key
+        self.owners = {}  # Case-folded owner name -> list of that owner's account numbers
+        self.velocity_rules = []  # VelocityRule limits on withdrawals and outgoing transfers (shared with accounts)
+        self._lock = threading.Lock()  # Protects adding accounts
+        self.ledger = ledger  # Ledger recording every change (None keeps the bank in memory only)
+        self.snapshot_path = snapshot_path  # Where snapshot() writes all balances
+        # Account histories in memory are complete from this time on (earlier changes are only in the ledger)
+        self.history_since = 0
+        if ledger is not None and snapshot_path:
+            ledger.checkpoint = self.snapshot
+            ledger.checkpoint_every = snapshot_every  # Bounds how much ledger recovery has to replay
 
-    def add_account(self, account):
+    @classmethod
+    def recover(cls, ledger_path="bank_ledger.jsonl", snapshot_path="bank_snapshot.json", snapshot_every=100000,
+                **ledger_options):
+        """Rebuild a bank from its latest snapshot plus the ledger records written after it"""
+        start = time.perf_counter()
+        ledger = Ledger(ledger_path, **ledger_options)
+        bank = cls(ledger, snapshot_path, snapshot_every)
+        offset = 0
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            for data in state["accounts"]:
+                bank._index_account(account_from_dict(data))
+            offset = state["offset"]
+            ledger.seq = ledger.checkpoint_seq = state["seq"]
+            bank.history_since = state.get("ts", 0)
+        replayed = 0
+        for record in ledger.replay(offset):
+            if record["seq"] <= ledger.checkpoint_seq:
+                continue  # Written before the snapshot; its balances already include it
+            bank._apply(record)
+            replayed += 1
+        if bank.accounts or replayed:
+            print(f"Recovered {len(bank.accounts)} accounts ({replayed} ledger records after the snapshot) "
+                  f"in {time.perf_counter() - start:.2f}s.")
+        return bank
+
+    def _apply(self, record):
+        """Apply one ledger record while recovering (and add it to the account histories)"""
+        op, ts = record["op"], record["ts"]
+        if op == "open":
+            account = account_from_dict(record["account"])
+            if account.get_account_number() in self.accounts:
+                return  # Opened while the snapshot was taken; the snapshot has it (with newer balances)
+            self._index_account(account)
+            account._remember(ts, "open", account._balance)
+        elif op == "transfer":
+            from_acc, to_acc = self.accounts[record["from"]], self.accounts[record["to"]]
+            from_acc._balance = record["from_balance"]
+            to_acc._balance = record["to_balance"]
+            from_acc._remember(ts, "transfer_out", -record["amount"], record["to"])
+            to_acc._remember(ts, "transfer_in", record["amount"], record["from"])
+        elif op == "accrue":
+            as_of = date.fromisoformat(record["as_of"])
+            for number, balance in zip(record["accounts"], record["balances"]):
+                account = self.accounts[number]
+                interest = balance - account._balance
+                account._balance = balance
+                account.accrued_through = as_of
+                account._remember(ts, "interest", interest)
+        else:  # deposit, withdraw, interest
+            account = self.accounts[record["account"]]
+            account._balance = record["balance"]
+            account._remember(ts, op, -record["amount"] if op == "withdraw" else record["amount"])
+            if "as_of" in record:
+                account.accrued_through = date.fromisoformat(record["as_of"])
+
+    def snapshot(self):
+        """Write every balance to the snapshot file (atomically), so recovery only replays newer records"""
+        if self.ledger is None or not self.snapshot_path:
+            return
+        self.ledger.sync()
+        offset = self.ledger.offset  # Records after this point are replayed, those up to seq skipped
+        # Every account is locked (in account number order, like transfers) while the balances are read,
+        # so no transfer is caught half done and the balances are exactly those of records up to seq
+        with self._lock:  # Not while an account is being added
+            accounts = sorted(self.accounts.values(), key=BankAccount.get_account_number)
+            locked = []
+            try:
+                for account in accounts:
+                    account._lock.acquire()
+                    locked.append(account)
+                seq = self.ledger.seq
+                state = {"seq": seq, "offset": offset, "ts": time.time(),
+                         "accounts": [account.to_dict() for account in accounts]}
+            finally:
+                for account in locked:
+                    account._lock.release()
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        # The records behind these balances must be durable before the snapshot replaces the old one
+        self.ledger.sync()
+        os.replace(tmp_path, self.snapshot_path)
+        self.ledger.checkpoint_seq = seq
+
+    def close(self):
+        """Commit pending ledger records and close the ledger"""
+        if self.ledger is not None:
+            self.ledger.close()
+
+    def _index_account(self, account):
+        """Store an account under its number and its owner's name"""
         self.accounts[account.get_account_number()] = account
+        self.owners.setdefault(account.owner_name.casefold(), []).append(account.get_account_number())
+        account._ledger = self.ledger
+        account._limits = self.velocity_rules
+
+    def add_account(self, account):
+        with self._lock:
+            if account.get_account_number() in self.accounts:
+                raise ValueError(f"Account number {account.get_account_number()} is already in use.")
+            self._index_account(account)
+            ts = time.time()
+            account._remember(ts, "open", account._balance)
+            if self.ledger is not None:
+                self.ledger.record("open", ts=ts, account=account.to_dict())
         print(f"Account {account.get_account_number()} added to the bank.")
 
+    def add_velocity_rule(self, rule):
+        """Apply a VelocityRule to withdrawals and transfers from every account"""
+        self.velocity_rules.append(rule)
+
     def find_account(self, account_number):
         return self.accounts.get(account_number, None)
 
+    def find_accounts_by_owner(self, owner_name):
+        """All accounts of an owner (case-insensitive), without scanning every account"""
+        return [self.accounts[number] for number in self.owners.get(owner_name.casefold(), ())]
+
+    def _transfer(self, from_acc, to_acc, amount):
+        """Move amount (in cents) between two accounts without printing; returns why it failed, or None"""
+        if amount <= 0:
+            return "Invalid accounts or amount."
+        if from_acc is to_acc:
+            return "Cannot transfer to the same account."
+        # Both accounts are locked for the whole transfer, always in account number order,
+        # so two opposite transfers cannot deadlock waiting for each other
+        first, second = (from_acc, to_acc) if from_acc._account_number < to_acc._account_number else (to_acc, from_acc)
+        with first._lock, second._lock:
+            # The source's own rules (e.g. the savings 90% limit) are checked before any money moves
+            error = from_acc._check_withdraw(amount)
+            if not error and amount > MAX_BALANCE_CENTS - to_acc._balance:
+                error = "Transfer would exceed the largest supported balance."
+            if not error and from_acc._limits:
+                error = from_acc._consume_limits("transfer", amount)
+            if not error:
+                from_acc._balance -= amount
+                to_acc._balance += amount
+                ts = time.time()
+                from_acc._remember(ts, "transfer_out", -amount, to_acc._account_number)
+                to_acc._remember(ts, "transfer_in", amount, from_acc._account_number)
+                if self.ledger is not None:  # One record for both sides, so a crash cannot split a transfer
+                    self.ledger.record("transfer", ts=ts, amount=amount, **{
+                        "from": from_acc._account_number, "to": to_acc._account_number,
+                        "from_balance": from_acc._balance, "to_balance": to_acc._balance})
+        return error
+
     def transfer(self, from_account_number, to_account_number, amount):
         from_acc = self.find_account(from_account_number)
         to_acc = self.find_account(to_account_number)
-        if from_acc and to_acc and amount > 0:
-            if from_acc.get_balance() >= amount:
-                from_acc.withdraw(amount)
-                to_acc.deposit(amount)
-                print(f"Transferred {amount} USD from {from_account_number} to {to_account_number}.")
+        if from_acc and to_acc:
+            amount = to_cents(amount)
+            error = self._transfer(from_acc, to_acc, amount)
+            if error:
+                print(error)
+                return False
+            print(f"Transferred {format_usd(amount)} USD from {from_account_number} to {to_account_number}.")
+            return True
+        print("Invalid accounts or amount.")
+        return False
+
+    def _history_for(self, account_number, since):
+        """
+        The history of an account that covers time since: the one in memory, or, for earlier times,
+        one rebuilt from the whole ledger
+        """
+        account = self.find_account(account_number)
+        if account is None:
+            raise ValueError(f"Account {account_number} not found.")
+        history = account._history
+        covered_from = max(self.history_since, history.checkpoint_ts if history and history.checkpoint_ts else 0)
+        if since >= covered_from:
+            if history is None:  # Unchanged since history_since
+                history = AccountHistory(account._balance)
+            return account, history
+        if self.ledger is None:
+            raise ValueError("History before this time is no longer kept in memory.")
+        self.ledger.sync()
+        history = AccountHistory(0, max_entries=None)
+        balance = 0
+        for record, _ in self.ledger.read():
+            op, ts = record["op"], record["ts"]
+            if op == "open":
+                if record["account"]["account_number"] == account_number:
+                    balance = record["account"]["balance"]
+                    history.append(ts, "open", balance, balance)
+            elif op == "transfer":
+                if record["from"] == account_number:
+                    balance = record["from_balance"]
+                    history.append(ts, "transfer_out", -record["amount"], balance, record["to"])
+                elif record["to"] == account_number:
+                    balance = record["to_balance"]
+                    history.append(ts, "transfer_in", record["amount"], balance, record["from"])
+            elif op == "accrue":
+                if account_number in record["accounts"]:
+                    new_balance = record["balances"][record["accounts"].index(account_number)]
+                    history.append(ts, "interest", new_balance - balance, new_balance)
+                    balance = new_balance
+            elif record["account"] == account_number:
+                balance = record["balance"]
+                history.append(ts, op, -record["amount"] if op == "withdraw" else record["amount"], balance)
+        return account, history
+
+    def balance_at(self, account_number, moment):
+        """Balance in cents of an account at a moment (datetime, date or POSIX timestamp); O(log n)"""
+        ts = to_timestamp(moment)
+        account, history = self._history_for(account_number, ts)
+        with account._lock:
+            return history.balance_at(ts)
+
+    def statement(self, account_number, start, end):
+        """
+        Statement of an account for [start, end) (datetimes, dates or timestamps): a dict with the
+        opening and closing balances and every change in between, amounts in cents
+        """
+        start, end = to_timestamp(start), to_timestamp(end)
+        account, history = self._history_for(account_number, start)
+        with account._lock:
+            opening, changes, closing = history.window(start, end)
+        return {"account_number": account_number, "start": start, "end": end, "opening_balance": opening,
+                "changes": changes, "closing_balance": closing}
+
+    def display_statement(self, account_number, start, end):
+        statement = self.statement(account_number, start, end)
+        print(f"\n--- Statement for account {account_number}: "
+              f"{datetime.fromtimestamp(statement['start']):%Y-%m-%d %H:%M} to "
+              f"{datetime.fromtimestamp(statement['end']):%Y-%m-%d %H:%M} ---")
+        print(f"Opening balance: {format_usd(statement['opening_balance'])} USD")
+        for ts, kind, amount, balance, counterparty in statement["changes"]:
+            other = f" ({'to' if kind == 'transfer_out' else 'from'} {counterparty})" if counterparty else ""
+            print(f"{datetime.fromtimestamp(ts):%Y-%m-%d %H:%M:%S}  {kind + other:<32} {format_usd(amount):>14} "
+                  f"{format_usd(balance):>14}")
+        print(f"Closing balance: {format_usd(statement['closing_balance'])} USD ({len(statement['changes'])} changes)")
+
+    def accrue_interest(self, as_of=None, compounding="daily"):
+        """
+        Accrue interest on every savings account up to as_of (default today) in one pass: the interest
+        for all accounts is computed together (vectorized with NumPy when it is installed) and written
+        to the ledger as a single record. Returns (accounts accrued, total interest in cents).
+        """
+        if compounding not in COMPOUNDING:
+            raise ValueError(f"Unknown compounding schedule: {compounding}")
+        as_of = as_of or date.today()
+        due = [account for account in list(self.accounts.values())
+               if isinstance(account, SavingsAccount) and account.accrued_through < as_of]
+        if not due:
+            return 0, 0
+        # All accounts are locked (in account number order, like transfers) so the batch is all-or-nothing
+        due.sort(key=BankAccount.get_account_number)
+        locked = []
+        try:
+            for account in due:
+                account._lock.acquire()
+                locked.append(account)
+            end = as_of.toordinal()
+            if np is not None:
+                count = len(due)
+                balances = np.fromiter((account._balance for account in due), dtype=float, count=count)
+                rates = np.fromiter((account.interest_rate for account in due), dtype=float, count=count)
+                days = np.fromiter((end - account.accrued_through.toordinal() for account in due),
+                                   dtype=float, count=count)
+                if compounding == "daily":
+                    interest = balances * np.expm1(days * np.log1p(rates / DAYS_PER_YEAR))
+                else:
+                    interest = balances * rates * days / DAYS_PER_YEAR
+                interest = np.rint(interest).astype(np.int64).tolist()  # rint rounds half to even
+            else:
+                interest = [accrued_interest(account._balance, account.interest_rate,
+                                             end - account.accrued_through.toordinal(), compounding) for account in due]
+            ts = time.time()
+            for account, amount in zip(due, interest):
+                account._balance += amount
+                account.accrued_through = as_of
+                account._remember(ts, "interest", amount)
+            if self.ledger is not None:
+                # Stored as columns: much smaller and faster to encode than a row per account
+                self.ledger.record("accrue", ts=ts, as_of=as_of.isoformat(), compounding=compounding,
+                                   accounts=[account._account_number for account in due],
+                                   balances=[account._balance for account in due])
+        finally:
+            for account in locked:
+                account._lock.release()
+        total = sum(interest)
+        print(f"Accrued {format_usd(total)} USD of interest on {len(due)} savings accounts through {as_of}.")
+        return len(due), total
+
+class BatchProcessor:
+    """
+    Applies batch files of transactions (CSV with a header row, or NDJSON) to a Bank.
+    Each entry has a type (deposit, withdraw or transfer), an account, a "to" account for
+    transfers, an amount in USD and optionally an id. The file is streamed in chunks. With more
+    than one worker, the entries are split by account partition (account number % workers) and the
+    partitions are applied in parallel. A transfer between two partitions cannot run inside either,
+    so it is a barrier: the entries before it are finished, then it runs alone, then the entries
+    after it start. Every account thus sees its entries in file order and the outcome (including
+    what is rejected) does not depend on the number of workers. Short stretches between barriers
+    are applied in file order on the calling thread, where a thread pool would only add overhead.
+    Under the GIL the partitions mostly take turns, so more workers rarely make a batch faster.
+    Entries that fail validation or are refused by the bank go to the rejects file with the reason.
+    """
+    MIN_PARALLEL_ENTRIES = 1000  # Shorter stretches between barriers are not worth handing to the pool
+    FIELDS = ["id", "type", "account", "to", "amount"]
+    TYPES = ("deposit", "withdraw", "transfer")
+
+    def __init__(self, bank, workers=1, chunk_size=10000):
+        self.bank = bank
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def read_entries(path):
+        """Yield (line number, entry) from a CSV or NDJSON file; a malformed line yields (line number, None)"""
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            if path.endswith(".csv"):
+                yield from enumerate(csv.DictReader(f), start=2)
+                return
+            for line, text in enumerate(f, start=1):
+                if text.strip():
+                    try:
+                        entry = json.loads(text)
+                    except ValueError:
+                        entry = None
+                    yield line, entry if isinstance(entry, dict) else None
+
+    def _validate(self, entry, seen_ids):
+        """Turn an entry into (kind, account, to_account, cents), or raise ValueError with the reason"""
+        if entry is None:
+            raise ValueError("Malformed entry")
+        kind = entry.get("type")
+        kind = kind.strip().lower() if isinstance(kind, str) else None
+        if kind not in self.TYPES:
+            raise ValueError(f"Unknown transaction type: {entry.get('type')!r}")
+        entry_id = entry.get("id")
+        if entry_id not in (None, ""):
+            if not isinstance(entry_id, str):
+                raise ValueError(f"Invalid entry id: {entry_id!r}")
+            if entry_id in seen_ids:
+                raise ValueError(f"Duplicate entry id: {entry_id}")
+            seen_ids.add(entry_id)
+        try:
+            amount = to_cents(entry.get("amount"))
+        except (InvalidOperation, ValueError, TypeError, OverflowError):
+            raise ValueError(f"Invalid amount: {entry.get('amount')!r}") from None
+        if amount <= 0:
+            raise ValueError("Amount must be positive")
+        accounts = []
+        for field in ("account", "to") if kind == "transfer" else ("account",):
+            try:
+                account = self.bank.find_account(int(entry.get(field)))
+            except (ValueError, TypeError):
+                account = None
+            if account is None:
+                raise ValueError(f"Unknown {'destination ' if field == 'to' else ''}account: {entry.get(field)!r}")
+            accounts.append(account)
+        return kind, accounts[0], accounts[1] if kind == "transfer" else None, amount
+
+    def _apply(self, kind, account, to_account, amount):
+        """Apply one validated entry; returns why the bank refused it, or None"""
+        if kind == "deposit":
+            return account._deposit(amount)
+        if kind == "withdraw":
+            return account._withdraw(amount)
+        return self.bank._transfer(account, to_account, amount)
+
+    def _run_partition(self, entries, errors):
+        for position, operation in entries:
+            errors[position] = self._apply(*operation)
+
+    def _run_segment(self, entries, errors, executor):
+        """Apply entries none of which crosses partitions, in parallel by partition when worth it"""
+        if executor is None or len(entries) < self.MIN_PARALLEL_ENTRIES:
+            self._run_partition(entries, errors)
+            return
+        partitions = [[] for _ in range(self.workers)]
+        for position, operation in entries:
+            partitions[operation[1]._account_number % self.workers].append((position, operation))
+        for future in [executor.submit(self._run_partition, entries, errors) for entries in partitions if entries]:
+            future.result()
+
+    def process(self, path, rejects_path=None, results_path=None):
+        """
+        Apply every entry of the batch file at path. Rejected entries (with line and error) are
+        written to rejects_path (default: next to the input, same format); with results_path, the
+        outcome of every entry is written there as CSV. Returns a summary dict.
+        """
+        start = time.perf_counter()
+        is_csv = path.endswith(".csv")
+        if rejects_path is None:
+            base, extension = os.path.splitext(path)
+            rejects_path = f"{base}.rejects{extension}"
+        summary = {"entries": 0, "applied": 0, "rejected": 0}
+        seen_ids = set()
+        with contextlib.ExitStack() as stack:
+            rejects_file = stack.enter_context(open(rejects_path, 'w', newline='', encoding='utf-8'))
+            if is_csv:
+                rejects_writer = csv.DictWriter(rejects_file, ["line"] + self.FIELDS + ["error"], extrasaction='ignore')
+                rejects_writer.writeheader()
+            results_writer = None
+            if results_path:
+                results_writer = csv.writer(stack.enter_context(open(results_path, 'w', newline='', encoding='utf-8')))
+                results_writer.writerow(["line", "id", "status", "error"])
+            executor = stack.enter_context(ThreadPoolExecutor(self.workers)) if self.workers > 1 else None
+
+            chunk = []
+            for item in self.read_entries(path):
+                chunk.append(item)
+                if len(chunk) >= self.chunk_size:
+                    self._process_chunk(chunk, seen_ids, executor, summary, rejects_file,
+                                        rejects_writer if is_csv else None, results_writer)
+                    chunk = []
+            if chunk:
+                self._process_chunk(chunk, seen_ids, executor, summary, rejects_file,
+                                    rejects_writer if is_csv else None, results_writer)
+        summary["seconds"] = time.perf_counter() - start
+        summary["rejects_path"] = rejects_path
+        return summary
+
+    def _process_chunk(self, chunk, seen_ids, executor, summary, rejects_file, rejects_writer, results_writer):
+        errors = [None] * len(chunk)
+        segment = []  # Entries since the last transfer between two partitions
+        for position, (line, entry) in enumerate(chunk):
+            try:
+                operation = self._validate(entry, seen_ids)
+            except ValueError as e:
+                errors[position] = str(e)
+                continue
+            kind, account, to_account, amount = operation
+            if (to_account is not None and
+                    to_account._account_number % self.workers != account._account_number % self.workers):
+                self._run_segment(segment, errors, executor)
+                segment = []
+                errors[position] = self._apply(*operation)
+            else:
+                segment.append((position, operation))
+        self._run_segment(segment, errors, executor)
+
+        for (line, entry), error in zip(chunk, errors):
+            entry_id = entry.get("id") if entry else None
+            if error:
+                summary["rejected"] += 1
+                if rejects_writer is not None:
+                    rejects_writer.writerow(dict(entry or {}, line=line, error=error))
+                else:
+                    rejects_file.write(json.dumps({"line": line, "entry": entry, "error": error}) + "\n")
+            else:
+                summary["applied"] += 1
+            if results_writer is not None:
+                results_writer.writerow([line, entry_id or "", "rejected" if error else "applied", error or ""])
+        summary["entries"] += len(chunk)
+
+class BankService:
+    """
+    HTTP/JSON front end for a Bank on asyncio. Every account belongs to a partition (account number
+    % partitions) and each partition has a queue served by its own task, so operations on one account
+    run in arrival order while different partitions proceed independently. A transfer between two
+    partitions is queued in both and runs once both queues have reached it. With a ledger, replies
+    are sent only after the change is synced: waiting requests share one fsync (group commit).
+    """
+
+    def __init__(self, bank, partitions=8):
+        self.bank = bank
+        self.partitions = partitions
+        self.queues = []  # One asyncio.Queue per partition, created when the server starts
+        self._waiting = []  # (ledger seq, future) of replies waiting for the next sync
+        self._sync_needed = None  # asyncio.Event, set while replies are waiting
+        self.routes = [
+            ("GET", "/accounts/", self.account_detail),
+            ("POST", "/deposit", self.deposit),
+            ("POST", "/withdraw", self.withdraw),
+            ("POST", "/transfer", self.transfer),
+        ]
+
+    def _account(self, value):
+        try:
+            account = self.bank.find_account(int(value))
+        except (TypeError, ValueError):
+            account = None
+        if account is None:
+            raise LookupError(f"account {value} not found")
+        return account
+
+    def account_detail(self, path, query):
+        """GET /accounts/<number>, or /accounts/<number>/statement?start=YYYY-MM-DD&end=YYYY-MM-DD"""
+        number, _, view = path[len("/accounts/"):].partition("/")
+        account = self._account(number)
+        if view == "statement":
+            start = date.fromisoformat(query.get("start", [date.today().isoformat()])[0])
+            end = date.fromisoformat(query["end"][0]) if "end" in query else start + timedelta(days=1)
+            statement = self.bank.statement(account.get_account_number(), start, end)
+            return 200, {"account_number": account.get_account_number(),
+                         "opening_balance": format_usd(statement["opening_balance"]),
+                         "closing_balance": format_usd(statement["closing_balance"]),
+                         "changes": [{"ts": ts, "kind": kind, "amount": format_usd(amount),
+                                      "balance": format_usd(balance), "counterparty": counterparty or None}
+                                     for ts, kind, amount, balance, counterparty in statement["changes"]]}
+        data = account.to_dict()
+        return 200, dict(data, balance=format_usd(data["balance"]))
+
+    def deposit(self, body):
+        """POST /deposit {"account": ..., "amount": ...}"""
+        account = self._account(body.get("account"))
+        return [account], lambda: account._deposit(to_cents(body.get("amount")))
+
+    def withdraw(self, body):
+        """POST /withdraw {"account": ..., "amount": ...}"""
+        account = self._account(body.get("account"))
+        return [account], lambda: account._withdraw(to_cents(body.get("amount")))
+
+    def transfer(self, body):
+        """POST /transfer {"from": ..., "to": ..., "amount": ...}"""
+        from_acc, to_acc = self._account(body.get("from")), self._account(body.get("to"))
+        return [from_acc, to_acc], lambda: self.bank._transfer(from_acc, to_acc, to_cents(body.get("amount")))
+
+    async def _partition_worker(self, queue):
+        while True:
+            operation, future, meeting = await queue.get()
+            if meeting is not None:  # A transfer queued in two partitions runs when the second one gets to it
+                meeting["arrived"] += 1
+                if meeting["arrived"] < 2:
+                    await meeting["done"].wait()
+                    continue
+            try:
+                future.set_result(operation())
+            except Exception as e:
+                future.set_exception(e)
+            if meeting is not None:
+                meeting["done"].set()
+
+    async def submit(self, accounts, operation):
+        """Run operation in the partitions of the given accounts, in order with their other operations"""
+        partitions = sorted({account.get_account_number() % self.partitions for account in accounts})
+        future = asyncio.get_running_loop().create_future()
+        meeting = {"arrived": 0, "done": asyncio.Event()} if len(partitions) > 1 else None
+        # Queued without awaiting in between, so every queue sees jobs in one global order (no deadlock)
+        for partition in partitions:
+            self.queues[partition].put_nowait((operation, future, meeting))
+        return await future
+
+    async def _durable(self):
+        """Wait until everything recorded so far is synced to the ledger"""
+        ledger = self.bank.ledger
+        if ledger is None or ledger.durable_seq >= ledger.seq:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((ledger.seq, future))
+        self._sync_needed.set()
+        await future
+
+    async def _syncer(self):
+        ledger = self.bank.ledger
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._sync_needed.wait()
+            self._sync_needed.clear()
+            await loop.run_in_executor(None, ledger.sync)  # Requests that arrive meanwhile share the next sync
+            still_waiting = []
+            for seq, future in self._waiting:
+                if seq <= ledger.durable_seq:
+                    future.set_result(None)
+                else:
+                    still_waiting.append((seq, future))
+            self._waiting = still_waiting
+            if still_waiting:
+                self._sync_needed.set()
+
+    async def dispatch(self, method, target, body):
+        """Route one request; returns (status, JSON-ready object)."""
+        path, query = urlsplit(target).path, parse_qs(urlsplit(target).query)
+        for route_method, prefix, handler in self.routes:
+            if method == route_method and (path == prefix or prefix.endswith("/") and path.startswith(prefix)):
+                break
+        else:
+            return 404, {"error": "not found"}
+        try:
+            if method == "GET":
+                # Off the event loop: a statement reaching back past the history in memory reads the
+                # whole ledger, and the partition queues must keep moving meanwhile
+                return await asyncio.get_running_loop().run_in_executor(None, handler, path, query)
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict):
+                return 400, {"error": "the request body must be a JSON object"}
+            accounts, operation = handler(request)
+            error = await self.submit(accounts, operation)
+        except LookupError as e:
+            return 404, {"error": str(e)}
+        except (InvalidOperation, TypeError, OverflowError):
+            return 400, {"error": "invalid amount"}
+        if error:
+            return 409, {"error": error}
+        await self._durable()
+        return 200, {"balances": {str(account.get_account_number()): format_usd(account.get_balance_cents())
+                                  for account in accounts}}
+
+    async def handle_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one keep-alive connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except ValueError as e:
+                    status, payload = 400, {"error": str(e)}
+                data = json.dumps(payload).encode()
+                close = headers.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+                writer.write(f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'OK')}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """Start the partition tasks and listen; returns the asyncio server."""
+        self.queues = [asyncio.Queue() for _ in range(self.partitions)]
+        self._sync_needed = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._partition_worker(queue)) for queue in self.queues]
+        if self.bank.ledger is not None:
+            self._tasks.append(asyncio.create_task(self._syncer()))
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict"}
+
+def serve(bank, host="127.0.0.1", port=8080, partitions=8):
+    """Run the HTTP service until interrupted."""
+    async def run():
+        server = await BankService(bank, partitions).start(host, port)
+        print(f"Serving the bank on http://{host}:{port} (Ctrl+C to stop)")
+        async with server:
+            await server.serve_forever()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("Service stopped.")
+
+def benchmark_ledger(transactions=200000, accounts=1000, fsync_every=256, fsync_interval=0.005):
+    """Measure sustained transactions per second with the durable ledger, and recovery time"""
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        def run(count, **options):
+            ledger_path = os.path.join(tmp_dir, f"ledger-{options['fsync_every']}.jsonl")
+            snapshot_path = os.path.join(tmp_dir, f"snapshot-{options['fsync_every']}.json")
+            with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                bank = Bank.recover(ledger_path, snapshot_path, **options)
+                numbers = []
+                for i in range(accounts):
+                    account = SavingsAccount(f"Owner {i}", 1000) if i % 2 else BankAccount(f"Owner {i}", 1000)
+                    bank.add_account(account)
+                    numbers.append(account.get_account_number())
+                start = time.perf_counter()
+                for i in range(count):
+                    account = bank.accounts[numbers[i % accounts]]
+                    kind = i % 3
+                    if kind == 0:
+                        account.deposit(10)
+                    elif kind == 1:
+                        account.withdraw(5)
+                    else:
+                        bank.transfer(numbers[i % accounts], numbers[(i * 7 + 1) % accounts], 3)
+                bank.close()  # Includes the final group commit
+                elapsed = time.perf_counter() - start
+                balances = {number: account.get_balance() for number, account in bank.accounts.items()}
+                start = time.perf_counter()
+                recovered = Bank.recover(ledger_path, snapshot_path, **options)
+                recovery = time.perf_counter() - start
+                recovered.close()
+            assert {number: account.get_balance() for number, account in recovered.accounts.items()} == balances
+            return elapsed, recovery
+
+        per_record = max(transactions // 100, 100)  # fsync per record is slow; measure a smaller run
+        print(f"Durable ledger, {accounts} accounts, deposits/withdrawals/transfers:")
+        elapsed, recovery = run(per_record, fsync_every=1, fsync_interval=fsync_interval)
+        print(f"  fsync every record:          {per_record / elapsed:10,.0f} tx/s ({per_record:,} tx)")
+        elapsed, recovery = run(transactions, fsync_every=fsync_every, fsync_interval=fsync_interval)
+        print(f"  group commit ({fsync_every} / {fsync_interval * 1000:g} ms): {transactions / elapsed:10,.0f} tx/s "
+              f"({transactions:,} tx)")
+        print(f"  recovery (snapshot + tail):  {recovery:.2f}s")
+
+def stress_transfers(accounts=100, transfers=200000, thread_counts=(1, 2, 4, 8)):
+    """
+    Run random transfers (and some deposits/withdrawals) from several threads at once and check that
+    no money was created or lost and no account went negative. Reports transfers per second per thread count.
+    """
+    import random as rng
+    print(f"Concurrent transfers between {accounts} accounts, {transfers:,} operations per run:")
+    for threads in thread_counts:
+        bank = Bank()
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            for i in range(accounts):
+                bank.add_account(SavingsAccount(f"Owner {i}", 1000) if i % 2 else BankAccount(f"Owner {i}", 1000))
+        numbers = list(bank.accounts)
+        expected_total = sum(account.get_balance_cents() for account in bank.accounts.values())
+        external = [0] * threads  # Net cents each thread deposited and withdrew from outside the bank
+        results = [0] * threads  # Successful transfers per thread
+
+        def worker(index):
+            pick = rng.Random(index).choice
+            for i in range(transfers // threads):
+                if i % 10 == 0:  # Mix in single-account operations that contend for the same locks
+                    account = bank.accounts[pick(numbers)]
+                    if i % 20 == 0:
+                        if account.deposit(7):
+                            external[index] += 700
+                    elif account.withdraw(7):
+                        external[index] -= 700
+                elif bank.transfer(pick(numbers), pick(numbers), 1 + i % 300):
+                    results[index] += 1
+
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            start = time.perf_counter()
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        total = sum(account.get_balance_cents() for account in bank.accounts.values())
+        conserved = total == expected_total + sum(external)
+        negative = sum(1 for account in bank.accounts.values() if account.get_balance_cents() < 0)
+        print(f"  {threads:2d} threads: {transfers / elapsed:10,.0f} ops/s, {sum(results):,} transfers succeeded, "
+              f"money conserved: {'yes' if conserved else 'NO'}, negative balances: {negative}")
+        if not conserved or negative:
+            raise AssertionError("Concurrent transfers created or lost money")
+
+def benchmark_interest(accounts=1000000, days=30):
+    """Compare Bank.accrue_interest with calling SavingsAccount.accrue_interest on every account"""
+    import tempfile
+    as_of = date.today()
+    print(f"Accruing {days} days of daily-compounded interest on {accounts:,} savings accounts "
+          f"({'NumPy' if np is not None else 'plain Python'} batch):")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        totals = []
+        for label in ("per-account loop", "batch"):
+            ledger = Ledger(os.path.join(tmp_dir, label + ".jsonl"))
+            ledger.open()
+            bank = Bank(ledger)
+            start_date = as_of - timedelta(days=days)
+            for i in range(accounts):
+                account = SavingsAccount(f"Owner {i}", 100 + i % 5000, 0.01 + (i % 7) / 100,
+                                         account_number=1000000000 + i, accrued_through=start_date)
+                bank._index_account(account)
+            with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                start = time.perf_counter()
+                if label == "batch":
+                    bank.accrue_interest(as_of)
+                else:
+                    for account in bank.accounts.values():
+                        account.accrue_interest(as_of)
+                ledger.sync()
+                elapsed = time.perf_counter() - start
+            ledger.close()
+            totals.append(sum(account.get_balance_cents() for account in bank.accounts.values()))
+            print(f"  {label:<17} {elapsed:7.2f}s  ({accounts / elapsed:12,.0f} accounts/s)")
+        print(f"  totals agree to the cent: {'yes' if totals[0] == totals[1] else 'NO'}")
+
+def benchmark_money(operations=1000000):
+    """
+    Compare the integer-cents money path with the float balances it replaced: the per-operation work
+    (convert the amount, check and update the balance, format the message, encode the ledger record)
+    is timed for both, and the rounding drift of the float path is shown.
+    """
+    amounts = [1 + (i % 997) / 100 for i in range(1000)]  # USD amounts as they come from input
+    rounds = max(operations // (2 * len(amounts)), 1)
+
+    def float_path():
+        balance = 1000.0
+        for _ in range(rounds):
+            for amount in amounts:
+                if amount > 0:
+                    balance += amount
+                    json.dumps({"amount": amount, "balance": balance})
+                    f"{amount} USD"
+            for amount in amounts:
+                if amount > 0 and balance >= amount:
+                    balance -= amount
+                    json.dumps({"amount": amount, "balance": balance})
+                    f"{amount} USD"
+        return balance
+
+    def cents_path():
+        balance = 100000
+        for _ in range(rounds):
+            for amount in amounts:
+                cents = to_cents(amount)
+                if cents > 0:
+                    balance += cents
+                    json.dumps({"amount": cents, "balance": balance})
+                    format_usd(cents)
+            for amount in amounts:
+                cents = to_cents(amount)
+                if cents > 0 and balance >= cents:
+                    balance -= cents
+                    json.dumps({"amount": cents, "balance": balance})
+                    format_usd(cents)
+        return balance
+
+    count = rounds * len(amounts) * 2
+    print(f"Money path, {count:,} deposits/withdrawals:")
+    results = {}
+    for label, path in (("float USD", float_path), ("integer cents", cents_path)):
+        start = time.perf_counter()
+        results[label] = path()
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<14} {elapsed:6.2f}s  ({count / elapsed:12,.0f} ops/s)")
+    print(f"  final balance: float {results['float USD']!r}, cents {format_usd(results['integer cents'])} "
+          f"(exact: 1000.00)")
+
+def benchmark_account_numbers(numbers=10000000, accounts=1000000, threads=4, block_size=10000):
+    """
+    Allocate numbers new account numbers (old random scheme vs the sequence allocator, one at a time
+    and in reserved blocks from several threads), then open accounts in a Bank and look them up by owner.
+    """
+    import random as rng
+    print(f"Allocating {numbers:,} account numbers:")
+    start = time.perf_counter()
+    drawn = {rng.randint(1000000000, 9999999999) for _ in range(numbers)}
+    print(f"  random (previous)      {time.perf_counter() - start:6.2f}s  {numbers - len(drawn):,} collisions")
+    del drawn
+
+    allocator = AccountNumberAllocator()
+    start = time.perf_counter()
+    allocated = [allocator.allocate() for _ in range(numbers)]
+    elapsed = time.perf_counter() - start
+    print(f"  allocate()             {elapsed:6.2f}s  {numbers - len(set(allocated)):,} collisions, "
+          f"{numbers / elapsed:,.0f} numbers/s")
+    assert all(AccountNumberAllocator.is_valid(number) for number in allocated[::997])
+    del allocated
+
+    allocator = AccountNumberAllocator()
+    results = [[] for _ in range(threads)]
+
+    def creator(index):
+        created = results[index]
+        for _ in range(numbers // threads // block_size):
+            created.extend(map(AccountNumberAllocator.number_for, allocator.reserve(block_size)))
+
+    workers = [threading.Thread(target=creator, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    created = sum(len(result) for result in results)
+    unique = len(set().union(*results))
+    print(f"  reserve() blocks       {elapsed:6.2f}s  {created - unique:,} collisions, {created / elapsed:,.0f} numbers/s "
+          f"({threads} threads, blocks of {block_size:,})")
+    del results
+
+    print(f"Opening {accounts:,} accounts:")
+    bank = Bank()
+    owners = max(accounts // 3, 1)  # Most owners have several accounts
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        start = time.perf_counter()
+        for i in range(accounts):
+            bank.add_account(BankAccount(f"Owner {i % owners}", 100))
+        elapsed = time.perf_counter() - start
+    print(f"  add_account            {elapsed:6.2f}s  ({accounts / elapsed:,.0f} accounts/s)")
+    lookups = 100000
+    names = [f"owner {rng.randrange(owners)}" for _ in range(lookups)]
+    start = time.perf_counter()
+    found = sum(len(bank.find_accounts_by_owner(name)) for name in names)
+    elapsed = time.perf_counter() - start
+    print(f"  owner lookups          {elapsed * 1e6 / lookups:6.2f} us each ({found:,} accounts found)")
+    start = time.perf_counter()
+    for name in names[:10]:
+        [account for account in bank.accounts.values() if account.owner_name.casefold() == name]
+    print(f"  owner scan (previous)  {(time.perf_counter() - start) * 1e6 / 10:6.0f} us each")
+
+def write_sample_batch(path, numbers, entries, seed=0):
+    """Write a batch file (CSV or NDJSON, by extension) of random entries for the given account numbers"""
+    import random as rng
+    pick = rng.Random(seed)
+    kinds = ("deposit", "withdraw", "transfer", "transfer")
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f) if path.endswith(".csv") else None
+        if writer:
+            writer.writerow(BatchProcessor.FIELDS)
+        for i in range(entries):
+            kind = kinds[i % 4]
+            row = [f"E{i}", kind, pick.choice(numbers), pick.choice(numbers) if kind == "transfer" else "",
+                   f"{pick.randint(1, 50000) / 100:.2f}"]
+            if i % 1000 == 999:
+                row[2] = 1  # An unknown account now and then, to exercise the rejects file
+            if writer:
+                writer.writerow(row)
             else:
-                print("Insufficient balance in source account.")
+                f.write(json.dumps(dict(zip(BatchProcessor.FIELDS, row))) + "\n")
+
+def benchmark_batch(entries=300000, accounts=10000, worker_counts=(1, 2, 4), ledger=False):
+    """Process a generated batch file with different numbers of partitions and report throughput"""
+    import tempfile
+    print(f"Batch of {entries:,} entries over {accounts:,} accounts{' with the durable ledger' if ledger else ''}:")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        numbers = [AccountNumberAllocator.number_for(sequence) for sequence in range(200000000, 200000000 + accounts)]
+        batch_path = os.path.join(tmp_dir, "batch.csv")
+        write_sample_batch(batch_path, numbers, entries)
+        for workers in worker_counts:
+            if ledger:
+                bank = Bank.recover(os.path.join(tmp_dir, f"ledger-{workers}.jsonl"),
+                                    os.path.join(tmp_dir, f"snapshot-{workers}.json"))
+            else:
+                bank = Bank()
+            with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                for i, number in enumerate(numbers):
+                    bank.add_account((SavingsAccount if i % 2 else BankAccount)(f"Owner {i}", 5000, account_number=number))
+            summary = BatchProcessor(bank, workers).process(batch_path)
+            bank.close()
+            seconds = summary["seconds"]
+            print(f"  {workers} partition(s): {seconds:6.2f}s  {summary['entries'] / seconds:10,.0f} entries/s  "
+                  f"({summary['applied']:,} applied, {summary['rejected']:,} rejected)")
+            assert summary["entries"] == entries
+
+def benchmark_history(changes=2000000, queries=100000, max_entries=HISTORY_MAX_ENTRIES):
+    """Build a long history on one account, then time balance_at and statement queries"""
+    import random as rng
+    bank = Bank()
+    account = BankAccount("History Owner", 1000)
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        bank.add_account(account)
+    account._history.max_entries = max_entries
+    start = time.perf_counter()
+    for i in range(changes):
+        if i % 2:
+            account._withdraw(100 + i % 7)
         else:
-            print("Invalid accounts or amount.")
+            account._deposit(100 + i % 11)
+    elapsed = time.perf_counter() - start
+    history = account._history
+    print(f"History of {changes:,} changes on one account ({elapsed:.2f}s, {changes / elapsed:,.0f} changes/s):")
+    print(f"  kept in memory: {len(history.times):,} changes, {history.nbytes() / len(history.times):.0f} bytes each, "
+          f"{history.nbytes() / 1e6:.1f} MB ({'older changes dropped at a checkpoint' if history.checkpoint_ts else 'nothing dropped'})")
+    first, last = history.times[0], history.times[-1]
+    moments = [rng.uniform(first, last) for _ in range(queries)]
+    start = time.perf_counter()
+    for moment in moments:
+        bank.balance_at(account.get_account_number(), moment)
+    elapsed = time.perf_counter() - start
+    print(f"  balance_at:       {elapsed * 1e6 / queries:8.2f} us per query")
+    windows = max(queries // 100, 1)
+    span = (last - first) / 1000  # About a thousandth of the kept history per statement
+    start = time.perf_counter()
+    listed = 0
+    for moment in moments[:windows]:
+        listed += len(bank.statement(account.get_account_number(), moment, moment + span)["changes"])
+    elapsed = time.perf_counter() - start
+    print(f"  statement:        {elapsed * 1e6 / windows:8.0f} us per statement ({listed // windows:,} changes each)")
+    times, balances = list(history.times), list(history.changes[1::AccountHistory.FIELDS])
+    start = time.perf_counter()
+    for moment in moments[:10]:
+        next((balance for ts, balance in zip(reversed(times), reversed(balances)) if ts <= moment), None)
+    print(f"  linear scan:      {(time.perf_counter() - start) * 1e6 / 10:8.0f} us per query (for comparison)")
+
+# Load generator for the HTTP service: reports latency percentiles and requests per second
+async def _load_client(host, port, requests, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for method, target, body in requests:
+            data = json.dumps(body).encode() if body is not None else b""
+            start = time.perf_counter()
+            writer.write(f"{method} {target} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(data)}\r\n\r\n"
+                         .encode() + data)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+def benchmark_service(clients=50, requests=20000, accounts=10000, partition_counts=(1, 8), ledger=True):
+    """
+    Start the service in-process and send it deposits, withdrawals, transfers and balance reads from
+    concurrent keep-alive clients. Prints p50/p95/p99 latency and requests/s, and checks afterwards
+    that recovering the bank from its ledger gives the same balances.
+    """
+    import random as rng
+    import tempfile
+    pick = rng.Random(0)
+    numbers = [AccountNumberAllocator.number_for(sequence) for sequence in range(300000000, 300000000 + accounts)]
+    plans = []
+    for _ in range(clients):
+        plan = []
+        for _ in range(requests // clients):
+            roll = pick.random()
+            amount = f"{pick.randint(1, 20000) / 100:.2f}"
+            if roll < 0.35:
+                plan.append(("POST", "/deposit", {"account": pick.choice(numbers), "amount": amount}))
+            elif roll < 0.55:
+                plan.append(("POST", "/withdraw", {"account": pick.choice(numbers), "amount": amount}))
+            elif roll < 0.9:
+                plan.append(("POST", "/transfer", {"from": pick.choice(numbers), "to": pick.choice(numbers),
+                                                   "amount": amount}))
+            else:
+                plan.append(("GET", f"/accounts/{pick.choice(numbers)}", None))
+        plans.append(plan)
+
+    print(f"Bank service, {clients} clients, {requests:,} requests over {accounts:,} accounts"
+          f"{' (replies after the ledger sync)' if ledger else ' (in memory)'}:")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for partitions in partition_counts:
+            paths = (os.path.join(tmp_dir, f"ledger-{partitions}.jsonl"), os.path.join(tmp_dir, f"snapshot-{partitions}.json"))
+            with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                bank = Bank.recover(*paths) if ledger else Bank()
+                for i, number in enumerate(numbers):
+                    bank.add_account((SavingsAccount if i % 2 else BankAccount)(f"Owner {i}", 1000, account_number=number))
+
+            async def run():
+                server = await BankService(bank, partitions).start("127.0.0.1", 0)
+                port = server.sockets[0].getsockname()[1]
+                latencies, statuses = [], {}
+                start = time.perf_counter()
+                await asyncio.gather(*(_load_client("127.0.0.1", port, plan, latencies, statuses) for plan in plans))
+                elapsed = time.perf_counter() - start
+                server.close()
+                await server.wait_closed()
+                return latencies, statuses, elapsed
+
+            latencies, statuses, elapsed = asyncio.run(run())
+            balances = {number: account.get_balance_cents() for number, account in bank.accounts.items()}
+            bank.close()
+            latencies.sort()
+            p50, p95, p99 = (latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000 for q in (0.5, 0.95, 0.99))
+            print(f"  {partitions:2d} partition(s): {len(latencies) / elapsed:8,.0f} requests/s, p50 {p50:.2f} ms, "
+                  f"p95 {p95:.2f} ms, p99 {p99:.2f} ms, statuses {dict(sorted(statuses.items()))}")
+            if ledger:
+                with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                    recovered = Bank.recover(*paths)
+                    recovered.close()
+                assert {number: account.get_balance_cents() for number, account in recovered.accounts.items()} == balances
+
+def benchmark_velocity(accounts=1000000, transactions=1000000):
+    """Time withdrawals and transfers across many accounts without and with two velocity rules"""
+    import random as rng
+    print(f"Velocity checks, {transactions:,} withdrawals/transfers over {accounts:,} accounts:")
+    bank = Bank()
+    for i in range(accounts):
+        bank._index_account(BankAccount(f"Owner {i}", 1000000, account_number=AccountNumberAllocator.number_for(400000000 + i)))
+    accounts_list = list(bank.accounts.values())
+    pick = rng.Random(1)
+    plan = [(pick.choice(accounts_list), pick.choice(accounts_list), pick.randint(1, 500) * 100) for _ in range(transactions)]
+    rules = [VelocityRule(3600, max_count=20), VelocityRule(86400, max_amount=20000)]
+    results = {}
+    # The first pass only creates every account's history; each run is then measured on warm accounts,
+    # and the rules twice: first while their counters are created, then in steady state
+    for label, active in (("warm-up", []), ("no rules", []), ("2 rules, new counters", rules), ("2 rules", rules)):
+        bank.velocity_rules[:] = active
+        refused = 0
+        start = time.perf_counter()
+        for i, (account, other, amount) in enumerate(plan):
+            if (account._withdraw(amount) if i % 2 else bank._transfer(account, other, amount)) is not None:
+                refused += 1
+        elapsed = time.perf_counter() - start
+        results[label] = elapsed
+        if label == "warm-up":
+            continue
+        print(f"  {label:<22} {elapsed:6.2f}s  {elapsed * 1e6 / transactions:6.2f} us per transaction, {refused:,} refused")
+    counters = sum(len(account._counters) for account in accounts_list if account._counters)
+    memory = sum(len(state) * state.itemsize for account in accounts_list for state in account._counters or ())
+    print(f"  overhead: {(results['2 rules'] - results['no rules']) * 1e6 / transactions:.2f} us per transaction "
+          f"in steady state; {counters:,} counters of {memory / max(counters, 1):.0f} bytes")
 
 def main():
-    # Create bank
-    my_bank = Bank()
+    # Load the bank from its snapshot and ledger (or start a new one)
+    my_bank = Bank.recover()
 
     # Create initial accounts
-    acc1 = BankAccount("Ali Rezaei", 1000)
-    acc2 = SavingsAccount("Maryam Ahmadi", 500, interest_rate=0.07)
-    my_bank.add_account(acc1)
-    my_bank.add_account(acc2)
+    if not my_bank.accounts:
+        acc1 = BankAccount("Ali Rezaei", 1000)
+        acc2 = SavingsAccount("Maryam Ahmadi", 500, interest_rate=0.07)
+        my_bank.add_account(acc1)
+        my_bank.add_account(acc2)
 
     while True:
         print("\n=== Bank Management System ===")
@@ -102,13 +1679,16 @@ def main():
         print("3. Apply interest (Savings Account only)")
         print("4. Transfer between accounts")
         print("5. Show account details")
-        print("6. Exit")
+        print("6. Find accounts by owner")
+        print("7. Account statement")
+        print("8. Accrue interest on all savings accounts")
+        print("9. Exit")
         
-        choice = input("Enter your choice (1-6): ")
+        choice = input("Enter your choice (1-9): ")
 
         if choice == "1":
             acc_num = int(input("Enter account number: "))
-            amount = float(input("Enter amount to deposit (USD): "))
+            amount = Decimal(input("Enter amount to deposit (USD): "))
             account = my_bank.find_account(acc_num)
             if account:
                 account.deposit(amount)
@@ -117,7 +1697,7 @@ def main():
 
         elif choice == "2":
             acc_num = int(input("Enter account number: "))
-            amount = float(input("Enter amount to withdraw (USD): "))
+            amount = Decimal(input("Enter amount to withdraw (USD): "))
             account = my_bank.find_account(acc_num)
             if account:
                 account.withdraw(amount)
@@ -137,7 +1717,7 @@ def main():
         elif choice == "4":
             from_acc_num = int(input("Enter source account number: "))
             to_acc_num = int(input("Enter destination account number: "))
-            amount = float(input("Enter amount to transfer (USD): "))
+            amount = Decimal(input("Enter amount to transfer (USD): "))
             my_bank.transfer(from_acc_num, to_acc_num, amount)
 
         elif choice == "5":
@@ -149,12 +1729,133 @@ def main():
                 print("Account not found.")
 
         elif choice == "6":
+            owner_name = input("Enter owner name: ")
+            accounts = my_bank.find_accounts_by_owner(owner_name)
+            for account in accounts:
+                print(account)
+            if not accounts:
+                print("No accounts found for this owner.")
+
+        elif choice == "7":
+            acc_num = int(input("Enter account number: "))
+            try:
+                start = date.fromisoformat(input("From date (YYYY-MM-DD): ").strip())
+                end = date.fromisoformat(input("To date, inclusive (YYYY-MM-DD, blank for today): ").strip()
+                                         or date.today().isoformat())
+                my_bank.display_statement(acc_num, start, end + timedelta(days=1))
+            except ValueError as e:
+                print(e)
+
+        elif choice == "8":
+            as_of = input("Accrue through date (YYYY-MM-DD, blank for today): ").strip()
+            try:
+                my_bank.accrue_interest(date.fromisoformat(as_of) if as_of else None)
+            except ValueError as e:
+                print(f"Invalid date: {e}")
+
+        elif choice == "9":
+            my_bank.snapshot()
+            my_bank.close()
             print("Exiting the system. Goodbye!")
             break
 
         else:
             print("Invalid choice. Please try again.")
 
+def run_cli(argv=None):
+    parser = argparse.ArgumentParser(prog="bank", description="Bank Management System")
+    commands = parser.add_subparsers(dest="command")
+    ledger_parser = commands.add_parser("bench-ledger", help="Measure durable ledger throughput and recovery")
+    ledger_parser.add_argument("--transactions", type=int, default=200000)
+    ledger_parser.add_argument("--accounts", type=int, default=1000)
+    ledger_parser.add_argument("--fsync-every", type=int, default=256)
+    ledger_parser.add_argument("--fsync-interval-ms", type=float, default=5)
+    stress_parser = commands.add_parser("stress-transfers", help="Check concurrent transfers keep money conserved")
+    stress_parser.add_argument("--accounts", type=int, default=100)
+    stress_parser.add_argument("--transfers", type=int, default=200000)
+    stress_parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    interest_parser = commands.add_parser("bench-interest", help="Compare batch interest accrual with a per-account loop")
+    interest_parser.add_argument("--accounts", type=int, default=1000000)
+    interest_parser.add_argument("--days", type=int, default=30)
+    money_parser = commands.add_parser("bench-money", help="Compare integer-cents and float money handling")
+    money_parser.add_argument("--operations", type=int, default=1000000)
+    numbers_parser = commands.add_parser("bench-accounts", help="Measure account number allocation and owner lookups")
+    numbers_parser.add_argument("--numbers", type=int, default=10000000)
+    numbers_parser.add_argument("--accounts", type=int, default=1000000)
+    numbers_parser.add_argument("--threads", type=int, default=4)
+    batch_parser = commands.add_parser("batch", help="Apply a CSV or NDJSON batch file of transactions")
+    batch_parser.add_argument("file")
+    batch_parser.add_argument("--rejects", help="Where to write rejected entries (default: FILE.rejects.EXT)")
+    batch_parser.add_argument("--results", help="Also write the outcome of every entry to this CSV file")
+    batch_parser.add_argument("--workers", type=int, default=1,
+                              help="Number of account partitions applied in parallel (same outcome, rarely faster)")
+    batch_bench_parser = commands.add_parser("bench-batch", help="Measure batch file throughput")
+    batch_bench_parser.add_argument("--entries", type=int, default=300000)
+    batch_bench_parser.add_argument("--accounts", type=int, default=10000)
+    batch_bench_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    batch_bench_parser.add_argument("--ledger", action="store_true", help="Write every entry to the durable ledger")
+    history_parser = commands.add_parser("bench-history", help="Measure balance_at and statement queries")
+    history_parser.add_argument("--changes", type=int, default=2000000)
+    history_parser.add_argument("--queries", type=int, default=100000)
+    history_parser.add_argument("--max-entries", type=int, default=HISTORY_MAX_ENTRIES)
+    serve_parser = commands.add_parser("serve", help="Serve deposits, withdrawals, transfers and balances over HTTP/JSON")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument("--partitions", type=int, default=8)
+    service_bench_parser = commands.add_parser("bench-service", help="Load-test the HTTP service in-process")
+    service_bench_parser.add_argument("--clients", type=int, default=50)
+    service_bench_parser.add_argument("--requests", type=int, default=20000)
+    service_bench_parser.add_argument("--accounts", type=int, default=10000)
+    service_bench_parser.add_argument("--partitions", type=int, nargs="+", default=[1, 8])
+    service_bench_parser.add_argument("--in-memory", action="store_true", help="Run without the durable ledger")
+    velocity_parser = commands.add_parser("bench-velocity", help="Measure the cost of velocity rules per transaction")
+    velocity_parser.add_argument("--accounts", type=int, default=1000000)
+    velocity_parser.add_argument("--transactions", type=int, default=1000000)
+    for command_parser in (batch_parser, serve_parser):
+        command_parser.add_argument("--velocity", action="append", default=[], metavar="RULE",
+                                    help='Velocity limit such as "window=1h max_count=5" (repeatable)')
+    args = parser.parse_args(argv)
+
+    if args.command == "bench-ledger":
+        benchmark_ledger(args.transactions, args.accounts, args.fsync_every, args.fsync_interval_ms / 1000)
+    elif args.command == "stress-transfers":
+        stress_transfers(args.accounts, args.transfers, args.threads)
+    elif args.command == "bench-interest":
+        benchmark_interest(args.accounts, args.days)
+    elif args.command == "bench-money":
+        benchmark_money(args.operations)
+    elif args.command == "batch":
+        bank = Bank.recover()
+        for rule in args.velocity:
+            bank.add_velocity_rule(VelocityRule.parse(rule))
+        summary = BatchProcessor(bank, args.workers).process(args.file, args.rejects, args.results)
+        bank.snapshot()
+        bank.close()
+        print(f"Processed {summary['entries']:,} entries in {summary['seconds']:.2f}s "
+              f"({summary['entries'] / max(summary['seconds'], 1e-9):,.0f} entries/s): "
+              f"{summary['applied']:,} applied, {summary['rejected']:,} rejected (see {summary['rejects_path']}).")
+    elif args.command == "bench-batch":
+        benchmark_batch(args.entries, args.accounts, args.workers, args.ledger)
+    elif args.command == "serve":
+        bank = Bank.recover()
+        for rule in args.velocity:
+            bank.add_velocity_rule(VelocityRule.parse(rule))
+        try:
+            serve(bank, args.host, args.port, args.partitions)
+        finally:
+            bank.snapshot()
+            bank.close()
+    elif args.command == "bench-service":
+        benchmark_service(args.clients, args.requests, args.accounts, args.partitions, not args.in_memory)
+    elif args.command == "bench-velocity":
+        benchmark_velocity(args.accounts, args.transactions)
+    elif args.command == "bench-history":
+        benchmark_history(args.changes, args.queries, args.max_entries)
+    elif args.command == "bench-accounts":
+        benchmark_account_numbers(args.numbers, args.accounts, args.threads)
+    else:
+        main()
+
 # Run the program
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_cli()
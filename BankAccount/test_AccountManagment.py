@@ -0,0 +1,520 @@
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+
+import pytest
+
+import AccountManagment
+
+from AccountManagment import (AccountNumberAllocator, Bank, BankAccount, BankService, BatchProcessor, SavingsAccount,
+                              VelocityRule, accrued_interest, format_usd, to_cents, write_sample_batch)
+
+
+def recover(tmp_path, **options):
+    return Bank.recover(str(tmp_path / "ledger.jsonl"), str(tmp_path / "snapshot.json"), **options)
+
+
+def test_recovery_drops_a_torn_ledger_tail(tmp_path):
+    bank = recover(tmp_path)
+    account = BankAccount("Ann Lee", 100)
+    bank.add_account(account)
+    account.deposit(50)
+    bank.close()
+    ledger_path = tmp_path / "ledger.jsonl"
+    good_size = os.path.getsize(ledger_path)
+    with open(ledger_path, "ab") as f:
+        f.write(b'{"seq": 3, "ts": 1, "op": "depo')  # Crash in the middle of a write
+
+    bank = recover(tmp_path)
+    assert os.path.getsize(ledger_path) == good_size
+    recovered = bank.find_account(account.get_account_number())
+    assert recovered.get_balance() == Decimal("150.00")
+    recovered.deposit(25)  # New records append after the last complete one
+    bank.close()
+
+    bank = recover(tmp_path)
+    assert bank.find_account(account.get_account_number()).get_balance() == Decimal("175.00")
+    bank.close()
+
+
+def test_recovery_after_a_snapshot_replays_only_newer_records(tmp_path):
+    bank = recover(tmp_path)
+    first, second = BankAccount("Ann Lee", 100), BankAccount("Bo Kim", 200)
+    bank.add_account(first)
+    bank.add_account(second)
+    bank.transfer(first.get_account_number(), second.get_account_number(), 30)
+    bank.snapshot()
+    first.deposit(5)
+    third = BankAccount("Ann Lee", 1)
+    bank.add_account(third)
+    bank.close()
+
+    bank = recover(tmp_path)
+    assert bank.find_account(first.get_account_number()).get_balance() == Decimal("75.00")
+    assert bank.find_account(second.get_account_number()).get_balance() == Decimal("230.00")
+    assert [account.get_account_number() for account in bank.find_accounts_by_owner("ann lee")] == \
+        [first.get_account_number(), third.get_account_number()]
+    bank.close()
+
+
+def test_open_records_taken_into_the_snapshot_are_not_indexed_twice(tmp_path):
+    bank = recover(tmp_path)
+    account = BankAccount("Ann Lee", 100)
+    bank.add_account(account)
+    account.deposit(10)
+    bank.snapshot()
+    bank.close()
+    # A snapshot that saw the account but was numbered before its "open" record was written
+    snapshot_path = tmp_path / "snapshot.json"
+    state = json.loads(snapshot_path.read_text())
+    state["seq"], state["offset"] = 0, 0
+    snapshot_path.write_text(json.dumps(state))
+
+    bank = recover(tmp_path)
+    assert bank.find_accounts_by_owner("Ann Lee") == [bank.find_account(account.get_account_number())]
+    assert bank.find_account(account.get_account_number()).get_balance() == Decimal("110.00")
+    bank.close()
+
+
+def test_automatic_snapshots_run_in_the_background(tmp_path):
+    bank = recover(tmp_path, snapshot_every=10)
+    account = BankAccount("Ann Lee", 0)
+    bank.add_account(account)
+    for _ in range(25):
+        account.deposit(1)
+    deadline = time.monotonic() + 5
+    while bank.ledger.checkpoint_seq < 10 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert bank.ledger.checkpoint_seq >= 10
+    bank.close()
+
+    bank = recover(tmp_path)
+    assert bank.find_account(account.get_account_number()).get_balance() == Decimal("25.00")
+    bank.close()
+
+
+def test_concurrent_transfers_conserve_money(tmp_path, monkeypatch):
+    check_withdraw = BankAccount._check_withdraw
+
+    def check_then_yield(self, amount):
+        error = check_withdraw(self, amount)
+        time.sleep(0.00001)  # Let other threads run between the balance check and the update
+        return error
+
+    monkeypatch.setattr(BankAccount, "_check_withdraw", check_then_yield)
+    bank = recover(tmp_path)
+    accounts = [BankAccount(f"Owner {number}", 1000) for number in range(10)]
+    for account in accounts:
+        bank.add_account(account)
+    total = sum(account.get_balance_cents() for account in accounts)
+
+    def transfer_randomly(seed):
+        rng = random.Random(seed)
+        for _ in range(2000):
+            from_acc, to_acc = rng.sample(accounts, 2)  # Opposite transfers run at once, too
+            bank._transfer(from_acc, to_acc, rng.randint(1, 100000))
+
+    threads = [threading.Thread(target=transfer_randomly, args=(seed,)) for seed in range(16)]
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Switch threads often, so unlocked read-modify-writes would interleave
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    balances = {account.get_account_number(): account.get_balance_cents() for account in accounts}
+    assert sum(balances.values()) == total
+    assert min(balances.values()) >= 0
+    bank.close()
+
+    bank = recover(tmp_path)
+    assert {number: bank.find_account(number).get_balance_cents() for number in balances} == balances
+    bank.close()
+
+
+def test_batch_outcome_does_not_depend_on_the_number_of_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(BatchProcessor, "MIN_PARALLEL_ENTRIES", 1)  # Use the pool even for short stretches
+    numbers = [AccountNumberAllocator.number_for(sequence) for sequence in range(200000000, 200000020)]
+    batch_path = str(tmp_path / "batch.csv")
+    write_sample_batch(batch_path, numbers, 5000)  # Small balances, so many entries depend on earlier ones
+    outcomes = []
+    for workers in (1, 2, 4):
+        bank = Bank()
+        for number in numbers:
+            bank.add_account(BankAccount(f"Owner {number}", 200, account_number=number))
+        rejects_path = str(tmp_path / f"rejects-{workers}.csv")
+        summary = BatchProcessor(bank, workers, chunk_size=1000).process(batch_path, rejects_path)
+        with open(rejects_path, encoding="utf-8") as f:
+            rejects = f.read()
+        outcomes.append((summary["rejected"], rejects, {number: bank.find_account(number).get_balance_cents()
+                                                        for number in numbers}))
+    assert outcomes[0][0] > 100
+    assert outcomes[1] == outcomes[0] and outcomes[2] == outcomes[0]
+
+
+def test_batch_rejects_malformed_entries_and_applies_the_rest(tmp_path):
+    bank = Bank()
+    account = BankAccount("Ann Lee", 100)
+    bank.add_account(account)
+    number = account.get_account_number()
+    entries = [{"id": "a", "type": "deposit", "account": number, "amount": "10"},
+               {"id": "b", "type": "deposit", "account": number, "amount": "10"},
+               {"id": "c", "type": 5, "account": number, "amount": "10"},
+               {"id": ["d"], "type": "deposit", "account": number, "amount": "10"},
+               [1, 2],
+               {"id": "e", "type": "withdraw", "account": number, "amount": "5"},
+               {"id": "f", "type": "deposit", "account": number, "amount": "1"}]
+    batch_path = tmp_path / "batch.ndjson"
+    batch_path.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+    rejects_path = str(tmp_path / "rejects.ndjson")
+
+    summary = BatchProcessor(bank, chunk_size=2).process(str(batch_path), rejects_path)
+    assert (summary["entries"], summary["applied"], summary["rejected"]) == (7, 4, 3)
+    assert account.get_balance() == Decimal("116.00")
+    with open(rejects_path, encoding="utf-8") as f:
+        rejects = [json.loads(line) for line in f]
+    assert [reject["line"] for reject in rejects] == [3, 4, 5]
+    assert rejects[0]["error"] == "Unknown transaction type: 5"
+    assert rejects[1]["error"] == "Invalid entry id: ['d']"
+
+
+def test_snapshot_taken_during_transfers_matches_the_durable_ledger(tmp_path):
+    bank = recover(tmp_path, fsync_every=100000, fsync_interval=60)  # Records wait in the group-commit buffer
+    accounts = [BankAccount(f"Owner {number}", 1000) for number in range(10)]
+    for account in accounts:
+        bank.add_account(account)
+    stop = threading.Event()
+
+    def move_money(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            from_acc, to_acc = rng.sample(accounts, 2)
+            bank._transfer(from_acc, to_acc, rng.randint(1, 10000))
+            to_acc._deposit(1)
+
+    threads = [threading.Thread(target=move_money, args=(seed,)) for seed in range(4)]
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        crashes = []
+        for number in range(20):
+            bank.snapshot()
+            # What a crash right after the snapshot would leave on disk
+            crash = tmp_path / f"crash-{number}"
+            crash.mkdir()
+            (crash / "ledger.jsonl").write_bytes((tmp_path / "ledger.jsonl").read_bytes())
+            (crash / "snapshot.json").write_bytes((tmp_path / "snapshot.json").read_bytes())
+            crashes.append(crash)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        sys.setswitchinterval(switch_interval)
+    bank.close()
+
+    for crash in crashes:
+        from_snapshot = recover(crash)
+        balances = {number: account.get_balance_cents() for number, account in from_snapshot.accounts.items()}
+        from_snapshot.close()
+        os.remove(crash / "snapshot.json")
+        from_ledger = recover(crash)  # Every durable record, and nothing else
+        assert {number: account.get_balance_cents() for number, account in from_ledger.accounts.items()} == balances
+        from_ledger.close()
+
+
+def request_service(bank, requests):
+    """Send (method, target, body) requests to a BankService over one connection; returns [(status, reply)]"""
+    async def run():
+        server = await BankService(bank, partitions=2).start("127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        replies = []
+        for method, target, body in requests:
+            writer.write(f"{method} {target} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+            status = int((await reader.readline()).split()[1])
+            headers = {}
+            while (line := await reader.readline()) != b"\r\n":
+                name, _, value = line.decode().partition(":")
+                headers[name.lower()] = value.strip()
+            replies.append((status, json.loads(await reader.readexactly(int(headers["content-length"])))))
+        writer.close()
+        server.close()
+        return replies
+    return asyncio.run(run())
+
+
+def test_service_rejects_bodies_that_are_not_objects_and_keeps_serving(tmp_path):
+    bank = recover(tmp_path)
+    account = BankAccount("Ann Lee", 100)
+    bank.add_account(account)
+    number = account.get_account_number()
+    replies = request_service(bank, [
+        ("POST", "/deposit", b"[]"),
+        ("POST", "/transfer", b'"x"'),
+        ("POST", "/deposit", json.dumps({"account": number, "amount": "2.50"}).encode()),
+        ("GET", f"/accounts/{number}", b""),
+    ])
+    assert replies[0] == (400, {"error": "the request body must be a JSON object"})
+    assert replies[1][0] == 400
+    assert replies[2] == (200, {"balances": {str(number): "102.50"}})
+    assert replies[3][0] == 200 and replies[3][1]["balance"] == "102.50"
+    bank.close()
+
+
+def test_service_statement_reads_history_older_than_memory_from_the_ledger(tmp_path):
+    bank = recover(tmp_path)
+    account = BankAccount("Ann Lee", 100)
+    bank.add_account(account)
+    account.deposit(20)
+    bank.history_since = time.time() + 1  # As if the changes so far had been recovered from a snapshot
+    today = date.today()
+    status, statement = request_service(bank, [
+        ("GET", f"/accounts/{account.get_account_number()}/statement?start={today - timedelta(days=1)}"
+                f"&end={today + timedelta(days=1)}", b"")])[0]
+    assert status == 200
+    assert [(change["kind"], change["amount"]) for change in statement["changes"]] == \
+        [("open", "100.00"), ("deposit", "20.00")]
+    assert (statement["opening_balance"], statement["closing_balance"]) == ("0.00", "120.00")
+    bank.close()
+
+
+def test_interest_rounds_half_to_even_to_whole_cents():
+    assert accrued_interest(50, 0.365, 10, "simple") == 0  # 0.5 cents
+    assert accrued_interest(150, 0.365, 10, "simple") == 2  # 1.5 cents
+    assert accrued_interest(100000, 0.0365, 10, "simple") == 100
+    assert accrued_interest(100000, 0.0365, 365, "daily") == 3717  # Compounded: more than 3650
+    assert accrued_interest(100000, 0.05, 0) == 0
+
+
+@pytest.mark.parametrize("vectorized", [True, False])
+def test_batch_accrual_matches_per_account_interest_and_catches_up_after_recovery(tmp_path, monkeypatch, vectorized):
+    if not vectorized:
+        monkeypatch.setattr(AccountManagment, "np", None)
+    start = date(2024, 1, 1)
+    bank = recover(tmp_path)
+    savers = [SavingsAccount(f"Saver {number}", 1000 + number * 37.15, 0.01 + number / 100, accrued_through=start)
+              for number in range(5)]
+    checking = BankAccount("Ann Lee", 500)
+    for account in savers + [checking]:
+        bank.add_account(account)
+    opening = [account.get_balance_cents() for account in savers]
+    expected = [balance + accrued_interest(balance, account.interest_rate, 10)
+                for balance, account in zip(opening, savers)]
+
+    assert bank.accrue_interest(start + timedelta(days=10)) == (5, sum(expected) - sum(opening))
+    assert [account.get_balance_cents() for account in savers] == expected
+    assert checking.get_balance_cents() == 50000
+    assert bank.accrue_interest(start + timedelta(days=10)) == (0, 0)  # Already accrued through that day
+    bank.close()
+
+    bank = recover(tmp_path)
+    recovered = [bank.find_account(account.get_account_number()) for account in savers]
+    assert [account.get_balance_cents() for account in recovered] == expected
+    assert {account.accrued_through for account in recovered} == {start + timedelta(days=10)}
+    count, total = bank.accrue_interest(start + timedelta(days=15))  # Only the 5 days since the last accrual
+    caught_up = [balance + accrued_interest(balance, account.interest_rate, 5)
+                 for balance, account in zip(expected, recovered)]
+    assert count == 5 and total == sum(caught_up) - sum(expected)
+    assert [account.get_balance_cents() for account in recovered] == caught_up
+    bank.close()
+
+
+def test_amounts_parse_to_exact_cents_rounding_half_to_even():
+    assert to_cents(12) == 1200
+    assert to_cents("19.99") == 1999
+    assert to_cents("1.005") == 100 and to_cents("1.015") == 102  # More than two decimals: half to even
+    assert to_cents("-2.345") == -234
+    assert to_cents("1e3") == 100000
+    assert to_cents(0.1 + 0.2) == 30
+    assert to_cents(Decimal("0.125")) == 12
+    assert to_cents("12345678901234567890.99") == 1234567890123456789099  # No float precision lost
+    for bad, error in (("abc", InvalidOperation), ("", InvalidOperation), ("NaN", ValueError),
+                       ("Infinity", OverflowError), (None, TypeError)):
+        with pytest.raises(error):
+            to_cents(bad)
+
+
+def test_amounts_format_exactly_at_any_size():
+    assert format_usd(0) == "0.00"
+    assert format_usd(-5) == "-0.05" and format_usd(-105) == "-1.05"
+    assert format_usd(999999999999999) == "9999999999999.99"
+    assert format_usd(10 ** 17 + 7) == "1000000000000000.07"
+    assert format_usd(-(10 ** 17) - 7) == "-1000000000000000.07"
+    assert to_cents(format_usd(1234567890123456789099)) == 1234567890123456789099
+
+
+def test_refused_amounts_leave_the_balance_untouched():
+    account = BankAccount("Ann Lee", 10)
+    assert not account.deposit(-5)
+    assert not account.deposit("0.004")  # Rounds to zero cents
+    assert not account.withdraw("-1")
+    assert not account.withdraw("10.01")
+    assert account.get_balance() == Decimal("10.00")
+    assert account.deposit("12345678901234567.89")
+    assert account.withdraw("0.015")  # Rounds to two cents
+    assert account.get_balance() == Decimal("12345678901234577.87")  # Exact, beyond float precision
+    # Past the 64-bit cents the history can hold: refused before anything changes
+    assert not account.deposit("92233720368547758.07")
+    assert account.get_balance() == Decimal("12345678901234577.87")
+    with pytest.raises(ValueError):
+        BankAccount("Bo Kim", "92233720368547758.08")
+    bank = Bank()
+    richest, other = BankAccount("Cy Lo", "92233720368547758.07"), BankAccount("Di Ma", 1)
+    bank.add_account(richest)
+    bank.add_account(other)
+    assert not bank.transfer(other.get_account_number(), richest.get_account_number(), "0.01")
+    assert other.get_balance() == Decimal("1.00")
+
+
+def luhn_is_valid(number):
+    """Textbook Luhn check, to compare the table-driven one against"""
+    total = 0
+    for position, digit in enumerate(reversed(str(number))):
+        digit = int(digit)
+        if position % 2:
+            digit = digit * 2 - 9 if digit > 4 else digit * 2
+        total += digit
+    return total % 10 == 0
+
+
+def test_account_numbers_carry_a_luhn_check_digit():
+    rng = random.Random(7)
+    for sequence in [AccountNumberAllocator.FIRST_SEQUENCE, AccountNumberAllocator.LAST_SEQUENCE] + \
+            [rng.randint(AccountNumberAllocator.FIRST_SEQUENCE, AccountNumberAllocator.LAST_SEQUENCE) for _ in range(2000)]:
+        number = AccountNumberAllocator.number_for(sequence)
+        assert number // 10 == sequence and luhn_is_valid(number)
+        assert AccountNumberAllocator.is_valid(number)
+        digits = str(number)
+        for position in range(10):  # Every single mistyped digit is caught
+            for wrong in set("0123456789") - {digits[position]}:
+                assert not AccountNumberAllocator.is_valid(int(digits[:position] + wrong + digits[position + 1:]))
+    assert not AccountNumberAllocator.is_valid(123)
+
+
+def test_account_numbers_are_unique_across_threads():
+    allocator = AccountNumberAllocator()
+    numbers = [[] for _ in range(8)]
+
+    def allocate(index):
+        if index % 2:
+            numbers[index] += [allocator.number_for(sequence) for sequence in allocator.reserve(500)]
+        else:
+            numbers[index] += [allocator.allocate() for _ in range(500)]
+
+    threads = [threading.Thread(target=allocate, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    every = [number for block in numbers for number in block]
+    assert len(set(every)) == len(every) == 4000
+    assert all(AccountNumberAllocator.is_valid(number) for number in every)
+
+    allocator.observe(AccountNumberAllocator.number_for(200000000))  # Restored from disk
+    assert allocator.allocate() == AccountNumberAllocator.number_for(200000001)
+    allocator = AccountNumberAllocator(AccountNumberAllocator.LAST_SEQUENCE)
+    allocator.allocate()
+    with pytest.raises(RuntimeError):
+        allocator.allocate()
+
+
+def test_owner_index_is_rebuilt_by_ledger_replay(tmp_path):
+    bank = recover(tmp_path)
+    first, second, other = BankAccount("Ann Lee", 10), SavingsAccount("ann lee", 20), BankAccount("Bo Kim", 30)
+    for account in (first, second, other):
+        bank.add_account(account)
+    bank.close()
+
+    bank = recover(tmp_path)  # No snapshot: every account comes from its "open" record
+    assert [account.get_account_number() for account in bank.find_accounts_by_owner("ANN LEE")] == \
+        [first.get_account_number(), second.get_account_number()]
+    assert bank.find_accounts_by_owner("Bo Kim")[0].get_balance() == Decimal("30.00")
+    assert bank.find_accounts_by_owner("Cy Lo") == []
+    newcomer = BankAccount("Ann Lee", 1)  # Never reuses a recovered number
+    assert newcomer.get_account_number() not in bank.accounts
+    bank.add_account(newcomer)
+    assert len(bank.find_accounts_by_owner("ann lee")) == 3
+    bank.close()
+
+
+def test_statements_and_balance_history_match_a_known_ledger(tmp_path):
+    a, b = AccountNumberAllocator.number_for(300000000), AccountNumberAllocator.number_for(300000001)
+    t = 1700000000.0
+    records = [
+        {"op": "open", "ts": t, "account": {"type": "checking", "account_number": a, "owner_name": "Ann Lee", "balance": 10000}},
+        {"op": "open", "ts": t, "account": {"type": "checking", "account_number": b, "owner_name": "Bo Kim", "balance": 0}},
+        {"op": "deposit", "ts": t + 100, "account": a, "amount": 5000, "balance": 15000},
+        {"op": "transfer", "ts": t + 200, "amount": 2000, "from": a, "to": b, "from_balance": 13000, "to_balance": 2000},
+        {"op": "withdraw", "ts": t + 300, "account": a, "amount": 1000, "balance": 12000},
+        {"op": "deposit", "ts": t + 300, "account": b, "amount": 500, "balance": 2500},
+    ]
+    (tmp_path / "ledger.jsonl").write_text("".join(json.dumps(dict(record, seq=seq)) + "\n"
+                                                   for seq, record in enumerate(records, 1)))
+    bank = recover(tmp_path)
+
+    for from_memory in (True, False):
+        if not from_memory:
+            bank.history_since = t + 250  # As if recovered from a later snapshot: rebuilt from the ledger
+        assert [bank.balance_at(a, t + offset) for offset in (-1, 0, 99, 100, 150, 200, 300, 10 ** 6)] == \
+            [0, 10000, 10000, 15000, 15000, 13000, 12000, 12000]
+        statement = bank.statement(a, t + 100, t + 300)  # Start included, end excluded
+        assert (statement["opening_balance"], statement["closing_balance"]) == (10000, 13000)
+        assert statement["changes"] == [(t + 100, "deposit", 5000, 15000, 0), (t + 200, "transfer_out", -2000, 13000, b)]
+        statement = bank.statement(b, t, t + 301)
+        assert statement["changes"] == [(t, "open", 0, 0, 0), (t + 200, "transfer_in", 2000, 2000, a),
+                                        (t + 300, "deposit", 500, 2500, 0)]
+        assert statement["closing_balance"] == 2500
+        assert bank.statement(b, t + 400, t + 500)["changes"] == []
+    bank.close()
+
+
+def test_velocity_window_slides_one_bucket_at_a_time():
+    rule = VelocityRule(window=60, max_count=2, buckets=6)  # Buckets of 10 seconds
+    state = rule.new_counter()
+    assert rule.consume(state, 100, 0) is None
+    assert rule.consume(state, 100, 5) is None
+    assert rule.consume(state, 100, 9) is not None
+    assert rule.consume(state, 100, 59.9) is not None  # The first bucket is still in the window
+    assert rule.consume(state, 100, 60) is None  # ...and now it has left it
+    assert rule.consume(state, 100, 200) is None and state[1] == 1  # Long idle: everything expired
+
+    rule = VelocityRule.parse("window=1h max_amount=100.50 kinds=withdraw")
+    assert (rule.window, rule.max_amount, rule.kinds) == (3600, 10050, ("withdraw",))
+    state = rule.new_counter()
+    assert rule.consume(state, 10050, 0) is None
+    assert rule.consume(state, 1, 3599) == "Velocity limit reached: at most 100.50 USD per 3600s."
+    with pytest.raises(ValueError):
+        VelocityRule.parse("window=1h")
+
+
+def test_velocity_rejections_leave_balances_untouched(monkeypatch):
+    now = [1700000000.0]
+    monkeypatch.setattr(AccountManagment.time, "time", lambda: now[0])
+    bank = Bank()
+    bank.add_velocity_rule(VelocityRule(window=3600, max_count=10))
+    bank.add_velocity_rule(VelocityRule.parse("window=1h max_amount=100"))
+    source, target = BankAccount("Ann Lee", 1000), BankAccount("Bo Kim", 0)
+    bank.add_account(source)
+    bank.add_account(target)
+
+    assert source.withdraw(80)
+    assert not source.withdraw(30)
+    assert not bank.transfer(source.get_account_number(), target.get_account_number(), 30)
+    assert (source.get_balance(), target.get_balance()) == (Decimal("920.00"), Decimal("0.00"))
+    assert [kind for _, kind, *rest in bank.statement(source.get_account_number(), 0, now[0] + 1)["changes"]] == \
+        ["open", "withdraw"]
+    assert source._counters[0][1] == 1  # The count the first rule took for refused sends was given back
+    assert target.deposit(5000)  # Money coming in is never limited
+
+    now[0] += 3600  # The hour has passed
+    assert bank.transfer(source.get_account_number(), target.get_account_number(), 30)
+    assert (source.get_balance(), target.get_balance()) == (Decimal("890.00"), Decimal("5030.00"))
@@ -1,11 +1,54 @@
 # Import necessary modules
 import sys
+import asyncio
+import csv
 import json
+import argparse
+import logging
+import contextlib
+import bisect
+import sqlite3
 import os
+import re
+import shlex
+import time
+import tracemalloc  # For the memory benchmark
+import heapq
 import uuid  # For generating unique VINs
+from array import array
+from collections import OrderedDict
+from datetime import date, datetime
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import fcntl  # POSIX advisory file locks for shared (multi-terminal) mode
+except ImportError:
+    fcntl = None
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; ad-hoc sales rollups fall back to plain Python
+    np = None
+
+# Status messages ("Added ...", "Data saved to file.") go to this logger. It is silent unless the
+# application attaches a handler, as the interactive menu and the CLI do with enable_console_messages()
+logger = logging.getLogger("carstore")
+logger.addHandler(logging.NullHandler())
+
+def enable_console_messages(stream=None, level=logging.INFO):
+    """Print status messages as plain lines on stream (default: standard output); returns the handler."""
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    return handler
 
 # Define the Car class to represent each sports car, with more real-world attributes
 class Car:
+    # Fixed attribute slots instead of a per-instance __dict__ (much smaller at scale)
+    __slots__ = ("make", "model", "year", "price", "horsepower", "top_speed", "color", "mileage",
+                 "vin", "is_sold", "discount", "version")
+
     def __init__(self, make, model, year, price, horsepower, top_speed, color="Black", mileage=0, vin=None):
         """
         Initialize a Car object with realistic attributes.
@@ -30,6 +73,24 @@ class Car:
         self.vin = vin if vin else str(uuid.uuid4())[:17]  # Generate a 17-char VIN-like unique ID
         self.is_sold = False  # Track if the car has been sold
         self.discount = 0.0  # Percentage discount for promotions
+        self.version = 0  # Bumped on every change; used for compare-and-set between terminals
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a Car from its saved dictionary (including sold status and discount)."""
+        data = dict(data)
+        is_sold = data.pop("is_sold", False)
+        discount = data.pop("discount", 0.0)
+        version = data.pop("version", 0)
+        car = cls(**data)
+        car.is_sold = is_sold
+        car.discount = discount
+        car.version = version
+        return car
+
+    def to_dict(self):
+        """Convert the car to a dictionary for saving."""
+        return {field: getattr(self, field) for field in self.__slots__}
 
     def display_info(self):
         """Display detailed information about the car, including VIN and discount."""
@@ -43,35 +104,57 @@ class Car:
     def update_price(self, new_price):
         """Update the base price of the car."""
         self.price = new_price
-        print(f"Price updated for {self.make} {self.model} to ${new_price:.2f}")
+        logger.info("Price updated for %s %s to $%.2f", self.make, self.model, new_price)
 
     def apply_discount(self, discount_percent):
         """Apply a discount percentage to the car."""
         self.discount = discount_percent
-        print(f"Applied {discount_percent}% discount to {self.make} {self.model}")
+        logger.info("Applied %s%% discount to %s %s", discount_percent, self.make, self.model)
 
     def mark_as_sold(self):
         """Mark the car as sold."""
         if not self.is_sold:
             self.is_sold = True
-            print(f"{self.make} {self.model} (VIN: {self.vin}) has been sold!")
+            logger.info("%s %s (VIN: %s) has been sold!", self.make, self.model, self.vin)
         else:
-            print(f"{self.make} {self.model} is already sold.")
+            logger.warning("%s %s is already sold.", self.make, self.model)
 
 # Define the Customer class for real-world sales tracking
 class Customer:
-    def __init__(self, name, email, phone):
+    __slots__ = ("customer_id", "name", "email", "phone", "purchases")
+
+    def __init__(self, name, email, phone, customer_id=None):
         """
         Initialize a Customer object.
         :param name: Customer's full name
         :param email: Customer's email address
         :param phone: Customer's phone number
+        :param customer_id: Stable customer number (assigned by the Inventory when the customer is added)
         """
+        self.customer_id = customer_id
         self.name = name
         self.email = email
         self.phone = phone
         self.purchases = []  # List of purchased car VINs
 
+    @classmethod
+    def from_dict(cls, data, position=None):
+        """
+        Rebuild a Customer from its saved dictionary (including purchases).
+        Customers saved before IDs existed get position + 1, which is what they would have been assigned.
+        """
+        customer_id = data.get("customer_id")
+        if customer_id is None and position is not None:
+            customer_id = position + 1
+        customer = cls(data["name"], data["email"], data["phone"], customer_id)
+        customer.purchases = list(data.get("purchases", []))
+        return customer
+
+    def to_dict(self):
+        """Convert the customer to a dictionary for saving."""
+        return {"customer_id": self.customer_id, "name": self.name, "email": self.email,
+                "phone": self.phone, "purchases": self.purchases}
+
     def display_info(self):
         """Display customer information."""
         return f"Customer: {self.name}, Email: {self.email}, Phone: {self.phone}, Purchases: {len(self.purchases)} cars"
@@ -82,6 +165,8 @@ class Customer:
 
 # Define the Sale class to record transactions
 class Sale:
+    __slots__ = ("car_vin", "customer_id", "customer_name", "sale_price", "tax", "total", "date", "car_make", "car_model")
+
     def __init__(self, car, customer, sale_price, tax_rate=0.07):
         """
         Initialize a Sale object.
@@ -91,11 +176,36 @@ class Sale:
         :param tax_rate: Sales tax rate (default 7%)
         """
         self.car_vin = car.vin
+        self.customer_id = customer.customer_id
         self.customer_name = customer.name
         self.sale_price = sale_price
         self.tax = sale_price * tax_rate
         self.total = sale_price + self.tax
-        self.date = "2023-10-01"  # Placeholder; in real-world, use datetime.now()
+        self.date = datetime.now().isoformat(timespec="seconds")  # Sale timestamp, e.g. 2024-05-01T14:30:00
+        self.car_make = car.make  # Kept on the sale so reports do not depend on the car still being in stock
+        self.car_model = car.model
+
+    def to_dict(self):
+        """Convert the sale to a dictionary for saving."""
+        return {"car_vin": self.car_vin, "customer_id": self.customer_id, "customer_name": self.customer_name,
+                "sale_price": self.sale_price, "tax": self.tax,
+                "total": self.total, "date": self.date,
+                "car_make": self.car_make, "car_model": self.car_model}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a Sale from its saved dictionary without needing the Car or Customer objects."""
+        sale = cls.__new__(cls)
+        sale.car_vin = data["car_vin"]
+        sale.customer_id = data.get("customer_id")  # Missing in sales saved before customers had IDs
+        sale.customer_name = data["customer_name"]
+        sale.sale_price = data["sale_price"]
+        sale.tax = data["tax"]
+        sale.total = data["total"]
+        sale.date = data["date"]
+        sale.car_make = data.get("car_make")  # Missing in sales saved before these fields existed
+        sale.car_model = data.get("car_model")
+        return sale
 
     def generate_receipt(self):
         """Generate a simple receipt string."""
@@ -106,16 +216,1653 @@ class Sale:
                 f"Total: ${self.total:.2f}\n"
                 f"Date: {self.date}")
 
+# Define the CarTable class: a compact column-oriented (struct-of-arrays) store for very large inventories
+class CarTable:
+    def __init__(self):
+        """
+        Initialize empty columns.
+        Numbers live in typed arrays and make/model/color are stored once in a shared string pool
+        and referenced by small integer codes, so each car costs a few dozen bytes plus its VIN.
+        """
+        self.vins = []
+        self.makes = array('I')  # Codes into self.strings
+        self.models = array('I')
+        self.colors = array('I')
+        self.years = array('i')
+        self.prices = array('d')
+        self.horsepower = array('i')
+        self.top_speeds = array('i')
+        self.mileages = array('i')
+        self.discounts = array('d')
+        self.sold = bytearray()
+        self.strings = []  # Distinct make/model/color strings
+        self._codes = {}  # String -> code
+
+    def _code(self, text):
+        code = self._codes.get(text)
+        if code is None:
+            code = self._codes[text] = len(self.strings)
+            self.strings.append(sys.intern(text))
+        return code
+
+    def append(self, car):
+        """Add a car to the table."""
+        self.vins.append(car.vin)
+        self.makes.append(self._code(car.make))
+        self.models.append(self._code(car.model))
+        self.colors.append(self._code(car.color))
+        self.years.append(car.year)
+        self.prices.append(car.price)
+        self.horsepower.append(car.horsepower)
+        self.top_speeds.append(car.top_speed)
+        self.mileages.append(car.mileage)
+        self.discounts.append(car.discount)
+        self.sold.append(car.is_sold)
+
+    def update(self, index, car):
+        """Write a (possibly modified) Car back to row index."""
+        self.vins[index] = car.vin
+        self.makes[index] = self._code(car.make)
+        self.models[index] = self._code(car.model)
+        self.colors[index] = self._code(car.color)
+        self.years[index] = car.year
+        self.prices[index] = car.price
+        self.horsepower[index] = car.horsepower
+        self.top_speeds[index] = car.top_speed
+        self.mileages[index] = car.mileage
+        self.discounts[index] = car.discount
+        self.sold[index] = car.is_sold
+
+    def __len__(self):
+        return len(self.vins)
+
+    def __getitem__(self, index):
+        """Return row index as a Car (a copy; use update() to write changes back)."""
+        strings = self.strings
+        car = Car(strings[self.makes[index]], strings[self.models[index]], self.years[index],
+                  self.prices[index], self.horsepower[index], self.top_speeds[index],
+                  strings[self.colors[index]], self.mileages[index], self.vins[index])
+        car.discount = self.discounts[index]
+        car.is_sold = bool(self.sold[index])
+        return car
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    @classmethod
+    def from_cars(cls, cars):
+        """Build a table from Car objects."""
+        table = cls()
+        for car in cars:
+            table.append(car)
+        return table
+
+    @classmethod
+    def from_dicts(cls, records):
+        """Build a table from saved car dictionaries (the "cars" list of inventory.json)."""
+        return cls.from_cars(Car.from_dict(record) for record in records)
+
+    def to_dicts(self):
+        """Yield each row as the same dictionary Car.to_dict() produces."""
+        for car in self:
+            yield car.to_dict()
+
+# Define the Journal class for append-only (write-ahead) persistence
+class Journal:
+    def __init__(self, path, fsync_every=64, fsync_interval=1.0):
+        """
+        Initialize an append-only journal of inventory changes.
+        :param path: Journal file path (one JSON record per line)
+        :param fsync_every: Force the journal to disk after this many records
+        :param fsync_interval: Force the journal to disk if this many seconds passed since the last fsync
+        """
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.entries = 0  # Number of records currently in the journal
+        self.offset = 0  # Bytes of the journal already applied to memory
+        self.inode = None  # Identity of the journal file read so far (changes when compaction replaces it)
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, seq, op, payload):
+        """Append one change record; fsync is batched by count and time."""
+        self.append_many([(seq, op, payload)])
+
+    def append_many(self, records):
+        """Append several (seq, op, payload) records with a single write."""
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self.inode = os.fstat(self._file.fileno()).st_ino
+        self._file.write("".join(json.dumps({"seq": seq, "op": op, "data": payload}) + "\n"
+                                 for seq, op, payload in records))
+        self._file.flush()
+        self.offset = self._file.tell()  # The writer has applied everything up to the end
+        self.entries += len(records)
+        self._unsynced += len(records)
+        if (self._unsynced >= self.fsync_every or
+                time.monotonic() - self._last_sync >= self.fsync_interval):
+            self.sync()
+
+    def sync(self):
+        """Force all written records to disk."""
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def replay(self):
+        """
+        Read back all complete records in order.
+        A torn or corrupt tail (e.g. from a crash mid-write) is cut off so new records append cleanly.
+        """
+        records = []
+        self.offset, self.inode, self.entries = 0, None, 0
+        if not os.path.exists(self.path):
+            return records
+        good_offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Partially written last record
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break  # Corrupt record; nothing after it can be trusted
+                good_offset += len(line)
+        if good_offset < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_offset)
+            logger.warning("Journal recovered: dropped incomplete data after byte %d.", good_offset)
+        self.entries = len(records)
+        self.offset = good_offset
+        self.inode = os.stat(self.path).st_ino
+        return records
+
+    def read_new(self, inode):
+        """
+        Read complete records appended (by any process) since the last read, without modifying the file.
+        A record still being written by another process is left for the next call.
+        :param inode: The journal file the offset belongs to
+        :return: The records, or None if the file at the path is no longer that journal (compaction
+                 replaced it); the caller must then reload instead of reading the new file from the old offset
+        """
+        records = []
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return None
+        with f:
+            if os.fstat(f.fileno()).st_ino != inode:
+                return None
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+                self.offset += len(line)
+        self.entries += len(records)
+        return records
+
+    def reset(self):
+        """Start an empty journal once its records are part of a snapshot."""
+        self.close()
+        # Swap in a new file (rather than truncating) so other processes notice the change
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.entries = 0
+        self.offset = 0
+        self.inode = os.stat(self.path).st_ino
+
+    def close(self):
+        """Sync and close the journal file."""
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+# Define the JSONStreamReader class: reads a large JSON file in chunks instead of all at once
+class JSONStreamReader:
+    def __init__(self, f, total, progress=None, chunk_size=1 << 20):
+        """
+        Initialize a chunked reader over a binary file.
+        Bytes are decoded as latin-1 (one character per byte) so string positions are also file offsets.
+        :param f: File opened in binary mode
+        :param total: File size in bytes (for progress reports)
+        :param progress: Optional callback progress(bytes_read, total_bytes)
+        :param chunk_size: Bytes read per chunk
+        """
+        self.f = f
+        self.total = total
+        self.progress = progress
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""  # Unconsumed text starts at self.pos
+        self.pos = 0
+        self.base = 0  # File offset of self.buf[0]
+        self.eof = False
+
+    def _fill(self):
+        """Drop consumed text and read the next chunk; returns False at end of file."""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk.decode('latin-1')
+        self.base += self.pos
+        self.pos = 0
+        if self.progress:
+            self.progress(self.f.tell(), self.total)
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character ('' at end of file)."""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        """Consume the given structural character."""
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at byte {self.base + self.pos}")
+        self.pos += 1
+
+    def decode(self):
+        """Decode the next JSON value; returns (value, start, end) with byte offsets."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A value ending exactly at the buffer edge (e.g. a number) may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    break
+            except ValueError:
+                if self.eof:
+                    raise
+            self._fill()
+        text = self.buf[self.pos:end]
+        if not text.isascii():  # Re-decode properly if the record holds raw UTF-8
+            value = json.loads(text.encode('latin-1'))
+        start, self.pos = self.base + self.pos, end
+        return value, start, self.base + end
+
+    def skip_object(self):
+        """
+        Find the next value without decoding it, if it is an object with no objects nested inside.
+        Returns (text, start, end) with byte offsets, or None (with nothing consumed) for any other value.
+        """
+        if self.peek() != "{":
+            return None
+        while True:
+            buf, pos = self.buf, self.pos
+            end = buf.find("}", pos) + 1
+            if end:
+                text = buf[pos:end]
+                # Common case, checked without a regex: no escapes, no other "{", and an even number of
+                # quotes before the first "}", which therefore is outside any string and closes the object
+                if text.count("{") == 1 and not text.count('"') % 2 and "\\" not in text:
+                    break
+                end = FLAT_OBJECT_PREFIX.match(buf, pos).end()
+                if end < len(buf):
+                    if buf[end] == "{":
+                        return None  # Nested object
+                    if buf[end] == "}":
+                        end += 1
+                        text = buf[pos:end]
+                        break
+            if self.eof or not self._fill():
+                return None  # Truncated; decode() reports the error
+        start, self.pos = self.base + pos, end
+        return text, start, self.base + end
+
+    def iter_objects(self):
+        """
+        Yield (text, start, end) for the following array elements as long as they are flat objects
+        (see skip_object), consuming the commas between them; stops before "]" or any other value.
+        """
+        while True:
+            buf = self.buf
+            pos = SEPARATORS.match(buf, self.pos).end()
+            if pos == len(buf):
+                self.pos = pos
+                if self.eof or not self._fill():
+                    return
+                continue
+            end = buf.find("}", pos) + 1
+            if end and buf[pos] == "{":
+                text = buf[pos:end]
+                if text.count("{") == 1 and not text.count('"') % 2 and "\\" not in text:
+                    self.pos = end
+                    yield text, self.base + pos, self.base + end
+                    continue
+            self.pos = pos
+            found = self.skip_object()
+            if found is None:
+                return
+            yield found
+
+# An object's opening brace and everything up to its closing brace, as long as no object is nested
+# inside (strings may hold any brace). Stops early at a nested "{", or at the end of the buffered text.
+FLAT_OBJECT_PREFIX = re.compile(r'\{(?:[^{}"]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+WHITESPACE = re.compile(r'[ \t\r\n]*')
+SEPARATORS = re.compile(r'[ \t\r\n,]*')
+FIELD_PATTERNS = {}  # Field name -> compiled pattern finding its value in a record's text
+
+def record_fields(record, names):
+    """
+    Read a few top-level fields of a record yielded by iter_json_arrays: a dict, or the undecoded
+    text of a flat object (see raw_keys), where only the wanted values are decoded.
+    Returns a dict with the names found.
+    """
+    if isinstance(record, dict):
+        return {name: record[name] for name in names if name in record}
+    fields = {}
+    for name in names:
+        pattern = FIELD_PATTERNS.get(name)
+        if pattern is None:
+            # A quoted key followed by a colon can't occur inside a string value, where quotes are escaped
+            pattern = FIELD_PATTERNS[name] = re.compile(rf'"{name}"\s*:\s*("[^"\\]*(?:\\.[^"\\]*)*"|[^,}}\s]+)')
+        match = pattern.search(record)
+        if match:
+            value = match.group(1)
+            if value.isdigit():
+                fields[name] = int(value)
+            elif value[0] == '"' and "\\" not in value and value.isascii():
+                fields[name] = value[1:-1]
+            else:
+                fields[name] = json.loads(value.encode('latin-1'))
+    return fields
+
+def iter_json_arrays(path, progress=None, raw_keys=()):
+    """
+    Yield (key, start, end, value) for every element of the arrays in a top-level JSON object,
+    e.g. ("cars", 40, 412, {...}), without loading the whole file. start/end are byte offsets.
+    Top-level values that are not arrays are yielded once with start and end set to None.
+    Elements of the arrays named in raw_keys are not decoded when they are flat objects: value is
+    then their text (read fields with record_fields).
+    """
+    with open(path, 'rb') as f:
+        reader = JSONStreamReader(f, os.path.getsize(path), progress)
+        reader.expect("{")
+        while reader.peek() != "}":
+            if reader.peek() == ",":
+                reader.pos += 1
+            key = reader.decode()[0]
+            reader.expect(":")
+            if reader.peek() != "[":
+                yield key, None, None, reader.decode()[0]
+                continue
+            reader.pos += 1
+            raw = key in raw_keys
+            while reader.peek() != "]":
+                if reader.peek() == ",":
+                    reader.pos += 1
+                if raw:
+                    for text, start, end in reader.iter_objects():
+                        yield key, start, end, text
+                    if reader.peek() == "]":
+                        break
+                value, start, end = reader.decode()
+                yield key, start, end, value
+            reader.pos += 1
+
+def print_progress(done, total):
+    """Progress callback that prints a one-line loading percentage."""
+    percent = 100 * done // total if total else 100
+    print(f"\rLoading inventory: {percent}%", end="\n" if done >= total else "", flush=True)
+
+# Define the LazyRecords class: a list-like view of records that are only built when accessed
+class LazyRecords:
+    def __init__(self, path, factory, positional=False):
+        """
+        Initialize an empty lazy sequence.
+        Only each record's byte range in the file is kept (16 bytes per record); the object is
+        built with factory(dict) on first access and cached from then on.
+        :param path: JSON file holding the records
+        :param factory: Builds an object from a record dictionary (e.g. Customer.from_dict)
+        :param positional: If True, the factory is called as factory(dict, position)
+        """
+        self.path = path
+        self.factory = factory
+        self.positional = positional
+        self.starts = array('q')
+        self.ends = array('q')
+        self.loaded = {}  # Position -> object built on first access (or appended)
+        self._count = 0
+        self._file = None
+
+    def add_location(self, start, end):
+        """Register the byte range of the next record in the file."""
+        self.starts.append(start)
+        self.ends.append(end)
+        self._count += 1
+
+    def raw(self, position):
+        """Return the stored JSON bytes of a record, or None if it only exists in memory."""
+        if position >= len(self.starts):
+            return None
+        if self._file is None:
+            self._file = open(self.path, 'rb')
+        self._file.seek(self.starts[position])
+        return self._file.read(self.ends[position] - self.starts[position])
+
+    def _build(self, position):
+        data = json.loads(self.raw(position))
+        return self.factory(data, position) if self.positional else self.factory(data)
+
+    def _position(self, index):
+        position = index + self._count if index < 0 else index
+        if not 0 <= position < self._count:
+            raise IndexError("record index out of range")
+        return position
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        position = self._position(index)
+        item = self.loaded.get(position)
+        if item is None:
+            item = self.loaded[position] = self._build(position)
+        return item
+
+    def __iter__(self):
+        """Yield every record; ones not accessed yet are built on the fly and not kept in memory."""
+        for position in range(self._count):
+            item = self.loaded.get(position)
+            yield item if item is not None else self._build(position)
+
+    def append(self, item):
+        """Add a new in-memory record."""
+        self.loaded[self._count] = item
+        self._count += 1
+
+    def index(self, item):
+        """Position of an object previously returned by this sequence (or appended to it)."""
+        for position, loaded in self.loaded.items():
+            if loaded is item:
+                return position
+        raise ValueError("record is not loaded")
+
+    def relocate(self, path, starts, ends):
+        """Point at the records' new byte ranges after a snapshot was rewritten."""
+        self.close()
+        self.path, self.starts, self.ends = path, starts, ends
+
+    def close(self):
+        """Close the underlying file handle."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+# Define the JSONStorage class: the whole inventory in one JSON file, optionally with a journal
+class JSONStorage:
+    supports_queries = False  # Searches and reports are answered from memory
+
+    def __init__(self, data_file='inventory.json', journal=False, fsync_every=64, compact_every=10000,
+                 lazy=False, progress=None, shared=False):
+        """
+        Initialize JSON file storage.
+        :param data_file: JSON snapshot file
+        :param journal: If True, changes are appended to a journal instead of rewriting the whole file
+        :param fsync_every: Journal records written between forced disk syncs
+        :param compact_every: Journal records after which a new snapshot is written (None to only compact on demand)
+        :param lazy: If True, customers and sales are only built when first accessed (see LazyRecords)
+        :param progress: Optional callback progress(bytes_read, total_bytes) while loading
+        :param shared: If True, several processes can use the same files (needs journal=True and POSIX locks)
+        """
+        if shared and not journal:
+            raise ValueError("Shared mode requires journal=True.")
+        if shared and fcntl is None:
+            raise RuntimeError("Shared mode requires POSIX file locks (fcntl), which this platform lacks.")
+        self.data_file = data_file
+        self.shared = shared
+        self.lock_file = data_file + '.lock'
+        self._lock_depth = 0
+        self.lazy = lazy
+        self.progress = progress
+        self.journal = Journal(data_file + '.journal', fsync_every) if journal else None
+        self.compact_every = compact_every
+        self.journal_seq = 0  # Sequence number of the last change applied
+
+    @contextlib.contextmanager
+    def _locked(self, mode):
+        """Hold the advisory lock file in shared mode (fcntl.LOCK_SH or LOCK_EX); re-entrant in this process."""
+        if not self.shared or self._lock_depth:
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+            return
+        with open(self.lock_file, 'a') as handle:
+            fcntl.flock(handle, mode)
+            self._lock_depth = 1
+            try:
+                yield
+            finally:
+                self._lock_depth = 0
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    @contextlib.contextmanager
+    def transaction(self, inventory):
+        """
+        Exclusive section for a change. In shared mode this takes the write lock and first applies
+        changes made by other processes, so checks inside (e.g. "is the car still unsold?") see the latest state.
+        """
+        with self._locked(fcntl.LOCK_EX if self.shared else None):
+            if self.shared and self._lock_depth == 1:
+                self.refresh(inventory)
+            yield
+
+    def refresh(self, inventory):
+        """
+        Apply journal records other processes appended since the last look (shared mode).
+        Takes the shared lock, so a compaction elsewhere can't swap the files between checking the
+        journal and reading it; if the journal was replaced anyway, everything is reloaded.
+        """
+        if not self.shared:
+            return
+        with self._locked(fcntl.LOCK_SH):
+            records = self.read_changes()
+            if records is None:
+                self._reload(inventory)  # Compacted elsewhere
+            else:
+                self.apply_changes(inventory, records)
+
+    def read_changes(self):
+        """
+        Read the journal records other processes appended since the last look (shared mode) without
+        applying them, so the file locking and I/O can happen away from the thread that owns the inventory.
+        :return: The records to pass to apply_changes, or None if another process compacted since the
+                 last look and the inventory must be refreshed (reloaded) instead
+        """
+        with self._locked(fcntl.LOCK_SH):
+            try:
+                stat = os.stat(self.journal.path)
+            except FileNotFoundError:
+                stat = None
+            if stat is not None and self.journal.inode is None and self.journal.offset == 0:
+                self.journal.inode = stat.st_ino  # Journal created by another process since we loaded
+            if stat is None or stat.st_ino != self.journal.inode:
+                return None
+            if stat.st_size == self.journal.offset:
+                return []
+            return self.journal.read_new(self.journal.inode)  # None if compacted after the check above
+
+    def apply_changes(self, inventory, records):
+        """Apply records returned by read_changes."""
+        for record in records:
+            if record["seq"] > self.journal_seq:
+                inventory._apply(record["op"], record["data"])
+                self.journal_seq = record["seq"]
+
+    def _reload(self, inventory):
+        """Reload the new snapshot and journal written by another process's compaction."""
+        self.journal.close()
+        self.load(inventory)
+
+    def record(self, inventory, op, payload):
+        """Persist one change: append it to the journal, or rewrite the whole file without one."""
+        if self.journal is None:
+            self.save(inventory)
+            return
+        with self.transaction(inventory):
+            self._append(inventory, op, payload)
+
+    def _append(self, inventory, op, payload):
+        self.journal_seq += 1
+        self.journal.append(self.journal_seq, op, payload)
+        if self.compact_every and self.journal.entries >= self.compact_every:
+            self.compact(inventory)
+
+    def record_many(self, inventory, op, payloads):
+        """Persist a batch of changes of one kind with a single write and fsync (or one full save)."""
+        if self.journal is None:
+            self.save(inventory)
+            return
+        with self.transaction(inventory):
+            self._append_many(inventory, op, payloads)
+
+    def _append_many(self, inventory, op, payloads):
+        first_seq = self.journal_seq + 1
+        self.journal_seq += len(payloads)
+        if self.compact_every and self.journal.entries + len(payloads) >= self.compact_every:
+            self.compact(inventory)  # The batch would trigger compaction anyway; skip journaling it
+            return
+        self.journal.append_many([(first_seq + i, op, payload) for i, payload in enumerate(payloads)])
+        self.journal.sync()
+        if self.compact_every and self.journal.entries >= self.compact_every:
+            self.compact(inventory)
+
+    def compact(self, inventory):
+        """Write a fresh snapshot and empty the journal."""
+        with self.transaction(inventory):
+            self.save(inventory)
+
+    def close(self):
+        """Flush any pending journal records to disk."""
+        if self.journal is not None:
+            self.journal.close()
+
+    def save(self, inventory):
+        """Save inventory, customers, and sales to JSON file with pretty printing."""
+        with self._locked(fcntl.LOCK_EX if self.shared else None):
+            self._save(inventory)
+
+    def _save(self, inventory):
+        # Write to a temporary file and swap it in, so a crash never leaves a half-written snapshot
+        tmp_file = self.data_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            locations = self._write_snapshot(f, inventory)
+            f.flush()
+            os.fsync(f.fileno())
+        for key, (starts, ends) in locations.items():
+            records = getattr(inventory, key)
+            if isinstance(records, LazyRecords):
+                records.close()  # Release the old file before it is replaced
+        os.replace(tmp_file, self.data_file)
+        for key, (starts, ends) in locations.items():
+            records = getattr(inventory, key)
+            if isinstance(records, LazyRecords):
+                records.relocate(self.data_file, starts, ends)
+        if self.journal is not None:
+            self.journal.reset()
+        logger.info("Data saved to file.")
+
+    def _write_snapshot(self, f, inventory):
+        """
+        Stream the snapshot out record by record, in the same layout as json.dump(indent=4, sort_keys=True).
+        Lazy records that were never accessed are copied byte for byte instead of being decoded.
+        Returns {section: (starts, ends)} with the byte range of every record written.
+        """
+        offset = 0
+        locations = {}
+
+        def write(data):
+            nonlocal offset
+            f.write(data)
+            offset += len(data)
+
+        sections = {"cars": inventory.cars, "customers": inventory.customers, "journal_seq": self.journal_seq,
+                    "reprice_log": inventory.reprice_log, "sales": inventory.sales}
+        write(b"{")
+        for number, key in enumerate(sorted(sections)):
+            records = sections[key]
+            write(f'{"," if number else ""}\n    "{key}": '.encode())
+            if isinstance(records, int):
+                write(json.dumps(records).encode())
+                continue
+            if not len(records):
+                write(b"[]")
+                continue
+            lazy = isinstance(records, LazyRecords)
+            starts, ends = array('q'), array('q')
+            for position in range(len(records)):
+                raw = records.raw(position) if lazy and position not in records.loaded else None
+                if raw is None:
+                    raw = self._format_record(records[position].to_dict()).encode()
+                write(b"[\n        " if position == 0 else b",\n        ")
+                starts.append(offset)
+                write(raw)
+                ends.append(offset)
+            write(b"\n    ]")
+            locations[key] = (starts, ends)
+        write(b"\n}")
+        return locations
+
+    @staticmethod
+    def _format_record(record):
+        """Format a record exactly as json.dump(indent=4) would at array depth (8 spaces)."""
+        if record and not any(isinstance(value, (list, dict)) for value in record.values()):
+            # Flat records: the C encoder with a newline separator gives the same text much faster
+            body = json.dumps(record, sort_keys=True, separators=(",\n            ", ": "))
+            return "{\n            " + body[1:-1] + "\n        }"
+        return json.dumps(record, indent=4, sort_keys=True).replace("\n", "\n        ")
+
+    def load(self, inventory):
+        """
+        Load data from JSON file if exists, then replay any journaled changes made after it.
+        The file is parsed incrementally; cars are built right away (the indexes need them) while in
+        lazy mode customers and sales are not even decoded: only their byte ranges and the fields the
+        lookups need are read, and the sales analytics are built on first use.
+        """
+        with self._locked(fcntl.LOCK_SH if self.shared else None):
+            self._load(inventory)
+
+    def _load(self, inventory):
+        for records in (inventory.customers, inventory.sales):
+            if isinstance(records, LazyRecords):
+                records.close()  # Replaced below; a reload after another terminal's compaction must not leak it
+        inventory.cars, inventory.customers, inventory.sales, inventory.reprice_log = [], [], [], []
+        inventory.index.rebuild([])
+        inventory._clear_indexes()
+        self.journal_seq = 0
+        if os.path.exists(self.data_file):
+            raw_keys = ()
+            if self.lazy:
+                inventory.customers = LazyRecords(self.data_file, Customer.from_dict, positional=True)
+                inventory.sales = LazyRecords(self.data_file, Sale.from_dict)
+                inventory._analytics = None
+                raw_keys = ("customers", "sales")
+            factories = {"cars": Car.from_dict, "customers": Customer.from_dict, "sales": Sale.from_dict,
+                         "reprice_log": PriceBatch.from_dict}
+            positional = {"customers"}  # Legacy customer IDs come from the record's position
+            indexed = False
+            for key, start, end, value in iter_json_arrays(self.data_file, self.progress, raw_keys):
+                if key != "cars" and not indexed:  # Cars come first; index them before sales need lookups
+                    inventory.index.rebuild(inventory.cars)
+                    indexed = True
+                if key == "journal_seq":
+                    self.journal_seq = value
+                elif key in factories:
+                    records = getattr(inventory, key)
+                    position = len(records)
+                    if isinstance(records, LazyRecords):
+                        records.add_location(start, end)
+                        if key == "customers":
+                            fields = record_fields(value, ("customer_id", "email"))
+                            customer_id = fields.get("customer_id")
+                            inventory._index_customer_keys(position + 1 if customer_id is None else customer_id,
+                                                           fields.get("email"), position)
+                            continue
+                        fields = record_fields(value, ("car_vin", "customer_id"))
+                        if fields.get("customer_id") is not None:
+                            inventory._index_sale_keys(fields["car_vin"], fields["customer_id"], position)
+                            continue
+                        # A sale saved before customers had IDs: build it to find the buyer
+                        value = json.loads(value.encode('latin-1')) if isinstance(value, str) else value
+                    record = factories[key](value, position) if key in positional else factories[key](value)
+                    if not isinstance(records, LazyRecords):
+                        records.append(record)
+                    if key == "customers":
+                        inventory._index_customer(record, position)
+                    elif key == "sales":
+                        inventory._track_sale(record, position)  # Aggregates and lookups are built in the same pass
+            if not indexed:
+                inventory.index.rebuild(inventory.cars)
+            logger.info("Data loaded from file.")
+        if self.journal is not None:
+            replayed = 0
+            for record in self.journal.replay():
+                # Records already covered by the snapshot are skipped (crash between snapshot and reset)
+                if record["seq"] <= self.journal_seq:
+                    continue
+                inventory._apply(record["op"], record["data"])
+                self.journal_seq = record["seq"]
+                replayed += 1
+            if replayed:
+                logger.info("Replayed %d journaled changes.", replayed)
+
+# Columns of the cars table, in the order used by SQLiteStorage
+CAR_COLUMNS = ("vin", "make", "model", "year", "price", "horsepower", "top_speed",
+               "color", "mileage", "is_sold", "discount")
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cars (
+    vin TEXT PRIMARY KEY, make TEXT NOT NULL, model TEXT NOT NULL, year INTEGER NOT NULL,
+    price REAL NOT NULL, horsepower INTEGER NOT NULL, top_speed INTEGER NOT NULL,
+    color TEXT, mileage INTEGER, is_sold INTEGER NOT NULL DEFAULT 0, discount REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS cars_make ON cars (make COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS cars_model ON cars (model COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS cars_price ON cars (price);
+CREATE INDEX IF NOT EXISTS cars_horsepower ON cars (horsepower);
+CREATE TABLE IF NOT EXISTS customers (
+    position INTEGER PRIMARY KEY, name TEXT NOT NULL, email TEXT, phone TEXT
+);
+CREATE TABLE IF NOT EXISTS sales (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, car_vin TEXT NOT NULL, customer INTEGER NOT NULL,
+    customer_name TEXT, sale_price REAL NOT NULL, tax REAL NOT NULL, total REAL NOT NULL, date TEXT,
+    car_make TEXT, car_model TEXT
+);
+CREATE INDEX IF NOT EXISTS sales_car_vin ON sales (car_vin);
+CREATE INDEX IF NOT EXISTS sales_customer ON sales (customer);
+CREATE TABLE IF NOT EXISTS price_batches (
+    batch_id INTEGER PRIMARY KEY, record TEXT NOT NULL
+);
+"""
+
+# Define the SQLiteStorage class: one row per car/customer/sale in a WAL-mode SQLite database
+class SQLiteStorage:
+    supports_queries = True  # Searches and reports are pushed down into SQL
+
+    def __init__(self, db_file='inventory.db'):
+        """
+        Initialize SQLite storage.
+        Current stock and customers are loaded into memory; sales history stays in the database
+        and is only read by reports, so startup does not grow with the number of past sales.
+        :param db_file: SQLite database file
+        """
+        self.db_file = db_file
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL; commits skip the extra fsync
+        self.conn.executescript(SQLITE_SCHEMA)
+        sales_columns = {row[1] for row in self.conn.execute("PRAGMA table_info(sales)")}
+        for column in ("car_make", "car_model"):  # Databases created before sales stored the car model
+            if column not in sales_columns:
+                self.conn.execute(f"ALTER TABLE sales ADD COLUMN {column} TEXT")
+        self._insert_car = (f"INSERT OR REPLACE INTO cars ({', '.join(CAR_COLUMNS)}) "
+                            f"VALUES ({', '.join('?' * len(CAR_COLUMNS))})")
+
+    @staticmethod
+    def _car_row(car):
+        return tuple(getattr(car, column) if column != "is_sold" else int(car.is_sold) for column in CAR_COLUMNS)
+
+    def record(self, inventory, op, payload):
+        """Write one change as a single-row statement and commit it."""
+        with self.conn:
+            if op == "add_car":
+                self.conn.execute(self._insert_car, self._car_row(inventory.index.by_vin[payload["vin"]]))
+            elif op == "remove_car":
+                self.conn.execute("DELETE FROM cars WHERE vin = ?", (payload["vin"],))
+            elif op == "update_car":
+                for column, value in payload.items():
+                    if column in CAR_COLUMNS and column != "vin":
+                        self.conn.execute(f"UPDATE cars SET {column} = ? WHERE vin = ?", (value, payload["vin"]))
+            elif op == "add_customer":
+                self.conn.execute("INSERT INTO customers (position, name, email, phone) VALUES (?, ?, ?, ?)",
+                                  (len(inventory.customers) - 1, payload["name"], payload["email"], payload["phone"]))
+            elif op == "sale":
+                sale = payload["sale"]
+                self.conn.execute("INSERT INTO sales (car_vin, customer, customer_name, sale_price, tax, total, date, "
+                                  "car_make, car_model) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                  (sale["car_vin"], payload["customer"], sale["customer_name"],
+                                   sale["sale_price"], sale["tax"], sale["total"], sale["date"],
+                                   sale["car_make"], sale["car_model"]))
+                self.conn.execute("UPDATE cars SET is_sold = 1 WHERE vin = ?", (sale["car_vin"],))
+            elif op == "reprice":
+                self.conn.executemany("UPDATE cars SET price = ?, discount = ? WHERE vin = ?",
+                                      ((price, discount, vin) for vin, _, _, price, discount, _ in payload["changes"]))
+                self.conn.execute("INSERT INTO price_batches (batch_id, record) VALUES (?, ?)",
+                                  (payload["batch_id"], json.dumps(payload)))
+            elif op == "undo_reprice":
+                self.conn.executemany("UPDATE cars SET price = ?, discount = ? WHERE vin = ?",
+                                      ((price, discount, vin) for vin, price, discount, _ in payload["changes"]))
+                self.conn.execute("DELETE FROM price_batches WHERE batch_id = ?", (payload["batch_id"],))
+
+    def record_many(self, inventory, op, payloads):
+        """Write a batch of added cars or customers in one transaction."""
+        with self.conn:
+            if op == "add_car":
+                self.conn.executemany(self._insert_car, (self._car_row(inventory.index.by_vin[payload["vin"]])
+                                                         for payload in payloads))
+            elif op == "add_customer":
+                first = len(inventory.customers) - len(payloads)
+                self.conn.executemany("INSERT INTO customers (position, name, email, phone) VALUES (?, ?, ?, ?)",
+                                      ((first + i, payload["name"], payload["email"], payload["phone"])
+                                       for i, payload in enumerate(payloads)))
+            else:
+                raise ValueError(f"Unsupported batch operation: {op}")
+
+    def transaction(self, inventory):
+        """SQLite serializes writers itself; no extra locking is needed around in-memory checks."""
+        return contextlib.nullcontext()
+
+    def refresh(self, inventory):
+        """Changes by other processes are not pulled into memory for this backend."""
+
+    def compact(self, inventory):
+        """Fold the write-ahead log back into the database file."""
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        """Close the database connection."""
+        self.conn.close()
+
+    def save(self, inventory):
+        """Write all in-memory cars and customers in one transaction (sales are already stored)."""
+        with self.conn:
+            self.conn.execute("DELETE FROM cars")
+            self.conn.executemany(self._insert_car, (self._car_row(car) for car in inventory.cars))
+            self.conn.executemany("INSERT OR REPLACE INTO customers (position, name, email, phone) VALUES (?, ?, ?, ?)",
+                                  ((i, cust.name, cust.email, cust.phone) for i, cust in enumerate(inventory.customers)))
+        logger.info("Data saved to database.")
+
+    def load(self, inventory):
+        """Load cars and customers; purchases and sales analytics are rebuilt from one pass over the sales table."""
+        cursor = self.conn.execute(f"SELECT {', '.join(CAR_COLUMNS)} FROM cars ORDER BY rowid")
+        inventory.cars = [Car.from_dict(dict(zip(CAR_COLUMNS, row), is_sold=bool(row[9]))) for row in cursor]
+        # Customers are keyed by position in this backend, so their ID is always position + 1
+        inventory.customers = [Customer(name, email, phone, position + 1) for position, name, email, phone in
+                               self.conn.execute("SELECT position, name, email, phone FROM customers ORDER BY position")]
+        inventory.index.rebuild(inventory.cars)
+        inventory.reprice_log = [PriceBatch.from_dict(json.loads(record)) for (record,) in
+                                 self.conn.execute("SELECT record FROM price_batches ORDER BY batch_id")]
+        inventory._clear_indexes()
+        for position, customer in enumerate(inventory.customers):
+            inventory._index_customer(customer, position)
+        for customer, sale in self._select_sales():
+            inventory.customers[customer].add_purchase(sale.car_vin)
+            inventory._track_sale(sale)
+        if inventory.cars or inventory.customers:
+            logger.info("Data loaded from database.")
+
+    def search_cars(self, keyword="", min_price=None, max_price=None, min_hp=None):
+        """Return VINs matching the same keyword rules as CarIndex.search, filtered in SQL."""
+        clauses, params = [], []
+        for word in CarIndex.tokenize(keyword):
+            word = word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append("(make LIKE ? ESCAPE '\\' OR make LIKE ? ESCAPE '\\' OR model LIKE ? ESCAPE '\\' "
+                           "OR model LIKE ? ESCAPE '\\' OR color LIKE ? ESCAPE '\\' OR color LIKE ? ESCAPE '\\' "
+                           "OR CAST(year AS TEXT) LIKE ? ESCAPE '\\')")
+            params += [word + "%", "% " + word + "%"] * 3 + [word + "%"]
+        if min_price is not None:
+            clauses.append("price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            clauses.append("price <= ?")
+            params.append(max_price)
+        if min_hp is not None:
+            clauses.append("horsepower >= ?")
+            params.append(min_hp)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return [vin for (vin,) in self.conn.execute("SELECT vin FROM cars" + where, params)]
+
+    def sales_summary(self):
+        """Return (number of sales, total revenue) computed by the database."""
+        count, revenue = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(total), 0) FROM sales").fetchone()
+        return count, revenue
+
+    def iter_sales(self):
+        """Yield stored sales one at a time, oldest first."""
+        for _, sale in self._select_sales():
+            yield sale
+
+    def sales_for_customer(self, position):
+        """Return all sales to the customer at this position, oldest first (uses the sales_customer index)."""
+        return [sale for _, sale in self._select_sales(" WHERE customer = ?", (position,))]
+
+    def sale_for_vin(self, vin):
+        """Return the latest sale of this VIN, or None (uses the sales_car_vin index)."""
+        sales = [sale for _, sale in self._select_sales(" WHERE car_vin = ?", (vin,))]
+        return sales[-1] if sales else None
+
+    def _select_sales(self, where="", params=()):
+        """Yield (customer position, Sale) for the stored sales matching an optional WHERE clause, oldest first."""
+        columns = [column for column in Sale.__slots__ if column != "customer_id"]
+        cursor = self.conn.execute(f"SELECT customer, {', '.join(columns)} FROM sales{where} ORDER BY id", params)
+        for row in cursor:
+            yield row[0], Sale.from_dict(dict(zip(columns, row[1:]), customer_id=row[0] + 1))
+
+# Define the CarIndex class for fast lookups and searches over the inventory
+class CarIndex:
+    FUZZY_THRESHOLD = 0.5  # Minimum trigram similarity for a misspelt word to match a token
+
+    def __init__(self, cache_size=256):
+        """
+        Initialize empty VIN, keyword, trigram and sorted price/horsepower indexes.
+        :param cache_size: Number of query results kept in the LRU cache (cleared whenever a car changes)
+        """
+        self.by_vin = {}  # VIN -> Car
+        self.tokens = {}  # Keyword token (make/model/color word or year) -> set of VINs
+        self.sorted_tokens = []  # Distinct tokens in sorted order, for prefix lookups
+        self.trigrams = {}  # Trigram -> set of tokens containing it, for fuzzy lookups
+        self.price_keys, self.price_vins = [], []  # Parallel lists sorted by price
+        self.hp_keys, self.hp_vins = [], []  # Parallel lists sorted by horsepower
+        self._indexed = {}  # VIN -> (tokens, price, horsepower) as currently indexed
+        self.cache = OrderedDict()  # (query kind, arguments) -> results
+        self.cache_size = cache_size
+
+    @staticmethod
+    def tokenize(text):
+        """Split search text into lowercase tokens."""
+        return text.lower().split()
+
+    @staticmethod
+    def trigrams_of(token):
+        """Trigrams of a token, padded so the start and end of the word count too ("  f", " fo", "for", ...)."""
+        padded = f"  {token} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, car):
+        """Index a car."""
+        self.cache.clear()
+        self._add_unsorted(car)
+        self._insert_sorted(self.price_keys, self.price_vins, car.price, car.vin)
+        self._insert_sorted(self.hp_keys, self.hp_vins, car.horsepower, car.vin)
+
+    def add_many(self, cars):
+        """Index many cars at once, merging them into the sorted lists with one sort instead of one insert each."""
+        cars = list(cars)
+        self.cache.clear()
+        for car in cars:
+            self._add_unsorted(car)
+        self.price_keys, self.price_vins = self._merge(self.price_keys, self.price_vins,
+                                                       [(car.price, car.vin) for car in cars])
+        self.hp_keys, self.hp_vins = self._merge(self.hp_keys, self.hp_vins,
+                                                 [(car.horsepower, car.vin) for car in cars])
+
+    def _add_unsorted(self, car):
+        """Add a car to the VIN and keyword indexes."""
+        tokens = set(self.tokenize(f"{car.make} {car.model} {car.color or ''} {car.year}"))
+        for token in tokens:
+            if token not in self.tokens:
+                self.tokens[token] = set()
+                bisect.insort(self.sorted_tokens, token)
+                for gram in self.trigrams_of(token):
+                    self.trigrams.setdefault(gram, set()).add(token)
+            self.tokens[token].add(car.vin)
+        self.by_vin[car.vin] = car
+        self._indexed[car.vin] = (tokens, car.price, car.horsepower)
+
+    def remove(self, car):
+        """Remove a car from the index."""
+        self.cache.clear()
+        tokens, price, horsepower = self._indexed.pop(car.vin)
+        for token in tokens:
+            vins = self.tokens[token]
+            vins.discard(car.vin)
+            if not vins:
+                del self.tokens[token]
+                del self.sorted_tokens[bisect.bisect_left(self.sorted_tokens, token)]
+                for gram in self.trigrams_of(token):
+                    grams = self.trigrams[gram]
+                    grams.discard(token)
+                    if not grams:
+                        del self.trigrams[gram]
+        self._delete_sorted(self.price_keys, self.price_vins, price, car.vin)
+        self._delete_sorted(self.hp_keys, self.hp_vins, horsepower, car.vin)
+        del self.by_vin[car.vin]
+
+    def update(self, car):
+        """Re-index a car after its attributes changed."""
+        self.remove(car)
+        self.add(car)
+
+    def update_prices(self, cars):
+        """
+        Re-index many cars after only their prices changed: one filtering pass and one merge over the
+        price list instead of a delete and an insert per car.
+        """
+        self.cache.clear()
+        cars = [car for car in cars if self._indexed[car.vin][1] != car.price]
+        if not cars:
+            return
+        changed = {car.vin for car in cars}
+        kept = [(key, vin) for key, vin in zip(self.price_keys, self.price_vins) if vin not in changed]
+        for car in cars:
+            tokens, _, horsepower = self._indexed[car.vin]
+            self._indexed[car.vin] = (tokens, car.price, horsepower)
+        self.price_keys, self.price_vins = self._merge([key for key, _ in kept], [vin for _, vin in kept],
+                                                       [(car.price, car.vin) for car in cars])
+
+    def rebuild(self, cars):
+        """Rebuild every index from a list of cars."""
+        self.__init__(self.cache_size)
+        self.add_many(cars)
+
+    @staticmethod
+    def _merge(keys, vins, new_pairs):
+        """Return new sorted parallel lists containing the existing entries plus new (key, vin) pairs."""
+        if not new_pairs:
+            return keys, vins
+        pairs = list(zip(keys, vins)) + new_pairs
+        pairs.sort(key=lambda pair: pair[0])  # Stable; the existing part is already sorted
+        return [key for key, _ in pairs], [vin for _, vin in pairs]
+
+    @staticmethod
+    def _insert_sorted(keys, vins, key, vin):
+        position = bisect.bisect_right(keys, key)
+        keys.insert(position, key)
+        vins.insert(position, vin)
+
+    @staticmethod
+    def _delete_sorted(keys, vins, key, vin):
+        position = bisect.bisect_left(keys, key)
+        while vins[position] != vin:  # Step over other cars with the same key
+            position += 1
+        del keys[position]
+        del vins[position]
+
+    def _keyword_vins(self, keyword):
+        """VINs whose tokens start with every word of the keyword."""
+        result = None
+        for word in self.tokenize(keyword):
+            matches = set()
+            position = bisect.bisect_left(self.sorted_tokens, word)
+            while position < len(self.sorted_tokens) and self.sorted_tokens[position].startswith(word):
+                matches |= self.tokens[self.sorted_tokens[position]]
+                position += 1
+            result = matches if result is None else result & matches
+            if not result:
+                break
+        return result
+
+    def _cached(self, key, compute):
+        """Return a copy of the cached result for key, computing and caching it on a miss."""
+        if key in self.cache:
+            self.cache.move_to_end(key)
+        else:
+            self.cache[key] = compute()
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return list(self.cache[key])
+
+    def search(self, keyword="", min_price=None, max_price=None, min_hp=None):
+        """
+        Find cars matching a keyword and optional ranges without scanning the whole inventory.
+        The smallest candidate set (keyword matches, price range or horsepower range) drives the
+        scan; the remaining filters are checked per candidate. Repeated queries come from the cache.
+        """
+        key = ("search", tuple(self.tokenize(keyword)), min_price, max_price, min_hp)
+        return self._cached(key, lambda: self._search(keyword, min_price, max_price, min_hp))
+
+    def _search(self, keyword, min_price, max_price, min_hp):
+        candidates = []
+        keyword_vins = self._keyword_vins(keyword)
+        if keyword_vins is not None:
+            candidates.append(keyword_vins)
+        if min_price is not None or max_price is not None:
+            low = 0 if min_price is None else bisect.bisect_left(self.price_keys, min_price)
+            high = len(self.price_keys) if max_price is None else bisect.bisect_right(self.price_keys, max_price)
+            candidates.append(self.price_vins[low:high] if low < high else [])
+        if min_hp is not None:
+            candidates.append(self.hp_vins[bisect.bisect_left(self.hp_keys, min_hp):])
+        driver = min(candidates, key=len) if candidates else self.by_vin
+        results = []
+        for vin in driver:
+            car = self.by_vin[vin]
+            if ((keyword_vins is None or vin in keyword_vins) and
+                (min_price is None or car.price >= min_price) and
+                (max_price is None or car.price <= max_price) and
+                (min_hp is None or car.horsepower >= min_hp)):
+                results.append(car)
+        return results
+
+    def similar_tokens(self, word):
+        """
+        Return (token, similarity) pairs for the indexed tokens a query word could mean, best first:
+        the word itself (1.0), tokens it is a prefix of (0.9) and, for words that are not numbers,
+        look-alikes sharing enough trigrams (0.8 x Dice similarity, e.g. "corvete" -> "corvette").
+        """
+        matches = {}
+        position = bisect.bisect_left(self.sorted_tokens, word)
+        while position < len(self.sorted_tokens) and self.sorted_tokens[position].startswith(word):
+            token = self.sorted_tokens[position]
+            matches[token] = 1.0 if token == word else 0.9
+            position += 1
+        if not word.isdigit():  # Years only match exactly or by prefix
+            grams = self.trigrams_of(word)
+            shared = {}
+            for gram in grams:
+                for token in self.trigrams.get(gram, ()):
+                    shared[token] = shared.get(token, 0) + 1
+            for token, count in shared.items():
+                similarity = 2 * count / (len(grams) + len(self.trigrams_of(token)))
+                if similarity >= self.FUZZY_THRESHOLD and token not in matches:
+                    matches[token] = 0.8 * similarity
+        return sorted(matches.items(), key=lambda item: (-item[1], item[0]))
+
+    def fuzzy_search(self, text, limit=20):
+        """
+        Ranked, typo-tolerant search: every word must match one of a car's tokens (see similar_tokens).
+        A car scores the average similarity of its best token per word. Token combinations are
+        visited best first, so only the sets needed for the top limit cars are intersected.
+        Returns up to limit (score, car) pairs, best first (limit None returns every match).
+        """
+        words = tuple(self.tokenize(text))
+        return self._cached(("fuzzy", words, limit), lambda: self._fuzzy_search(words, limit))
+
+    def _fuzzy_search(self, words, limit):
+        ranked = [self.similar_tokens(word) for word in words]
+        if not ranked or not all(ranked):
+            return []
+
+        def score(combo):
+            return sum(ranked[w][i][1] for w, i in enumerate(combo)) / len(words)
+
+        first = (0,) * len(words)
+        heap, queued = [(-score(first), first)], {first}
+        results, seen = [], set()
+        while heap and (limit is None or len(results) < limit):
+            negative_score, combo = heapq.heappop(heap)
+            sets = sorted((self.tokens[ranked[w][i][0]] for w, i in enumerate(combo)), key=len)
+            vins = sets[0]
+            for other in sets[1:]:
+                vins = vins & other
+                if not vins:
+                    break
+            # A car first shows up in its best combination, so its score is final when it is first seen
+            for vin in vins:
+                if vin not in seen:
+                    seen.add(vin)
+                    results.append((-negative_score, self.by_vin[vin]))
+                    if limit is not None and len(results) >= limit:
+                        break
+            for w in range(len(combo)):
+                if combo[w] + 1 < len(ranked[w]):
+                    following = combo[:w] + (combo[w] + 1,) + combo[w + 1:]
+                    if following not in queued:
+                        queued.add(following)
+                        heapq.heappush(heap, (-score(following), following))
+        return results
+
+    def suggest(self, text, limit=10):
+        """
+        Autocomplete the last word of a query with indexed tokens that start with it, keeping only
+        completions that still match a car together with the earlier words. Returns up to limit
+        (completed query, number of cars carrying the completed word) pairs, most common first.
+        """
+        words = self.tokenize(text)
+        if not words:
+            return []
+        return self._cached(("suggest", tuple(words), limit), lambda: self._suggest(words, limit))
+
+    def _suggest(self, words, limit):
+        *head, last = words
+        # Earlier words are taken as typed in full when they are tokens (no set copies needed)
+        contexts = sorted((self.tokens[word] if word in self.tokens else self._keyword_vins(word) for word in head),
+                          key=len)
+        context = None
+        for vins in contexts:
+            context = vins if context is None else context & vins
+        completions = []
+        position = bisect.bisect_left(self.sorted_tokens, last)
+        while position < len(self.sorted_tokens) and self.sorted_tokens[position].startswith(last):
+            token = self.sorted_tokens[position]
+            vins = self.tokens[token]
+            # isdisjoint stops at the first shared car, unlike counting the full intersection
+            if token not in head and (context is None or not vins.isdisjoint(context)):
+                completions.append((" ".join(head + [token]), len(vins)))
+            position += 1
+        return heapq.nlargest(limit, completions, key=lambda item: item[1])
+
+# Define the SalesAnalytics class: sales aggregates kept up to date as sales are recorded
+class SalesAnalytics:
+    def __init__(self):
+        """
+        Initialize empty aggregates.
+        Each bucket is [number of sales, revenue, tax], so reports cost O(buckets) instead of O(sales).
+        """
+        self.count = 0
+        self.revenue = 0.0
+        self.tax = 0.0
+        self.by_day = {}  # "YYYY-MM-DD" -> bucket
+        self.by_month = {}  # "YYYY-MM" -> bucket
+        self.by_model = {}  # (make, model) -> bucket
+        self.by_customer = {}  # Customer name -> bucket
+        # Raw per-sale columns (a few bytes per sale) for ad-hoc rollups
+        self.days = array('i')  # date.toordinal() of each sale
+        self.months = array('i')  # YYYYMM of each sale
+        self.totals = array('d')
+        self.taxes = array('d')
+
+    def add(self, sale, make, model):
+        """Fold one sale into every aggregate."""
+        self.count += 1
+        self.revenue += sale.total
+        self.tax += sale.tax
+        for buckets, key in ((self.by_day, sale.date[:10]), (self.by_month, sale.date[:7]),
+                             (self.by_model, (make, model)), (self.by_customer, sale.customer_name)):
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [0, 0.0, 0.0]
+            bucket[0] += 1
+            bucket[1] += sale.total
+            bucket[2] += sale.tax
+        day = date.fromisoformat(sale.date[:10])
+        self.days.append(day.toordinal())
+        self.months.append(day.year * 100 + day.month)
+        self.totals.append(sale.total)
+        self.taxes.append(sale.tax)
+
+    @staticmethod
+    def _top(buckets, count):
+        return heapq.nlargest(count, buckets.items(), key=lambda item: item[1][1])
+
+    def top_models(self, count=5):
+        """Best-selling (make, model) pairs by revenue."""
+        return self._top(self.by_model, count)
+
+    def top_customers(self, count=5):
+        """Customers with the highest total spend."""
+        return self._top(self.by_customer, count)
+
+    def rollup(self, start=None, end=None, by="month"):
+        """
+        Ad-hoc rollup over the raw sale columns, vectorized with NumPy when it is installed.
+        :param start: First date to include (datetime.date, optional)
+        :param end: Last date to include (datetime.date, optional)
+        :param by: "day", "month" or "total"
+        :return: {bucket label: (number of sales, revenue, tax)}
+        """
+        if not self.count:
+            return {}
+        first = start.toordinal() if start else None
+        last = end.toordinal() if end else None
+        keys_column = {"day": self.days, "month": self.months, "total": None}[by]
+        if np is not None:
+            days = np.frombuffer(self.days, dtype=np.int32)
+            mask = np.ones(len(days), dtype=bool)
+            if first is not None:
+                mask &= days >= first
+            if last is not None:
+                mask &= days <= last
+            keys = np.frombuffer(keys_column, dtype=np.int32)[mask] if keys_column else np.zeros(mask.sum(), np.int32)
+            labels, inverse = np.unique(keys, return_inverse=True)
+            counts = np.bincount(inverse, minlength=len(labels))
+            revenue = np.bincount(inverse, weights=np.frombuffer(self.totals)[mask], minlength=len(labels))
+            tax = np.bincount(inverse, weights=np.frombuffer(self.taxes)[mask], minlength=len(labels))
+            rows = zip(labels.tolist(), counts.tolist(), revenue.tolist(), tax.tolist())
+        else:
+            totals = {}
+            for i, day in enumerate(self.days):
+                if (first is None or day >= first) and (last is None or day <= last):
+                    bucket = totals.setdefault(keys_column[i] if keys_column else 0, [0, 0.0, 0.0])
+                    bucket[0] += 1
+                    bucket[1] += self.totals[i]
+                    bucket[2] += self.taxes[i]
+            rows = ((key, *bucket) for key, bucket in sorted(totals.items()))
+        if by == "day":
+            label = lambda key: date.fromordinal(key).isoformat()
+        elif by == "month":
+            label = lambda key: f"{key // 100:04d}-{key % 100:02d}"
+        else:
+            label = lambda key: "total"
+        return {label(key): (count, revenue, tax) for key, count, revenue, tax in rows}
+
+# Define the PricingRule class: which cars a bulk repricing touches and how their price changes
+class PricingRule:
+    ACTIONS = ("discount", "percent", "per_mile", "set_price")
+
+    def __init__(self, action, amount, make=None, model=None, color=None, min_year=None, max_year=None,
+                 min_mileage=None, max_mileage=None, min_price=None, max_price=None, include_sold=False, floor=0.0):
+        """
+        Initialize a pricing rule. Text filters are case-insensitive; ranges are inclusive.
+        :param action: "discount" (set the discount to amount %), "percent" (change the price by amount %),
+                       "per_mile" (take amount dollars off the price per mile driven) or "set_price"
+        :param amount: Percentage, dollars per mile or new price, depending on the action
+        :param make: Only cars of this make
+        :param model: Only cars of this model
+        :param color: Only cars of this color
+        :param min_year: Only cars built in or after this year
+        :param max_year: Only cars built in or before this year
+        :param min_mileage: Only cars with at least this mileage
+        :param max_mileage: Only cars with at most this mileage
+        :param min_price: Only cars whose current price is at least this
+        :param max_price: Only cars whose current price is at most this
+        :param include_sold: Also reprice sold cars (default: only cars in stock)
+        :param floor: Price changes never take a price below this
+        """
+        if action not in self.ACTIONS:
+            raise ValueError(f"unknown pricing action {action!r} (expected one of {', '.join(self.ACTIONS)})")
+        self.action = action
+        self.amount = float(amount)
+        self.make = make.lower() if make else None
+        self.model = model.lower() if model else None
+        self.color = color.lower() if color else None
+        self.min_year, self.max_year = min_year, max_year
+        self.min_mileage, self.max_mileage = min_mileage, max_mileage
+        self.min_price, self.max_price = min_price, max_price
+        self.include_sold = include_sold
+        self.floor = float(floor)
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Build a rule from key=value words, e.g. "make=Dodge year=2022 discount=10" or
+        "mileage=50000- per_mile=0.05 floor=15000". Ranges are written low-high, low- or -high;
+        quote values with spaces (model="Mustang GT"). Raises ValueError if invalid.
+        """
+        options, action = {}, None
+        for word in shlex.split(text):
+            key, separator, value = word.partition("=")
+            key = key.lower()
+            if not separator or not value:
+                raise ValueError(f"expected key=value, got {word!r}")
+            if key in cls.ACTIONS:
+                if action is not None:
+                    raise ValueError("a rule has exactly one action")
+                action = (key, float(value))
+            elif key in ("make", "model", "color"):
+                options[key] = value
+            elif key in ("year", "mileage", "price"):
+                low, dash, high = value.partition("-")
+                kind = float if key == "price" else int
+                options["min_" + key] = kind(low) if low else None
+                options["max_" + key] = (kind(high) if high else None) if dash else options["min_" + key]
+            elif key == "sold":
+                options["include_sold"] = value.lower() in ("yes", "true", "1")
+            elif key == "floor":
+                options["floor"] = float(value)
+            else:
+                raise ValueError(f"unknown rule key {key!r}")
+        if action is None:
+            raise ValueError(f"a rule needs an action ({', '.join(name + '=' for name in cls.ACTIONS)})")
+        return cls(*action, **options)
+
+    def describe(self):
+        """Short text form of the rule, in the syntax parse() accepts."""
+        words = [f"{key}={shlex.quote(value)}" for key, value in
+                 (("make", self.make), ("model", self.model), ("color", self.color)) if value]
+        for key in ("year", "mileage", "price"):
+            low, high = getattr(self, "min_" + key), getattr(self, "max_" + key)
+            if low is not None or high is not None:
+                words.append(f"{key}={low}" if low == high else f"{key}={'' if low is None else low}-"
+                                                                f"{'' if high is None else high}")
+        if self.include_sold:
+            words.append("sold=yes")
+        words.append(f"{self.action}={self.amount:g}")
+        if self.floor:
+            words.append(f"floor={self.floor:g}")
+        return " ".join(words)
+
+    def matches(self, car, price):
+        """Check one car (with its price so far in this repricing) against the filters."""
+        return ((self.include_sold or not car.is_sold) and
+                (self.make is None or car.make.lower() == self.make) and
+                (self.model is None or car.model.lower() == self.model) and
+                (self.color is None or (car.color or "").lower() == self.color) and
+                (self.min_year is None or car.year >= self.min_year) and
+                (self.max_year is None or car.year <= self.max_year) and
+                (self.min_mileage is None or car.mileage >= self.min_mileage) and
+                (self.max_mileage is None or car.mileage <= self.max_mileage) and
+                (self.min_price is None or price >= self.min_price) and
+                (self.max_price is None or price <= self.max_price))
+
+    def apply(self, price, discount, mileage):
+        """Return the (price, discount) this rule gives a matching car."""
+        if self.action == "discount":
+            return price, self.amount
+        if self.action == "percent":
+            new_price = price * (1 + self.amount / 100)
+        elif self.action == "per_mile":
+            new_price = price - self.amount * mileage
+        else:
+            new_price = self.amount
+        return max(new_price, self.floor), discount
+
+    def mask(self, columns):
+        """Vectorized matches(): a boolean NumPy array over the columns built by price_columns()."""
+        mask = np.ones(len(columns["price"]), dtype=bool)
+        if not self.include_sold:
+            mask &= ~columns["sold"]
+        for field in ("make", "model", "color"):
+            if getattr(self, field) is not None:
+                mask &= columns[field] == getattr(self, field)
+        for field, column in (("year", "year"), ("mileage", "mileage"), ("price", "price")):
+            low, high = getattr(self, "min_" + field), getattr(self, "max_" + field)
+            if low is not None:
+                mask &= columns[column] >= low
+            if high is not None:
+                mask &= columns[column] <= high
+        return mask
+
+    def apply_columns(self, columns, mask):
+        """Vectorized apply(): update the price and discount columns in place where mask is set."""
+        if self.action == "discount":
+            columns["discount"][mask] = self.amount
+            return
+        price = columns["price"][mask]
+        if self.action == "percent":
+            price = price * (1 + self.amount / 100)
+        elif self.action == "per_mile":
+            price = price - self.amount * columns["mileage"][mask]
+        else:
+            price = np.full(len(price), self.amount)
+        columns["price"][mask] = np.maximum(price, self.floor)
+
+def price_columns(cars, rules):
+    """NumPy columns of the car fields the rules need (text fields lowercased), for the vectorized pass."""
+    count = len(cars)
+    columns = {
+        "price": np.fromiter((car.price for car in cars), dtype=float, count=count),
+        "discount": np.fromiter((car.discount for car in cars), dtype=float, count=count),
+        "sold": np.fromiter((car.is_sold for car in cars), dtype=bool, count=count),
+    }
+    for field, kind in (("year", int), ("mileage", float)):
+        columns[field] = np.fromiter((getattr(car, field) for car in cars), dtype=kind, count=count)
+    for field in ("make", "model", "color"):
+        if any(getattr(rule, field) is not None for rule in rules):
+            columns[field] = np.array([(getattr(car, field) or "").lower() for car in cars])
+    return columns
+
+# Define the PriceBatch class: one committed bulk repricing, kept in the undo log
+class PriceBatch:
+    __slots__ = ("batch_id", "date", "description", "changes")
+
+    def __init__(self, batch_id, description, changes):
+        """
+        Initialize a PriceBatch object.
+        :param batch_id: Number of the batch in the undo log
+        :param description: The rules that produced it
+        :param changes: List of [vin, old price, old discount, new price, new discount, new version]
+        """
+        self.batch_id = batch_id
+        self.date = datetime.now().isoformat(timespec="seconds")
+        self.description = description
+        self.changes = changes
+
+    def to_dict(self):
+        """Convert the batch to a dictionary for saving."""
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a PriceBatch from its saved dictionary."""
+        batch = cls(data["batch_id"], data["description"], data["changes"])
+        batch.date = data["date"]
+        return batch
+
+# Helpers to turn imported records (CSV rows or NDJSON objects) into validated objects
+def car_from_record(record):
+    """Build a Car from an import record, converting CSV strings; raises ValueError if invalid."""
+    def text(field, default=None):
+        value = record.get(field)
+        value = default if value in (None, "") else str(value).strip()
+        if value is None:
+            raise ValueError(f"missing {field}")
+        return value
+
+    def number(field, kind, default=None):
+        value = record.get(field)
+        if value in (None, ""):
+            if default is None:
+                raise ValueError(f"missing {field}")
+            return default
+        value = kind(float(value)) if kind is int else kind(value)
+        if value < 0:
+            raise ValueError(f"{field} must not be negative")
+        return value
+
+    car = Car(text("make"), text("model"), number("year", int), number("price", float),
+              number("horsepower", int), number("top_speed", int), text("color", "Black"),
+              number("mileage", int, 0), record.get("vin") or None)
+    car.discount = number("discount", float, 0.0)
+    car.is_sold = str(record.get("is_sold", "")).strip().lower() in ("1", "true", "yes")
+    return car
+
+def customer_from_record(record):
+    """Build a Customer from an import record; raises ValueError if invalid."""
+    name = str(record.get("name") or "").strip()
+    if not name:
+        raise ValueError("missing name")
+    customer = Customer(name, str(record.get("email") or "").strip(), str(record.get("phone") or "").strip())
+    purchases = record.get("purchases") or []
+    customer.purchases = purchases.split(";") if isinstance(purchases, str) else list(purchases)
+    return customer
+
+# Fields written by the exporters, per record kind
+EXPORT_FIELDS = {
+    "cars": CAR_COLUMNS,
+    "customers": ("customer_id", "name", "email", "phone", "purchases"),
+    "sales": Sale.__slots__,
+}
+
+def read_records(path, file_format=None):
+    """
+    Yield import records from a CSV or NDJSON file one at a time (format from the extension by default).
+    An NDJSON line that is not a JSON object is yielded as a ValueError saying why, so the importer
+    rejects that record and goes on with the rest.
+    """
+    file_format = file_format or ("csv" if path.lower().endswith(".csv") else "ndjson")
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if file_format == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield ValueError(f"invalid JSON ({e.msg})")
+                        continue
+                    yield record if isinstance(record, dict) else ValueError("not a JSON object")
+
+def write_records(records, f, fields, file_format="ndjson"):
+    """Stream dictionaries to an open text file as CSV or NDJSON; returns the number written."""
+    count = 0
+    if file_format == "csv":
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for record in records:
+            if isinstance(record.get("purchases"), list):
+                record = dict(record, purchases=";".join(record["purchases"]))
+            writer.writerow(record)
+            count += 1
+    else:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+            count += 1
+    return count
+
+PAGE_SIZE = 20  # Cars per page in listings
+
 # Define the Inventory class to manage cars, customers, and sales
 class Inventory:
-    def __init__(self, data_file='inventory.json'):
-        """Initialize inventory, loading from a JSON file for persistence."""
+    def __init__(self, data_file='inventory.json', journal=False, fsync_every=64, compact_every=10000, storage=None,
+                 sample_cars=True):
+        """
+        Initialize inventory, loading from a JSON file (or another storage backend) for persistence.
+        :param data_file: JSON snapshot file
+        :param journal: If True, changes are appended to a journal instead of rewriting the whole file
+        :param fsync_every: Journal records written between forced disk syncs
+        :param compact_every: Journal records after which a new snapshot is written (None to only compact on demand)
+        :param storage: Storage backend (e.g. SQLiteStorage); defaults to JSONStorage with the options above
+        :param sample_cars: Add the sample cars when the inventory is empty
+        """
         self.cars = []  # List of Car objects
         self.customers = []  # List of Customer objects
         self.sales = []  # List of Sale objects
+        self.reprice_log = []  # Committed bulk repricing batches (PriceBatch), oldest first, for undo
+        self.index = CarIndex()  # VIN, keyword, price and horsepower indexes over self.cars
+        self._clear_indexes()  # Sales aggregates and customer/sale lookups, updated on every change
         self.data_file = data_file
+        self.storage = storage or JSONStorage(data_file, journal, fsync_every, compact_every)
         self.load_data()  # Load existing data if file exists
-        if not self.cars:
+        if not self.cars and sample_cars:
             self.add_sample_cars()  # Add samples if empty
 
     def add_sample_cars(self):
@@ -124,66 +1871,409 @@ class Inventory:
         self.add_car(Car("Chevrolet", "Corvette Stingray", 2024, 65000, 495, 194, "Blue", 1000))
         self.add_car(Car("Dodge", "Challenger SRT Hellcat", 2022, 70000, 707, 199, "Black", 20000))
         self.add_car(Car("Tesla", "Roadster", 2025, 200000, 1000, 250, "Silver", 0))  # Electric sports car for variety
-        print("Sample American sports cars added to inventory.")
+        logger.info("Sample American sports cars added to inventory.")
 
     def add_car(self, car):
         """Add a new car to the inventory and save."""
-        self.cars.append(car)
-        self.save_data()
-        print(f"Added {car.make} {car.model} (VIN: {car.vin}) to inventory.")
+        with self.storage.transaction(self):
+            if car.vin in self.index.by_vin:
+                logger.warning("A car with VIN %s is already in inventory.", car.vin)
+                return
+            self.cars.append(car)
+            self.index.add(car)
+            self._persist("add_car", car.to_dict())
+        logger.info("Added %s %s (VIN: %s) to inventory.", car.make, car.model, car.vin)
 
     def remove_car(self, index):
         """Remove a car from inventory by index and save."""
-        if 0 <= index < len(self.cars):
-            removed = self.cars.pop(index)
-            self.save_data()
-            print(f"Removed {removed.make} {removed.model} from inventory.")
+        if not 0 <= index < len(self.cars):
+            logger.warning("Invalid car index.")
+            return
+        vin = self.cars[index].vin
+        with self.storage.transaction(self):
+            removed = self.index.by_vin.get(vin)  # Looked up again: another terminal may have changed the list
+            if removed is None:
+                logger.warning("That car was already removed.")
+                return
+            self.cars.remove(removed)
+            self.index.remove(removed)
+            self._persist("remove_car", {"vin": removed.vin})
+        logger.info("Removed %s %s from inventory.", removed.make, removed.model)
+
+    def remove_car_by_vin(self, vin):
+        """Remove a car from inventory by VIN and save."""
+        car = self.index.by_vin.get(vin)
+        if car:
+            self.remove_car(self.cars.index(car))
         else:
-            print("Invalid car index.")
+            logger.warning("No car with that VIN.")
+
+    def bulk_add_cars(self, records, batch_size=1000):
+        """
+        Add many cars (Car objects or import records) with no per-car output, persisting each batch with a
+        single write. Records are validated in batches; invalid ones and duplicate VINs are skipped.
+        Returns (number added, list of (record number, error message)).
+        """
+        return self._bulk_add(records, batch_size, car_from_record, self._add_car_batch)
+
+    def bulk_add_customers(self, records, batch_size=1000):
+        """Add many customers (Customer objects or import records); returns (number added, errors)."""
+        return self._bulk_add(records, batch_size, customer_from_record, self._add_customer_batch)
+
+    def _bulk_add(self, records, batch_size, parse, add_batch):
+        op = "add_car" if add_batch == self._add_car_batch else "add_customer"
+        added, errors, batch = 0, [], []
+        with self.storage.transaction(self):
+            for number, record in enumerate(records, 1):
+                batch.append((number, record))
+                if len(batch) >= batch_size:
+                    added += self._persist_batch(op, add_batch(batch, parse, errors))
+                    batch = []
+            if batch:
+                added += self._persist_batch(op, add_batch(batch, parse, errors))
+        return added, errors
+
+    def _persist_batch(self, op, payloads):
+        """Persist a batch as soon as it is in memory, so a later failure can't leave it unsaved."""
+        if payloads:
+            self.storage.record_many(self, op, payloads)
+        return len(payloads)
+
+    @staticmethod
+    def _parse_record(record, model, parse):
+        """Return an import record as a model object; raises ValueError if it is malformed."""
+        if isinstance(record, model):
+            return record
+        if isinstance(record, ValueError):
+            raise record  # A line read_records could not decode
+        if not isinstance(record, dict):
+            raise ValueError("not a record")
+        return parse(record)
+
+    def _add_car_batch(self, batch, parse, errors):
+        cars, vins = [], set()
+        for number, record in batch:
+            try:
+                car = self._parse_record(record, Car, parse)
+                if car.vin in self.index.by_vin or car.vin in vins:
+                    raise ValueError(f"duplicate VIN {car.vin}")
+            except (ValueError, TypeError) as e:
+                errors.append((number, str(e)))
+                continue
+            cars.append(car)
+            vins.add(car.vin)
+        self.cars.extend(cars)
+        self.index.add_many(cars)
+        return [car.to_dict() for car in cars]
+
+    def _add_customer_batch(self, batch, parse, errors):
+        payloads = []
+        for number, record in batch:
+            try:
+                customer = self._parse_record(record, Customer, parse)
+            except (ValueError, TypeError) as e:
+                errors.append((number, str(e)))
+                continue
+            customer.customer_id = self._next_customer_id
+            self.customers.append(customer)
+            self._index_customer(customer, len(self.customers) - 1)
+            payloads.append(customer.to_dict())
+        return payloads
+
+    def export_records(self, kind, f, file_format="ndjson"):
+        """Stream all cars, customers or sales to an open text file; returns the number written."""
+        if kind == "cars":
+            records = (car.to_dict() for car in self.cars)
+        elif kind == "customers":
+            records = (cust.to_dict() for cust in self.customers)
+        else:
+            records = (sale.to_dict() for sale in self.all_sales())
+        return write_records(records, f, EXPORT_FIELDS[kind], file_format)
+
+    def all_sales(self):
+        """Iterate over every recorded sale, including history kept only in the storage backend."""
+        return self.storage.iter_sales() if self.storage.supports_queries else iter(self.sales)
+
+    def update_price(self, car, new_price):
+        """Update a car's base price and save."""
+        with self.storage.transaction(self):
+            car = self.index.by_vin.get(car.vin)
+            if car is None:
+                logger.warning("That car is no longer in inventory.")
+                return
+            car.update_price(new_price)
+            car.version += 1
+            self.index.update(car)
+            self._persist("update_car", {"vin": car.vin, "price": car.price, "version": car.version})
+
+    def apply_discount(self, car, discount_percent):
+        """Apply a discount to a car and save."""
+        with self.storage.transaction(self):
+            car = self.index.by_vin.get(car.vin)
+            if car is None:
+                logger.warning("That car is no longer in inventory.")
+                return
+            car.apply_discount(discount_percent)
+            car.version += 1
+            self.index.update(car)
+            self._persist("update_car", {"vin": car.vin, "discount": car.discount, "version": car.version})
+
+    def plan_reprice(self, rules):
+        """
+        Work out what a list of PricingRules would change, without changing anything.
+        Rules apply in order, each seeing the prices left by the ones before it. With NumPy the
+        whole inventory is processed column by column in one vectorized pass; otherwise car by car.
+        Returns a list of [vin, old price, old discount, new price, new discount].
+        """
+        cars = self.cars
+        if not cars or not rules:
+            return []
+        if np is not None:
+            columns = price_columns(cars, rules)
+            old_prices, old_discounts = columns["price"].copy(), columns["discount"].copy()
+            for rule in rules:
+                rule.apply_columns(columns, rule.mask(columns))
+            changed = np.flatnonzero((columns["price"] != old_prices) | (columns["discount"] != old_discounts))
+            candidates = zip(changed.tolist(), columns["price"][changed].tolist(),
+                             columns["discount"][changed].tolist())
+        else:
+            candidates = []
+            for position, car in enumerate(cars):
+                price, discount = car.price, car.discount
+                for rule in rules:
+                    if rule.matches(car, price):
+                        price, discount = rule.apply(price, discount, car.mileage)
+                if price != car.price or discount != car.discount:
+                    candidates.append((position, price, discount))
+        changes = []
+        for position, price, discount in candidates:
+            car = cars[position]
+            price = round(price, 2) if price != car.price else car.price  # Whole cents for changed prices
+            if price != car.price or discount != car.discount:
+                changes.append([car.vin, car.price, car.discount, price, discount])
+        return changes
+
+    def reprice(self, rules, dry_run=False):
+        """
+        Apply pricing rules (PricingRule objects or their text form, e.g. "make=Dodge year=2022 discount=10")
+        across the whole inventory. With dry_run only the planned changes are returned. Otherwise they are
+        applied and persisted as one batch (a single journal record or database transaction) that goes
+        into the undo log. Returns the changes (see plan_reprice).
+        """
+        rules = [PricingRule.parse(rule) if isinstance(rule, str) else rule for rule in rules]
+        if dry_run:
+            return self.plan_reprice(rules)
+        with self.storage.transaction(self):
+            changes = self.plan_reprice(rules)  # Planned again under the lock, against the latest data
+            if not changes:
+                logger.info("No prices changed.")
+                return changes
+            for change in changes:
+                change.append(None)  # New version, filled in by _set_prices
+            self._set_prices(changes, lambda change: (change[0], change[3], change[4]))
+            batch = PriceBatch(max((batch.batch_id for batch in self.reprice_log), default=0) + 1,
+                               "; ".join(rule.describe() for rule in rules), changes)
+            self.reprice_log.append(batch)
+            self._persist("reprice", batch.to_dict())
+        logger.info("Repriced %d cars (batch %d).", len(changes), batch.batch_id)
+        return changes
+
+    def undo_reprice(self, batch_id=None):
+        """
+        Undo a committed repricing batch (the latest one by default), restoring the old prices and
+        discounts. Cars removed or repriced again since then are left alone. Returns the number restored.
+        """
+        with self.storage.transaction(self):
+            batch = next((batch for batch in reversed(self.reprice_log)
+                          if batch_id is None or batch.batch_id == batch_id), None)
+            if batch is None:
+                logger.warning("No repricing batch to undo.")
+                return 0
+            restored = []
+            for vin, old_price, old_discount, new_price, new_discount, _ in batch.changes:
+                car = self.index.by_vin.get(vin)
+                if car is not None and car.price == new_price and car.discount == new_discount:
+                    restored.append([vin, old_price, old_discount, None])
+            self._set_prices(restored, lambda row: row[:3])
+            self.reprice_log.remove(batch)
+            self._persist("undo_reprice", {"batch_id": batch.batch_id, "changes": restored})
+        logger.info("Undid repricing batch %d: %d of %d cars restored.", batch.batch_id, len(restored),
+                    len(batch.changes))
+        return len(restored)
+
+    def _set_prices(self, rows, fields):
+        """
+        Set price and discount on many cars and re-index them in one go.
+        fields(row) gives (vin, price, discount); the car's new version is stored in row[-1]
+        (rows replayed from the journal already carry it).
+        """
+        cars = []
+        for row in rows:
+            vin, price, discount = fields(row)
+            car = self.index.by_vin.get(vin)
+            if car is None:
+                continue
+            car.price, car.discount = price, discount
+            car.version = car.version + 1 if row[-1] is None else row[-1]
+            row[-1] = car.version
+            cars.append(car)
+        self.index.update_prices(cars)
+
+    def display_price_changes(self, changes, limit=PAGE_SIZE):
+        """Display a repricing preview: a summary line and the first limit changed cars."""
+        if not changes:
+            print("No prices would change.")
+            return
+        before = sum(old_price * (1 - old_discount / 100) for _, old_price, old_discount, *_ in changes)
+        after = sum(price * (1 - discount / 100) for _, _, _, price, discount, *_ in changes)
+        print(f"{len(changes)} cars would change; their final prices total ${before:,.2f} -> ${after:,.2f}")
+        lines = []
+        for vin, old_price, old_discount, price, discount, *_ in changes[:limit]:
+            car = self.index.by_vin.get(vin)
+            name = f"{car.year} {car.make} {car.model}" if car else "(removed)"
+            lines.append(f"  {name} (VIN: {vin}): ${old_price:.2f} at {old_discount}% -> ${price:.2f} at {discount}%\n")
+        sys.stdout.writelines(lines)
+        if len(changes) > limit:
+            print(f"  ... and {len(changes) - limit} more")
+
+    def display_reprice_log(self):
+        """Display the committed repricing batches that can still be undone."""
+        if not self.reprice_log:
+            print("No repricing batches to undo.")
+        for batch in self.reprice_log:
+            print(f"Batch {batch.batch_id} ({batch.date}): {len(batch.changes)} cars - {batch.description}")
 
     def add_customer(self, customer):
         """Add a new customer and save."""
-        self.customers.append(customer)
-        self.save_data()
-        print(f"Added customer: {customer.name}")
+        with self.storage.transaction(self):
+            customer.customer_id = self._next_customer_id
+            self.customers.append(customer)
+            self._index_customer(customer, len(self.customers) - 1)
+            self._persist("add_customer", customer.to_dict())
+        logger.info("Added customer: %s", customer.name)
 
     def record_sale(self, car, customer):
-        """Record a sale, mark car as sold, add to customer purchases, and save."""
-        if car.is_sold:
-            print("Car is already sold.")
-            return
-        discounted_price = car.price * (1 - car.discount / 100)
-        sale = Sale(car, customer, discounted_price)
-        self.sales.append(sale)
-        car.mark_as_sold()
-        customer.add_purchase(car.vin)
-        self.save_data()
-        print(sale.generate_receipt())
-
-    def search_cars(self, keyword, min_price=None, max_price=None, min_hp=None):
-        """Advanced search for cars with filters for real-world querying."""
-        results = []
-        for car in self.cars:
-            if (keyword.lower() in (car.make.lower() + car.model.lower() + str(car.year)) and
-                (min_price is None or car.price >= min_price) and
-                (max_price is None or car.price <= max_price) and
-                (min_hp is None or car.horsepower >= min_hp)):
-                results.append(car)
-        if results:
-            print("Search results:")
-            for i, car in enumerate(results):
-                print(f"{i}: {car.display_info()}")
-        else:
-            print("No cars found matching the search.")
+        """
+        Record a sale, mark car as sold, add to customer purchases, and save.
+        The sale only goes through if the car is unchanged since the caller read it (same version and
+        still unsold), so two terminals can never sell the same car. A customer not added yet (no ID)
+        is added first. Returns the Sale, or None.
+        """
+        expected_version = car.version
+        customer_id = customer.customer_id
+        with self.storage.transaction(self):
+            # Look both up again: another terminal's changes may have been applied meanwhile
+            current = self.index.by_vin.get(car.vin)
+            if current is None or current.is_sold:
+                logger.warning("Car is already sold.")
+                return None
+            if current.version != expected_version:
+                logger.warning("Car details changed since they were displayed; please review and try again.")
+                return None
+            if customer_id is None:
+                self.add_customer(customer)
+                customer_id = customer.customer_id
+            position = self.customer_positions.get(customer_id)
+            if position is None:
+                logger.warning("Customer %s (ID %s) is not a customer of this store.", customer.name, customer_id)
+                return None
+            car, customer = current, self.customers[position]
+            discounted_price = car.price * (1 - car.discount / 100)
+            sale = Sale(car, customer, discounted_price)
+            self.sales.append(sale)
+            self._track_sale(sale)
+            car.mark_as_sold()
+            car.version += 1
+            customer.add_purchase(car.vin)
+            self._persist("sale", {"sale": sale.to_dict(), "customer": position, "version": car.version})
+        if logger.isEnabledFor(logging.INFO):  # Only build the receipt text when someone will see it
+            logger.info(sale.generate_receipt())
+        return sale
 
-    def display_all_cars(self):
-        """Display all cars in the inventory."""
-        if not self.cars:
-            print("Inventory is empty.")
+    def refresh(self):
+        """Pick up changes saved by other terminals (shared mode)."""
+        self.storage.refresh(self)
+
+    def find_cars(self, keyword="", min_price=None, max_price=None, min_hp=None):
+        """Return the cars matching a search, without printing anything."""
+        if self.storage.supports_queries:
+            vins = self.storage.search_cars(keyword, min_price, max_price, min_hp)
+            return [self.index.by_vin[vin] for vin in vins]
+        return self.index.search(keyword, min_price, max_price, min_hp)
+
+    def fuzzy_search(self, text, limit=20):
+        """Return up to limit (score, car) pairs for a typo-tolerant query ("corvete 2024"), best first."""
+        return self.index.fuzzy_search(text, limit)
+
+    def suggest(self, text, limit=10):
+        """Autocomplete the last word of a search ("ford mus" -> "ford mustang"); returns (query, cars) pairs."""
+        return self.index.suggest(text, limit)
+
+    def find_customer_by_email(self, email):
+        """Return the first customer with this email address (case-insensitive), or None."""
+        position = self.customer_emails.get(email.strip().lower())
+        return None if position is None else self.customers[position]
+
+    def get_customer_by_id(self, customer_id):
+        """Return the customer with this ID, or None."""
+        position = self.customer_positions.get(customer_id)
+        return None if position is None else self.customers[position]
+
+    def purchases_of(self, customer):
+        """Return every sale made to a customer, oldest first, without scanning the sales history."""
+        if self.storage.supports_queries:
+            position = self.customer_positions.get(customer.customer_id)
+            return [] if position is None else self.storage.sales_for_customer(position)
+        return [self.sales[position] for position in self.sales_by_customer.get(customer.customer_id, ())]
+
+    def sale_for_vin(self, vin):
+        """Return the sale of the car with this VIN, or None if it was never sold."""
+        if self.storage.supports_queries:
+            return self.storage.sale_for_vin(vin)
+        position = self.sale_by_vin.get(vin)
+        return None if position is None else self.sales[position]
+
+    def buyer_of(self, vin):
+        """Return the customer who bought the car with this VIN, or None."""
+        sale = self.sale_for_vin(vin)
+        return None if sale is None else self.get_customer_by_id(sale.customer_id)
+
+    def search_cars(self, keyword, min_price=None, max_price=None, min_hp=None, page=None, page_size=PAGE_SIZE):
+        """
+        Advanced search for cars with filters for real-world querying.
+        Each keyword word matches the start of a make/model word or the year (e.g. "ford must 2023").
+        Displays one page of results (every result if page is None) and returns the list of matching cars.
+        """
+        results = self.find_cars(keyword, min_price, max_price, min_hp)
+        self.display_cars(results, page, page_size, "Search results:", "No cars found matching the search.")
+        return results
+
+    def display_all_cars(self, page=None, page_size=PAGE_SIZE):
+        """Display all cars in the inventory, or one page of them; returns the number of pages."""
+        return self.display_cars(self.cars, page, page_size, "Current Inventory:", "Inventory is empty.")
+
+    @staticmethod
+    def display_cars(cars, page=None, page_size=PAGE_SIZE, title="Cars:", empty_message="No cars."):
+        """
+        Display a numbered list of cars. Only the rows on the requested page are formatted,
+        and they are written in one go rather than one print per car.
+        :param cars: Cars to list; numbers are positions in this list
+        :param page: Page to show, starting at 1 (None shows every car)
+        :param page_size: Cars per page
+        Returns the number of pages.
+        """
+        if not cars:
+            print(empty_message)
+            return 0
+        pages = (len(cars) + page_size - 1) // page_size
+        if page is None:
+            start, stop = 0, len(cars)
+            print(title)
         else:
-            print("Current Inventory:")
-            for i, car in enumerate(self.cars):
-                print(f"{i}: {car.display_info()}")
+            start, stop = (page - 1) * page_size, min(page * page_size, len(cars))
+            print(f"{title} (page {page} of {pages}, cars {start}-{stop - 1} of {len(cars)})")
+        sys.stdout.writelines(f"{i}: {cars[i].display_info()}\n" for i in range(start, stop))
+        return pages
 
     def display_customers(self):
         """Display all customers."""
@@ -194,14 +2284,89 @@ class Inventory:
             for i, cust in enumerate(self.customers):
                 print(f"{i}: {cust.display_info()}")
 
-    def display_sales_report(self):
-        """Display a simple sales report."""
-        if not self.sales:
+    def _clear_indexes(self):
+        """Reset the customer and sale lookups and the sales aggregates before a full load."""
+        self._analytics = SalesAnalytics()  # None until first use after a lazy load (see analytics)
+        self.customer_positions = {}  # Customer ID -> position in self.customers
+        self.customer_emails = {}  # Lower-cased email -> position of the first customer using it
+        self.sales_by_customer = {}  # Customer ID -> positions of their sales in self.sales
+        self.sale_by_vin = {}  # VIN -> position of its sale in self.sales
+        self._next_customer_id = 1
+        self._legacy_buyers = None  # VIN -> customer ID from purchase lists, only built for sales without IDs
+
+    def _index_customer(self, customer, position):
+        """Add a customer to the ID and email lookups."""
+        self._index_customer_keys(customer.customer_id, customer.email, position)
+
+    def _index_customer_keys(self, customer_id, email, position):
+        self.customer_positions[customer_id] = position
+        if email:
+            self.customer_emails.setdefault(email.strip().lower(), position)
+        self._next_customer_id = max(self._next_customer_id, customer_id + 1)
+
+    @property
+    def analytics(self):
+        """Sales aggregates (SalesAnalytics); after a lazy load they are built from the sales on first use."""
+        if self._analytics is None:
+            analytics = SalesAnalytics()
+            for sale in self.all_sales():
+                analytics.add(sale, *self._sale_model(sale))
+            self._analytics = analytics
+        return self._analytics
+
+    def _sale_model(self, sale):
+        """(make, model) of a sale, taken from the car index for sales saved before they were kept on the sale."""
+        if sale.car_make is not None:
+            return sale.car_make, sale.car_model
+        car = self.index.by_vin.get(sale.car_vin)
+        return (car.make, car.model) if car else ("Unknown", "Unknown")
+
+    def _track_sale(self, sale, position=None):
+        """
+        Add a sale to the analytics and the customer/VIN lookups, filling in what sales saved by
+        older versions lack (make/model from the car index, the buyer from the purchase lists).
+        :param position: Position of the sale in self.sales (defaults to the last one)
+        """
+        if self._analytics is not None:
+            self._analytics.add(sale, *self._sale_model(sale))
+        if self.storage.supports_queries:
+            return  # Sales history stays in the database, which has its own indexes
+        if sale.customer_id is None:
+            if self._legacy_buyers is None:
+                self._legacy_buyers = {vin: cust.customer_id for cust in self.customers for vin in cust.purchases}
+            sale.customer_id = self._legacy_buyers.get(sale.car_vin)
+            if isinstance(self.sales, LazyRecords) and position is not None:
+                self.sales.loaded[position] = sale  # Keep the resolved ID; it is written out on the next save
+        if position is None:
+            position = len(self.sales) - 1
+        self._index_sale_keys(sale.car_vin, sale.customer_id, position)
+
+    def _index_sale_keys(self, vin, customer_id, position):
+        self.sales_by_customer.setdefault(customer_id, []).append(position)
+        self.sale_by_vin[vin] = position
+
+    def display_sales_report(self, show_receipts=False):
+        """
+        Display a sales report from the precomputed aggregates: totals, revenue by month,
+        top models and top customers. Receipts are only listed (streamed) when asked for.
+        """
+        analytics = self.analytics
+        if not analytics.count:
             print("No sales recorded.")
-        else:
-            total_revenue = sum(sale.total for sale in self.sales)
-            print(f"Sales Report: {len(self.sales)} sales, Total Revenue: ${total_revenue:.2f}")
-            for sale in self.sales:
+            return
+        print(f"Sales Report: {analytics.count} sales, Total Revenue: ${analytics.revenue:.2f}, "
+              f"Tax Collected: ${analytics.tax:.2f}")
+        print("Revenue by month:")
+        for month, (count, revenue, tax) in sorted(analytics.by_month.items()):
+            print(f"  {month}: {count} sales, ${revenue:.2f} (tax ${tax:.2f})")
+        print("Top models:")
+        for (make, model), (count, revenue, tax) in analytics.top_models():
+            print(f"  {make} {model}: {count} sold, ${revenue:.2f}")
+        print("Top customers:")
+        for name, (count, revenue, tax) in analytics.top_customers():
+            print(f"  {name}: {count} cars, ${revenue:.2f}")
+        if show_receipts:
+            for sale in self.all_sales():
                 print(sale.generate_receipt())
 
     def get_car_by_index(self, index):
@@ -210,41 +2375,183 @@ class Inventory:
             return self.cars[index]
         return None
 
+    def get_car_by_vin(self, vin):
+        """Retrieve a car by its VIN (stable even when other cars are removed)."""
+        return self.index.by_vin.get(vin)
+
     def get_customer_by_index(self, index):
         """Retrieve a customer by its index."""
         if 0 <= index < len(self.customers):
             return self.customers[index]
         return None
 
+    def _persist(self, op, payload):
+        """Persist one change through the storage backend."""
+        self.storage.record(self, op, payload)
+
+    def _apply(self, op, payload):
+        """Apply one journaled change to the in-memory data (used when replaying the journal)."""
+        if op == "add_car":
+            car = Car.from_dict(payload)
+            self.cars.append(car)
+            self.index.add(car)
+        elif op == "remove_car":
+            car = self.index.by_vin.get(payload["vin"])
+            if car:
+                self.cars.remove(car)
+                self.index.remove(car)
+        elif op == "update_car":
+            car = self.index.by_vin.get(payload["vin"])
+            if car:
+                for field, value in payload.items():
+                    setattr(car, field, value)
+                self.index.update(car)
+        elif op == "reprice":
+            batch = PriceBatch.from_dict(payload)
+            self._set_prices(batch.changes, lambda change: (change[0], change[3], change[4]))
+            self.reprice_log.append(batch)
+        elif op == "undo_reprice":
+            self._set_prices(payload["changes"], lambda row: row[:3])
+            self.reprice_log = [batch for batch in self.reprice_log if batch.batch_id != payload["batch_id"]]
+        elif op == "add_customer":
+            customer = Customer.from_dict(payload, len(self.customers))
+            self.customers.append(customer)
+            self._index_customer(customer, len(self.customers) - 1)
+        elif op == "sale":
+            sale = Sale.from_dict(payload["sale"])
+            if sale.customer_id is None:
+                sale.customer_id = self.customers[payload["customer"]].customer_id
+            self.sales.append(sale)
+            self._track_sale(sale)
+            car = self.index.by_vin.get(sale.car_vin)
+            if car:
+                car.is_sold = True
+                car.version = payload.get("version", car.version + 1)
+            self.customers[payload["customer"]].add_purchase(sale.car_vin)
+
+    def compact(self):
+        """Compact the storage (JSON: write a fresh snapshot and empty the journal); can be called on demand."""
+        self.storage.compact(self)
+
+    def close(self):
+        """Flush and close the storage backend."""
+        self.storage.close()
+
     def save_data(self):
-        """Save inventory, customers, and sales to JSON file with pretty printing."""
-        data = {
-            "cars": [vars(car) for car in self.cars],  # Convert to dict
-            "customers": [vars(cust) for cust in self.customers],
-            "sales": [{"car_vin": sale.car_vin, "customer_name": sale.customer_name,
-                       "sale_price": sale.sale_price, "tax": sale.tax,
-                       "total": sale.total, "date": sale.date} for sale in self.sales]
-        }
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, sort_keys=True)  # Pretty print with 4-space indentation
-        print("Data saved to file.")
+        """Save inventory, customers, and sales through the storage backend."""
+        self.storage.save(self)
 
     def load_data(self):
-        """Load data from JSON file if exists."""
-        if os.path.exists(self.data_file):
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            self.cars = [Car(**car_data) for car_data in data.get("cars", [])]
-            self.customers = [Customer(**cust_data) for cust_data in data.get("customers", [])]
-            # Reconstruct sales (simplified, as Sale object reconstruction is complex)
-            self.sales = [Sale(Car(vin=sale_data["car_vin"]), Customer(sale_data["customer_name"], "", ""),
-                              sale_data["sale_price"], tax_rate=sale_data["tax"]/sale_data["sale_price"])
-                         for sale_data in data.get("sales", [])]
-            print("Data loaded from file.")
+        """Load data through the storage backend."""
+        self.storage.load(self)
+
+# Memory benchmark: dict-based cars vs __slots__ cars vs CarTable columns
+def benchmark_memory(count=1_000_000):
+    """Measure the memory used to hold count cars in each layout and print a comparison."""
+    class DictCar:  # The old layout: a plain class with a per-instance __dict__
+        def __init__(self, **fields):
+            self.__dict__.update(fields)
+
+    makes = [("Ford", "Mustang GT"), ("Chevrolet", "Corvette Stingray"), ("Dodge", "Challenger SRT Hellcat")]
+    colors = ["Red", "Blue", "Black", "Silver"]
+
+    def sample_car(i):
+        make, model = makes[i % len(makes)]
+        # Strings built per record, as they would be after json.load, so nothing is shared by accident
+        return Car("".join(make), "".join(model), 2000 + i % 25, 30000.0 + i % 50000, 300 + i % 700,
+                   150 + i % 100, "".join(colors[i % len(colors)]), i % 100000, f"{i:017d}")
+
+    def measure(build):
+        tracemalloc.start()
+        data = build()
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del data
+        return used
+
+    results = {
+        "dict-based Car": measure(lambda: [DictCar(**sample_car(i).to_dict()) for i in range(count)]),
+        "__slots__ Car": measure(lambda: [sample_car(i) for i in range(count)]),
+        "CarTable columns": measure(lambda: CarTable.from_cars(sample_car(i) for i in range(count))),
+    }
+    baseline = results["dict-based Car"]
+    print(f"Memory for {count:,} cars:")
+    for layout, used in results.items():
+        print(f"  {layout:<18} {used / 2**20:8.1f} MiB ({used / count:6.1f} bytes/car, "
+              f"{used / baseline:5.1%} of dict-based)")
+    return results
+
+# Console benchmark: the same programmatic workload with status messages shown and with the silent default
+def benchmark_quiet_mode(operations=100_000):
+    """
+    Run operations inventory changes (adds, price updates, discounts and sales in equal parts) once with
+    console messages enabled and once silent, then time a full listing against one page, and print the
+    throughput of each. Messages and listings go to os.devnull, so a real terminal would only widen the gap.
+    """
+    import tempfile
+
+    def run_workload():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            inventory = Inventory(storage=JSONStorage(os.path.join(tmp_dir, 'inventory.json'), journal=True,
+                                                      fsync_every=operations, compact_every=None),
+                                  sample_cars=False)
+            inventory.add_customer(Customer("Benchmark Buyer", "buyer@example.com", ""))
+            customer = inventory.customers[0]
+            cars = [Car("Ford", "Mustang GT", 2000 + i % 25, 30000 + i % 70000, 300 + i % 700, 150)
+                    for i in range(operations // 4)]
+            start = time.perf_counter()
+            for car in cars:
+                inventory.add_car(car)
+            for car in cars:
+                inventory.update_price(car, car.price + 100)
+            for car in cars:
+                inventory.apply_discount(car, 5)
+            for car in cars:
+                inventory.record_sale(car, customer)
+            elapsed = time.perf_counter() - start
+            inventory.close()
+        return elapsed, inventory
+
+    previous_level = logger.level
+    with open(os.devnull, 'w') as devnull:
+        handler = enable_console_messages(devnull)
+        try:
+            verbose_time, _ = run_workload()
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(previous_level)
+        quiet_time, inventory = run_workload()
+        with contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            inventory.display_all_cars()
+            full_listing = time.perf_counter() - start
+            start = time.perf_counter()
+            inventory.display_all_cars(page=1)
+            one_page = time.perf_counter() - start
+
+    done = operations // 4 * 4
+    print(f"{done:,} programmatic operations:")
+    print(f"  console messages  {verbose_time:7.2f}s ({done / verbose_time:10,.0f} ops/s)")
+    print(f"  silent (default)  {quiet_time:7.2f}s ({done / quiet_time:10,.0f} ops/s) "
+          f"-> {verbose_time / quiet_time:.2f}x")
+    print(f"Listing {len(inventory.cars):,} cars:")
+    print(f"  every car         {full_listing * 1000:9.2f} ms")
+    print(f"  one page of {PAGE_SIZE:<4}  {one_page * 1000:9.2f} ms")
+    return verbose_time, quiet_time
 
 # Main function to run the store management program with more options
 def main():
-    inventory = Inventory()  # Create inventory instance with persistence
+    # Create inventory instance with journaled persistence; customers and sales load on demand
+    # Shared mode lets several terminals work on the same files where file locks are available
+    enable_console_messages()  # Show the inventory's status messages ("Added ...", receipts) in the menu
+    inventory = Inventory(storage=JSONStorage('inventory.json', journal=True, lazy=True, progress=print_progress,
+                                              shared=fcntl is not None))
+
+    def browse(show):
+        """Show a listing page by page until it ends or the user stops; show(page) returns the page count."""
+        page = 1
+        while show(page) > page and input("Press Enter for the next page, q to stop: ").strip().lower() != "q":
+            page += 1
 
     while True:
         print("\n--- American Sports Car Dealership Management System ---")
@@ -258,11 +2565,13 @@ def main():
         print("8. Add a customer")
         print("9. Display customers")
         print("10. Display sales report")
-        print("11. Exit")
+        print("11. Bulk repricing and promotions")
+        print("12. Exit")
         choice = input("Enter your choice: ").strip()
+        inventory.refresh()  # Pick up sales and changes made at other terminals
 
         if choice == "1":
-            inventory.display_all_cars()
+            browse(inventory.display_all_cars)
         elif choice == "2":
             make = input("Enter make (e.g., Ford): ")
             model = input("Enter model (e.g., Mustang): ")
@@ -275,36 +2584,43 @@ def main():
             new_car = Car(make, model, year, price, horsepower, top_speed, color, mileage)
             inventory.add_car(new_car)
         elif choice == "3":
-            keyword = input("Enter search keyword (make, model, or year): ")
+            keyword = input("Enter search keyword (make, model, color or year): ")
             min_price = input("Min price (optional, press enter to skip): ")
             min_price = float(min_price) if min_price else None
             max_price = input("Max price (optional, press enter to skip): ")
             max_price = float(max_price) if max_price else None
             min_hp = input("Min horsepower (optional, press enter to skip): ")
             min_hp = int(min_hp) if min_hp else None
-            inventory.search_cars(keyword, min_price, max_price, min_hp)
+            results = inventory.find_cars(keyword, min_price, max_price, min_hp)
+            if not results and keyword.strip():  # Nothing matched exactly; offer the closest spellings
+                results = [car for _, car in inventory.fuzzy_search(keyword, limit=None)
+                           if (min_price is None or car.price >= min_price) and
+                           (max_price is None or car.price <= max_price) and
+                           (min_hp is None or car.horsepower >= min_hp)]
+                if results:
+                    print("No exact matches; showing the closest ones.")
+            browse(lambda page: inventory.display_cars(results, page, title="Search results:",
+                                                       empty_message="No cars found matching the search."))
         elif choice == "4":
-            inventory.display_all_cars()
+            browse(inventory.display_all_cars)
             index = int(input("Enter car index to update price: "))
             car = inventory.get_car_by_index(index)
             if car:
                 new_price = float(input("Enter new price: "))
-                car.update_price(new_price)
-                inventory.save_data()
+                inventory.update_price(car, new_price)
             else:
                 print("Invalid index.")
         elif choice == "5":
-            inventory.display_all_cars()
+            browse(inventory.display_all_cars)
             index = int(input("Enter car index to apply discount: "))
             car = inventory.get_car_by_index(index)
             if car:
                 discount = float(input("Enter discount percentage: "))
-                car.apply_discount(discount)
-                inventory.save_data()
+                inventory.apply_discount(car, discount)
             else:
                 print("Invalid index.")
         elif choice == "6":
-            inventory.display_all_cars()
+            browse(inventory.display_all_cars)
             car_index = int(input("Enter car index to sell: "))
             car = inventory.get_car_by_index(car_index)
             if car:
@@ -318,7 +2634,7 @@ def main():
             else:
                 print("Invalid car index.")
         elif choice == "7":
-            inventory.display_all_cars()
+            browse(inventory.display_all_cars)
             index = int(input("Enter car index to remove: "))
             inventory.remove_car(index)
         elif choice == "8":
@@ -330,13 +2646,479 @@ def main():
         elif choice == "9":
             inventory.display_customers()
         elif choice == "10":
-            inventory.display_sales_report()
+            show_receipts = input("Show every receipt too? (y/N): ").strip().lower() == "y"
+            inventory.display_sales_report(show_receipts)
         elif choice == "11":
+            inventory.display_reprice_log()
+            action = input("Enter r to reprice by rules, u to undo the latest batch (Enter to go back): ")
+            action = action.strip().lower()
+            if action == "u":
+                inventory.undo_reprice()
+            elif action == "r":
+                print("One rule per line, applied in order; an empty line finishes. Examples:")
+                print("  make=Dodge year=2022 discount=10")
+                print("  mileage=50000- per_mile=0.05 floor=15000")
+                print("  model=\"Mustang GT\" percent=-3")
+                rules = []
+                while True:
+                    line = input("Rule: ").strip()
+                    if not line:
+                        break
+                    try:
+                        rules.append(PricingRule.parse(line))
+                    except ValueError as e:
+                        print(f"Invalid rule: {e}")
+                inventory.display_price_changes(inventory.reprice(rules, dry_run=True))
+                if rules and input("Apply these changes? (y/N): ").strip().lower() == "y":
+                    inventory.reprice(rules)
+        elif choice == "12":
+            inventory.compact()
             print("Exiting the program. Goodbye!")
             sys.exit(0)
         else:
             print("Invalid choice. Please try again.")
 
+# Concurrency stress test: several processes race to sell the same cars from one shared inventory
+def _sell_worker(data_file, worker, vins, results):
+    """Try to sell every car in vins to this worker's customer; report what was actually sold."""
+    inventory = Inventory(storage=JSONStorage(data_file, journal=True, shared=True), sample_cars=False)
+    sold = []
+    start = time.perf_counter()
+    for vin in vins:
+        inventory.refresh()
+        car = inventory.get_car_by_vin(vin)
+        if car and not car.is_sold and inventory.record_sale(car, inventory.customers[worker]):
+            sold.append(vin)
+    elapsed = time.perf_counter() - start
+    inventory.close()
+    results.put((worker, sold, len(vins), elapsed))
+
+def benchmark_concurrent_sales(processes=4, cars=500, data_file=None):
+    """
+    Start several processes that all try to sell the same pool of cars through one shared inventory,
+    then check that every car was sold exactly once and no sale or customer update was lost.
+    """
+    import multiprocessing
+    import random
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_file = data_file or os.path.join(tmp_dir, 'inventory.json')
+        inventory = Inventory(storage=JSONStorage(data_file, journal=True, shared=True), sample_cars=False)
+        inventory.bulk_add_cars(Car("Ford", "Mustang GT", 2023, 55000 + i, 450, 155) for i in range(cars))
+        inventory.bulk_add_customers(Customer(f"Terminal {i}", f"t{i}@example.com", "") for i in range(processes))
+        inventory.compact()
+        inventory.close()
+        vins = [car.vin for car in inventory.cars]
+        results = multiprocessing.Queue()
+        workers = []
+        start = time.perf_counter()
+        for worker in range(processes):
+            order = vins[:]
+            random.shuffle(order)  # Every process competes for every car, in a different order
+            workers.append(multiprocessing.Process(target=_sell_worker, args=(data_file, worker, order, results)))
+            workers[-1].start()
+        reports = [results.get() for _ in workers]
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        final = Inventory(storage=JSONStorage(data_file, journal=True), sample_cars=False)
+        sold_vins = [vin for _, sold, _, _ in reports for vin in sold]
+        sale_vins = [sale.car_vin for sale in final.sales]
+        purchases = {i: sorted(final.customers[i].purchases) for i in range(processes)}
+        ok = (len(sold_vins) == len(set(sold_vins)) == cars and sorted(sale_vins) == sorted(vins) and
+              all(car.is_sold for car in final.cars) and
+              all(purchases[worker] == sorted(sold) for worker, sold, _, _ in reports))
+        print(f"{processes} processes competing for {cars} cars:")
+        for worker, sold, attempts, worker_time in sorted(reports):
+            print(f"  process {worker}: sold {len(sold)} cars in {worker_time:.2f}s")
+        print(f"  {len(sold_vins)} successful sales, {len(sale_vins)} sales on file, "
+              f"{len(set(sold_vins))} distinct cars -> {'no double sales or lost updates' if ok else 'INCONSISTENT'}")
+        print(f"  Throughput: {len(sold_vins) / elapsed:,.0f} sales/s overall")
+        return ok
+
+# Define the InventoryService class: the dealership catalogue as an HTTP/JSON service (asyncio, stdlib only)
+class InventoryService:
+    def __init__(self, inventory, cache_size=1024, refresh_interval=0.2):
+        """
+        Initialize the service around one shared in-memory Inventory.
+        Reads run directly on the event loop against the in-memory indexes; hot GET responses are
+        cached (LRU) until the next write. Writes go through a queue handled by a single writer task,
+        so they are applied one at a time in arrival order. In shared mode, changes made by other
+        terminals are pulled in on a timer: the file lock and journal read happen in a worker thread,
+        so a terminal holding the lock (e.g. while compacting) doesn't stall the readers.
+        :param inventory: The Inventory to serve
+        :param cache_size: Maximum number of cached GET responses
+        :param refresh_interval: Seconds between looks for other terminals' changes (shared mode)
+        """
+        self.inventory = inventory
+        self.cache = OrderedDict()  # Request target -> (status, body)
+        self.cache_size = cache_size
+        self.refresh_interval = refresh_interval
+        self.writes = None  # asyncio.Queue of (handler, body, future), created when the server starts
+        self._storage_lock = None  # asyncio.Lock taken by the writer and the refresher, so they never overlap
+        self.routes = [
+            ("GET", "/cars", self.search),
+            ("GET", "/suggest", self.suggest),
+            ("GET", "/cars/", self.car_detail),
+            ("GET", "/reports/sales", self.sales_report),
+            ("POST", "/sales", self.create_sale),
+        ]
+
+    @staticmethod
+    def car_json(car):
+        """JSON-ready view of a car, including its final price."""
+        return dict(car.to_dict(), final_price=round(car.price * (1 - car.discount / 100), 2))
+
+    def search(self, path, query):
+        def number(name, kind):
+            return kind(query[name][0]) if name in query else None
+        limit = int(query.get("limit", ["50"])[0])
+        if query.get("fuzzy", ["0"])[0] == "1":  # Ranked, typo-tolerant matches; ranges are not applied
+            ranked = self.inventory.fuzzy_search(query.get("q", [""])[0], limit)
+            return 200, {"count": len(ranked),
+                         "cars": [dict(self.car_json(car), score=round(score, 3)) for score, car in ranked]}
+        results = self.inventory.find_cars(query.get("q", [""])[0], number("min_price", float),
+                                           number("max_price", float), number("min_hp", int))
+        return 200, {"count": len(results), "cars": [self.car_json(car) for car in results[:limit]]}
+
+    def suggest(self, path, query):
+        limit = int(query.get("limit", ["10"])[0])
+        return 200, {"suggestions": [{"query": text, "cars": count} for text, count in
+                                     self.inventory.suggest(query.get("q", [""])[0], limit)]}
+
+    def car_detail(self, path, query):
+        car = self.inventory.get_car_by_vin(path[len("/cars/"):])
+        return (200, self.car_json(car)) if car else (404, {"error": "car not found"})
+
+    def sales_report(self, path, query):
+        analytics = self.inventory.analytics
+        return 200, {
+            "sales": analytics.count, "revenue": round(analytics.revenue, 2), "tax": round(analytics.tax, 2),
+            "by_month": {month: {"sales": c, "revenue": round(r, 2)} for month, (c, r, t) in
+                         sorted(analytics.by_month.items())},
+            "top_models": [{"make": make, "model": model, "sales": c, "revenue": round(r, 2)}
+                           for (make, model), (c, r, t) in analytics.top_models()],
+            "top_customers": [{"name": name, "sales": c, "revenue": round(r, 2)}
+                              for name, (c, r, t) in analytics.top_customers()],
+        }
+
+    def create_sale(self, path, body):
+        """Sell a car: body {"vin": ..., "customer_email": ...}. Runs on the writer task only."""
+        vin, email = body.get("vin", ""), body.get("customer_email", "")
+        if not isinstance(vin, str) or not isinstance(email, str):
+            return 400, {"error": "vin and customer_email must be strings"}
+        car = self.inventory.get_car_by_vin(vin)
+        customer = self.inventory.find_customer_by_email(email)
+        if car is None or customer is None:
+            return 404, {"error": "car not found" if car is None else "customer not found"}
+        sale = self.inventory.record_sale(car, customer)
+        if sale is None:
+            return 409, {"error": "car is already sold or changed"}
+        return 201, sale.to_dict()
+
+    async def _refresh(self):
+        """Pull in changes from other terminals (shared mode) and drop cached responses if anything changed."""
+        storage = self.inventory.storage
+        async with self._storage_lock:
+            records = await asyncio.get_running_loop().run_in_executor(None, storage.read_changes)
+            before = storage.journal_seq
+            if records is None:
+                self.inventory.refresh()  # Another terminal compacted: reload (rare)
+            else:
+                storage.apply_changes(self.inventory, records)
+            if storage.journal_seq != before:
+                self.cache.clear()
+
+    async def _refresher(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self._refresh()
+            except Exception as e:  # Keep serving what is in memory; the next look tries again
+                logger.warning("Refreshing from other terminals failed: %s", e)
+
+    async def _writer(self):
+        while True:
+            handler, body, future = await self.writes.get()
+            async with self._storage_lock:
+                try:
+                    result = handler("", body)
+                    self.cache.clear()  # Any write may change search results, details or reports
+                    future.set_result(result)
+                except Exception as e:
+                    future.set_exception(e)
+
+    async def dispatch(self, method, target, body):
+        """Route one request; returns (status, JSON-ready object or cached bytes)."""
+        path, query = urlsplit(target).path, parse_qs(urlsplit(target).query)
+        for route_method, prefix, handler in self.routes:
+            if method == route_method and (path == prefix or prefix.endswith("/") and path.startswith(prefix)):
+                break
+        else:
+            return 404, {"error": "not found"}
+        if method == "POST":
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict):
+                return 400, {"error": "the request body must be a JSON object"}
+            future = asyncio.get_running_loop().create_future()
+            await self.writes.put((handler, request, future))
+            return await future
+        cached = self.cache.get(target)
+        if cached is not None:
+            self.cache.move_to_end(target)
+            return cached
+        status, payload = handler(path, query)
+        response = (status, json.dumps(payload).encode())
+        self.cache[target] = response
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return response
+
+    async def handle_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one keep-alive connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except (ValueError, KeyError) as e:
+                    status, payload = 400, {"error": str(e)}
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+                close = headers.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+                writer.write(f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'OK')}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """Start listening; returns the asyncio server."""
+        self.writes = asyncio.Queue()
+        self._storage_lock = asyncio.Lock()
+        self._writer_task = asyncio.create_task(self._writer())
+        if getattr(self.inventory.storage, "shared", False):
+            self._refresher_task = asyncio.create_task(self._refresher())
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+HTTP_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 409: "Conflict"}
+
+def serve(inventory, host="127.0.0.1", port=8080):
+    """Run the HTTP service until interrupted."""
+    async def run():
+        server = await InventoryService(inventory).start(host, port)
+        print(f"Serving the dealership catalogue on http://{host}:{port} (Ctrl+C to stop)")
+        async with server:
+            await server.serve_forever()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("Service stopped.")
+
+# Load generator for the HTTP service: reports latency percentiles and requests per second
+async def _load_client(host, port, targets, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for method, target, body in targets:
+            data = json.dumps(body).encode() if body is not None else b""
+            start = time.perf_counter()
+            writer.write(f"{method} {target} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(data)}\r\n\r\n"
+                         .encode() + data)
+            await writer.drain()
+            await reader.readline()  # Status line
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+def benchmark_service(clients=50, requests=5000, cars=10000, write_ratio=0.02):
+    """
+    Start the service in-process on a temporary inventory and hammer it with concurrent keep-alive clients:
+    hot searches, car details, sales reports and a fraction of sales. Prints p50/p99 latency and requests/s.
+    """
+    import random
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        inventory = Inventory(storage=JSONStorage(os.path.join(tmp_dir, 'inventory.json'), journal=True),
+                              sample_cars=False)
+        makes = [("Ford", "Mustang GT"), ("Chevrolet", "Corvette Stingray"), ("Dodge", "Challenger SRT Hellcat")]
+        inventory.bulk_add_cars(Car(*makes[i % 3], 2000 + i % 25, 30000 + i % 70000, 300 + i % 700, 150)
+                                for i in range(cars))
+        inventory.bulk_add_customers(Customer(f"Client {i}", f"client{i}@example.com", "") for i in range(clients))
+        vins = [car.vin for car in inventory.cars]
+        hot_searches = ["/cars?q=ford&limit=10", "/cars?q=corvette+2024&limit=10",
+                        "/cars?min_price=50000&max_price=51000&limit=10", "/cars?q=dodge&min_hp=900&limit=10"]
+        unsold = vins[:]
+        random.shuffle(unsold)
+        plans = []
+        for client in range(clients):
+            plan = []
+            for _ in range(requests // clients):
+                roll = random.random()
+                if roll < write_ratio and unsold:
+                    plan.append(("POST", "/sales", {"vin": unsold.pop(), "customer_email": f"client{client}@example.com"}))
+                elif roll < 0.6:
+                    plan.append(("GET", random.choice(hot_searches), None))
+                elif roll < 0.9:
+                    plan.append(("GET", "/cars/" + random.choice(vins), None))
+                else:
+                    plan.append(("GET", "/reports/sales", None))
+            plans.append(plan)
+
+        async def run():
+            service = InventoryService(inventory)
+            server = await service.start("127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            latencies = []
+            start = time.perf_counter()
+            await asyncio.gather(*(_load_client("127.0.0.1", port, plan, latencies) for plan in plans))
+            elapsed = time.perf_counter() - start
+            server.close()
+            await server.wait_closed()
+            return latencies, elapsed
+
+        latencies, elapsed = asyncio.run(run())
+        inventory.close()
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{len(latencies)} requests from {clients} clients against {cars} cars "
+          f"({write_ratio:.0%} sales): {len(latencies) / elapsed:,.0f} requests/s, "
+          f"p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+    return latencies, elapsed
+
+# Command-line entry point: the interactive menu by default, or non-interactive subcommands
+def run_cli(argv=None):
+    parser = argparse.ArgumentParser(prog="carstore", description="American Sports Car Dealership Management System")
+    parser.add_argument("--data-file", default="inventory.json", help="JSON inventory file (default: inventory.json)")
+    parser.add_argument("--sqlite", metavar="DB", help="Use a SQLite database instead of the JSON file")
+    commands = parser.add_subparsers(dest="command")
+    import_parser = commands.add_parser("import", help="Bulk import cars or customers from CSV/NDJSON")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--kind", choices=("cars", "customers"),
+                               help="Record kind (default: guessed from the file name)")
+    import_parser.add_argument("--format", choices=("csv", "ndjson"), help="Default: from the file extension")
+    import_parser.add_argument("--batch-size", type=int, default=1000)
+    export_parser = commands.add_parser("export", help="Stream cars, customers or sales to CSV/NDJSON")
+    export_parser.add_argument("kind", choices=("cars", "customers", "sales"))
+    export_parser.add_argument("--format", choices=("csv", "ndjson"), default="ndjson")
+    export_parser.add_argument("-o", "--output", help="Output file (default: standard output)")
+    bench_parser = commands.add_parser("bench-memory", help="Compare memory use of the car layouts")
+    bench_parser.add_argument("count", type=int, nargs="?", default=1_000_000)
+    quiet_parser = commands.add_parser("bench-quiet", help="Compare throughput with and without console messages")
+    quiet_parser.add_argument("operations", type=int, nargs="?", default=100_000)
+    concurrency_parser = commands.add_parser("bench-concurrency",
+                                             help="Stress-test several processes selling from one shared inventory")
+    concurrency_parser.add_argument("--processes", type=int, default=4)
+    concurrency_parser.add_argument("--cars", type=int, default=500)
+    reprice_parser = commands.add_parser("reprice", help="Apply pricing rules to the whole inventory as one batch")
+    reprice_parser.add_argument("rules", nargs="*", help='Rules such as "make=Dodge year=2022 discount=10"')
+    reprice_parser.add_argument("--dry-run", action="store_true", help="Only show what would change")
+    reprice_parser.add_argument("--undo", nargs="?", type=int, const=0, metavar="BATCH",
+                                help="Undo a batch (default: the latest) instead of repricing")
+    reprice_parser.add_argument("--log", action="store_true", help="List the batches that can be undone")
+    serve_parser = commands.add_parser("serve", help="Serve search, car details, sales and reports over HTTP/JSON")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    service_bench_parser = commands.add_parser("bench-service", help="Load-test the HTTP service in-process")
+    service_bench_parser.add_argument("--clients", type=int, default=50)
+    service_bench_parser.add_argument("--requests", type=int, default=5000)
+    service_bench_parser.add_argument("--cars", type=int, default=10000)
+    service_bench_parser.add_argument("--write-ratio", type=float, default=0.02)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench-memory":
+        benchmark_memory(args.count)
+        return
+    if args.command == "bench-quiet":
+        benchmark_quiet_mode(args.operations)
+        return
+    if args.command == "bench-concurrency":
+        sys.exit(0 if benchmark_concurrent_sales(args.processes, args.cars) else 1)
+    if args.command == "bench-service":
+        benchmark_service(args.clients, args.requests, args.cars, args.write_ratio)
+        return
+    if args.command is None:
+        main()
+        return
+
+    def open_inventory():
+        storage = (SQLiteStorage(args.sqlite) if args.sqlite else
+                   JSONStorage(args.data_file, journal=True, lazy=True, shared=fcntl is not None))
+        return Inventory(storage=storage, sample_cars=False)
+
+    # Status messages go to stderr so exported data on stdout stays clean
+    # The service only reports problems: one line per sale would slow it down
+    enable_console_messages(sys.stderr, logging.WARNING if args.command == "serve" else logging.INFO)
+    inventory = open_inventory()
+    try:
+        if args.command == "serve":
+            serve(inventory, args.host, args.port)
+        elif args.command == "reprice":
+            if args.log:
+                inventory.display_reprice_log()
+            elif args.undo is not None:
+                inventory.undo_reprice(args.undo or None)
+            else:
+                try:
+                    rules = [PricingRule.parse(rule) for rule in args.rules]
+                except ValueError as e:
+                    parser.error(str(e))
+                start = time.perf_counter()
+                changes = inventory.reprice(rules, dry_run=args.dry_run)
+                elapsed = time.perf_counter() - start
+                if args.dry_run:
+                    inventory.display_price_changes(changes)
+                print(f"{'Planned' if args.dry_run else 'Applied'} {len(changes)} price changes across "
+                      f"{len(inventory.cars)} cars in {elapsed:.2f}s", file=sys.stderr)
+        elif args.command == "import":
+            kind = args.kind or ("customers" if "customer" in os.path.basename(args.file).lower() else "cars")
+            add = inventory.bulk_add_cars if kind == "cars" else inventory.bulk_add_customers
+            start = time.perf_counter()
+            added, errors = add(read_records(args.file, args.format), args.batch_size)
+            elapsed = time.perf_counter() - start
+            for number, message in errors[:20]:
+                print(f"Record {number} rejected: {message}", file=sys.stderr)
+            if len(errors) > 20:
+                print(f"... and {len(errors) - 20} more rejected records", file=sys.stderr)
+            print(f"Imported {added} {kind} ({len(errors)} rejected) in {elapsed:.2f}s "
+                  f"({(added + len(errors)) / max(elapsed, 1e-9):,.0f} records/s)")
+        else:
+            start = time.perf_counter()
+            if args.output:
+                with open(args.output, 'w', encoding='utf-8', newline='') as f:
+                    count = inventory.export_records(args.kind, f, args.format)
+            else:
+                count = inventory.export_records(args.kind, sys.stdout, args.format)
+            elapsed = time.perf_counter() - start
+            print(f"Exported {count} {args.kind} in {elapsed:.2f}s ({count / max(elapsed, 1e-9):,.0f} records/s)",
+                  file=sys.stderr)
+    finally:
+        inventory.close()
+
 # Run the main function if this script is executed directly
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_cli()
@@ -0,0 +1,392 @@
+import asyncio
+import fcntl
+import json
+import os
+import random
+import types
+
+import pytest
+
+import CarStore
+
+from CarStore import Car, Customer, Inventory, InventoryService, JSONStorage, SQLiteStorage, read_records
+
+
+def make_car(vin, make="Ford", model="Mustang GT"):
+    return Car(make, model, 2023, 55000, 450, 155, "Red", 5000, vin=vin)
+
+
+def shared_inventory(data_file):
+    """One terminal's view of inventory files shared with other terminals."""
+    return Inventory(storage=JSONStorage(str(data_file), journal=True, shared=True), sample_cars=False)
+
+
+def test_refresh_reloads_when_compaction_replaces_the_journal_after_the_check(tmp_path, monkeypatch):
+    data_file = tmp_path / "inventory.json"
+    first = shared_inventory(data_file)
+    first.add_car(make_car("VIN1"))
+    customer = Customer("Ann Lee", "ann@example.com", "555-0100")
+    first.add_customer(customer)
+    second = shared_inventory(data_file)
+    journal_path = second.storage.journal.path
+    stale = os.stat(journal_path)
+
+    # The first terminal sells the car, compacts, and keeps writing to the new journal
+    assert first.record_sale(first.index.by_vin["VIN1"], customer) is not None
+    first.add_car(make_car("VIN2"))
+    first.compact()
+    first.add_car(make_car("VIN3", "Dodge", "Challenger"))
+
+    # The second terminal checks the journal just before the compaction and reads it just after
+    real_stat = os.stat
+
+    def stat_before_compaction(path, *args, **kwargs):
+        if path == journal_path:
+            return types.SimpleNamespace(st_ino=stale.st_ino, st_size=stale.st_size + 1)
+        return real_stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, "stat", stat_before_compaction)
+    second.refresh()
+    monkeypatch.undo()
+
+    assert {"VIN1", "VIN2", "VIN3"} <= set(second.index.by_vin)
+    assert second.index.by_vin["VIN1"].is_sold
+    assert second.record_sale(second.index.by_vin["VIN1"], second.customers[0]) is None
+    assert len(first.sales) == 1
+    first.refresh()
+    assert len(first.sales) == 1
+
+
+def test_record_sale_adds_a_new_customer_and_rejects_an_unknown_one(tmp_path):
+    inventory = Inventory(str(tmp_path / "inventory.json"), journal=True, sample_cars=False)
+    inventory.add_car(make_car("VIN1"))
+    inventory.add_car(make_car("VIN2"))
+    walk_in = Customer("Ann Lee", "ann@example.com", "555-0100")
+
+    assert inventory.record_sale(inventory.index.by_vin["VIN1"], walk_in) is not None
+    assert inventory.get_customer_by_id(walk_in.customer_id) is walk_in
+    assert len(inventory.purchases_of(walk_in)) == 1
+
+    stranger = Customer("Bo Kim", "bo@example.com", "555-0101", customer_id=99)
+    assert inventory.record_sale(inventory.index.by_vin["VIN2"], stranger) is None
+    assert not inventory.index.by_vin["VIN2"].is_sold
+    assert inventory.purchases_of(stranger) == []
+
+
+def test_lazy_load_indexes_customers_and_sales_without_building_them(tmp_path):
+    data_file = str(tmp_path / "inventory.json")
+    inventory = Inventory(data_file, sample_cars=False)
+    for number in range(3):
+        inventory.add_car(make_car(f"VIN{number}"))
+    # Braces, quotes, escapes and non-ASCII text in strings must not confuse the scan
+    names = ['Ann "The Closer" Lee', "Bo {Kim}", "Zoë \\ Ng"]
+    for number, name in enumerate(names):
+        customer = Customer(name, f"C{number}@Example.com", "555-0100")
+        inventory.add_customer(customer)
+        inventory.record_sale(inventory.index.by_vin[f"VIN{number}"], customer)
+    revenue = inventory.analytics.revenue
+
+    lazy = Inventory(storage=JSONStorage(data_file, lazy=True), sample_cars=False)
+    assert not lazy.customers.loaded and not lazy.sales.loaded
+    assert lazy.find_customer_by_email("c1@example.com").name == "Bo {Kim}"
+    assert lazy.sale_for_vin("VIN2").customer_name == "Zoë \\ Ng"
+    assert [sale.car_vin for sale in lazy.purchases_of(lazy.get_customer_by_id(1))] == ["VIN0"]
+    assert lazy.analytics.count == 3 and lazy.analytics.revenue == revenue
+
+
+def test_load_drops_a_torn_journal_tail(tmp_path):
+    data_file = str(tmp_path / "inventory.json")
+    inventory = Inventory(data_file, journal=True, sample_cars=False)
+    inventory.add_car(make_car("VIN1"))
+    inventory.add_car(make_car("VIN2"))
+    inventory.storage.close()
+    journal_path = inventory.storage.journal.path
+    good_size = os.path.getsize(journal_path)
+    with open(journal_path, "ab") as f:
+        f.write(b'{"seq": 3, "op": "add_car", "data": {"vin": "VI')  # Crash in the middle of a write
+
+    reopened = Inventory(data_file, journal=True, sample_cars=False)
+    assert os.path.getsize(journal_path) == good_size
+    assert [car.vin for car in reopened.cars] == ["VIN1", "VIN2"]
+    reopened.add_car(make_car("VIN3"))  # New records append after the last complete one
+    reopened.storage.close()
+
+    assert [car.vin for car in Inventory(data_file, journal=True, sample_cars=False).cars] == ["VIN1", "VIN2", "VIN3"]
+
+
+def test_load_after_a_snapshot_replays_only_newer_journal_records(tmp_path):
+    data_file = str(tmp_path / "inventory.json")
+    inventory = Inventory(data_file, journal=True, sample_cars=False)
+    inventory.add_car(make_car("VIN1"))
+    customer = Customer("Ann Lee", "ann@example.com", "555-0100")
+    inventory.add_customer(customer)
+    inventory.record_sale(inventory.index.by_vin["VIN1"], customer)
+    inventory.storage.close()
+    journal_path = inventory.storage.journal.path
+    with open(journal_path, "rb") as f:
+        covered = f.read()
+    inventory.compact()
+    inventory.add_car(make_car("VIN2"))
+    inventory.storage.close()
+    with open(journal_path, "rb") as f:
+        newer = f.read()
+
+    reopened = Inventory(data_file, journal=True, sample_cars=False)
+    assert [car.vin for car in reopened.cars] == ["VIN1", "VIN2"]
+    assert len(reopened.customers) == 1 and len(reopened.sales) == 1
+
+    # A crash after the snapshot was written but before the journal was emptied leaves its records behind
+    with open(journal_path, "wb") as f:
+        f.write(covered + newer)
+    reopened = Inventory(data_file, journal=True, sample_cars=False)
+    assert [car.vin for car in reopened.cars] == ["VIN1", "VIN2"]
+    assert len(reopened.customers) == 1 and len(reopened.sales) == 1
+    assert reopened.index.by_vin["VIN1"].is_sold
+
+
+def test_import_rejects_malformed_lines_and_persists_each_batch(tmp_path):
+    data_file = str(tmp_path / "inventory.json")
+    record = '{"make": "Ford", "model": "Mustang", "year": 2020, "price": 30000, "horsepower": 400, "top_speed": 150, '
+    import_file = tmp_path / "cars.ndjson"
+    import_file.write_text("\n".join([record + '"vin": "A1"}', record + '"vin": "A2"}', '{"make": "Ford", "model"',
+                                       "[1]", '"x"', record + '"vin": "A3"}']) + "\n")
+    inventory = Inventory(data_file, journal=True, sample_cars=False)
+    added, errors = inventory.bulk_add_cars(read_records(str(import_file)), batch_size=2)
+    assert added == 3
+    assert errors == [(3, "invalid JSON (Expecting ':' delimiter)"), (4, "not a JSON object"), (5, "not a JSON object")]
+
+    def failing_late():
+        yield from (make_car(f"B{number}") for number in range(3))
+        raise OSError("import file went away")
+
+    with pytest.raises(OSError):
+        inventory.bulk_add_cars(failing_late(), batch_size=2)
+    inventory.storage.close()
+    # The batch applied before the failure is on disk too
+    reopened = Inventory(data_file, journal=True, sample_cars=False)
+    assert [car.vin for car in reopened.cars] == [car.vin for car in inventory.cars] == ["A1", "A2", "A3", "B0", "B1"]
+
+
+async def request(port, method, target, body=b""):
+    """Send one request to a local service on its own connection; returns (status, reply)."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {target} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) != b"\r\n":
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    reply = json.loads(await reader.readexactly(length))
+    writer.close()
+    return status, reply
+
+
+def test_service_rejects_sale_bodies_that_are_not_objects(tmp_path):
+    inventory = Inventory(str(tmp_path / "inventory.json"), journal=True, sample_cars=False)
+    inventory.add_car(make_car("VIN1"))
+    inventory.add_customer(Customer("Ann Lee", "ann@example.com", "555-0100"))
+
+    async def run():
+        server = await InventoryService(inventory).start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        replies = [await request(port, "POST", "/sales", body) for body in
+                   (b"[]", b'"VIN1"', b'{"vin": 1, "customer_email": "ann@example.com"}',
+                    b'{"vin": "VIN1", "customer_email": "ann@example.com"}')]
+        server.close()
+        return replies
+
+    replies = asyncio.run(run())
+    assert [status for status, reply in replies] == [400, 400, 400, 201]
+    assert replies[0][1] == {"error": "the request body must be a JSON object"}
+    assert inventory.index.by_vin["VIN1"].is_sold
+
+
+def test_service_reads_are_not_blocked_by_another_terminal_holding_the_lock(tmp_path):
+    data_file = tmp_path / "inventory.json"
+    served = shared_inventory(data_file)
+    served.add_car(make_car("VIN1"))
+    other = shared_inventory(data_file)
+
+    async def run():
+        server = await InventoryService(served, refresh_interval=0.01).start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        other.add_car(make_car("VIN2"))
+        for _ in range(100):  # Picked up on the timer
+            if (await request(port, "GET", "/cars/VIN2"))[0] == 200:
+                break
+            await asyncio.sleep(0.01)
+        else:
+            raise AssertionError("the other terminal's car never appeared")
+        with open(str(data_file) + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # Another terminal in the middle of a compaction
+            try:
+                await asyncio.sleep(0.05)  # Let the refresher block on the lock in its worker thread
+                reply = await asyncio.wait_for(request(port, "GET", "/cars/VIN1"), 2)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        server.close()
+        return reply
+
+    assert asyncio.run(run())[0] == 200
+
+
+def test_lazy_reload_after_compaction_elsewhere_closes_the_old_snapshot(tmp_path):
+    data_file = tmp_path / "inventory.json"
+    writer = shared_inventory(data_file)
+    writer.add_car(make_car("VIN1"))
+    writer.add_customer(Customer("Ann Lee", "ann@example.com", "555-0100"))
+    writer.compact()
+    reader = Inventory(storage=JSONStorage(str(data_file), journal=True, lazy=True, shared=True), sample_cars=False)
+    assert reader.get_customer_by_id(1).name == "Ann Lee"  # Opens the snapshot to build the customer
+    replaced = reader.customers
+    assert replaced._file is not None
+
+    writer.add_car(make_car("VIN2"))
+    writer.compact()
+    reader.refresh()  # Reloads the new snapshot
+    assert replaced._file is None
+    assert reader.customers is not replaced and len(reader.cars) == 2
+
+
+def matches(car, keyword, min_price, max_price, min_hp):
+    """What a search should return, by checking every car"""
+    tokens = f"{car.make} {car.model} {car.color} {car.year}".lower().split()
+    return (all(any(token.startswith(word) for token in tokens) for word in keyword.lower().split()) and
+            (min_price is None or car.price >= min_price) and (max_price is None or car.price <= max_price) and
+            (min_hp is None or car.horsepower >= min_hp))
+
+
+def test_indexed_search_agrees_with_a_full_scan_as_cars_change(tmp_path):
+    rng = random.Random(3)
+    models = [("Ford", "Mustang GT"), ("Ford", "Mustang Mach 1"), ("Chevrolet", "Corvette Stingray"),
+              ("Chevrolet", "Camaro SS"), ("Dodge", "Challenger SRT Hellcat"), ("Dodge", "Charger")]
+    inventory = Inventory(str(tmp_path / "inventory.json"), journal=True, sample_cars=False)
+
+    def random_car(number):
+        make, model = rng.choice(models)
+        return Car(make, model, rng.randint(2015, 2025), rng.randrange(20000, 120000, 500), rng.randint(300, 800),
+                   rng.randint(140, 210), rng.choice(["Red", "Black", "Blue"]), 0, vin=f"VIN{number}")
+
+    inventory.bulk_add_cars(random_car(number) for number in range(200))
+    for number in range(200, 250):
+        inventory.add_car(random_car(number))
+    queries = [(rng.choice(["", "ford", "mus", "cor red", "dodge 2020", "c", "mach", "blue ch", "tesla"]),
+                rng.choice([None, 30000, 60000]), rng.choice([None, 80000, 100000]), rng.choice([None, 400, 650]))
+               for _ in range(60)]
+
+    for round_number in range(3):
+        for query in queries:
+            found = inventory.find_cars(*query)
+            assert sorted(car.vin for car in found) == sorted(car.vin for car in inventory.cars if matches(car, *query))
+            assert inventory.find_cars(*query) == found  # Served from the cache
+        # Change prices and remove cars; the indexes and the cache must follow
+        for car in rng.sample(inventory.cars, 20):
+            inventory.update_price(car, rng.randrange(20000, 120000, 500))
+        for car in rng.sample(inventory.cars, 10):
+            inventory.remove_car_by_vin(car.vin)
+
+
+def test_sqlite_sales_point_at_the_right_customers_after_reopening(tmp_path):
+    db_file = str(tmp_path / "inventory.db")
+    inventory = Inventory(storage=SQLiteStorage(db_file), sample_cars=False)
+    inventory.bulk_add_cars([make_car(f"VIN{number}") for number in range(4)])
+    inventory.add_customer(Customer("Ann Lee", "ann@example.com", "555-0100"))
+    added, errors = inventory.bulk_add_customers([Customer("Bo Kim", "bo@example.com", "555-0101"),
+                                                  Customer("Cy Ng", "cy@example.com", "555-0102")])
+    assert (added, errors) == (2, [])
+
+    # Sales to the first, the last bulk-added and a walk-in customer added by the sale itself
+    walk_in = Customer("Di Roe", "di@example.com", "555-0103")
+    buyers = {"VIN0": "ann@example.com", "VIN2": "cy@example.com", "VIN3": "di@example.com"}
+    for vin, email in buyers.items():
+        customer = inventory.find_customer_by_email(email) or walk_in
+        assert inventory.record_sale(inventory.index.by_vin[vin], customer) is not None
+    inventory.storage.close()
+
+    reopened = Inventory(storage=SQLiteStorage(db_file), sample_cars=False)
+    assert [customer.customer_id for customer in reopened.customers] == [1, 2, 3, 4]
+    assert reopened.storage.sales_summary()[0] == 3
+    for vin, email in buyers.items():
+        buyer = reopened.buyer_of(vin)
+        assert buyer is not None and buyer.email == email
+        assert reopened.index.by_vin[vin].is_sold
+        assert [sale.car_vin for sale in reopened.purchases_of(buyer)] == [vin]
+        assert buyer.purchases == [vin]
+    assert reopened.buyer_of("VIN1") is None
+    assert reopened.purchases_of(reopened.find_customer_by_email("bo@example.com")) == []
+    reopened.storage.close()
+
+
+def test_fuzzy_search_and_suggestions_rank_cars_and_follow_changes(tmp_path):
+    inventory = Inventory(str(tmp_path / "inventory.json"), sample_cars=False)
+    for vin, make, model, year in [("C24", "Chevrolet", "Corvette", 2024), ("C23", "Chevrolet", "Corvette", 2023),
+                                   ("CA24", "Chevrolet", "Camaro", 2024), ("M24", "Ford", "Mustang GT", 2024),
+                                   ("MV23", "Ford", "Maverick", 2023)]:
+        inventory.add_car(Car(make, model, year, 50000, 400, 150, "Red", 100, vin=vin))
+
+    def vins(results):
+        return [car.vin for _, car in results]
+
+    # A misspelt model still finds the car, but scores below the exact spelling
+    assert vins(inventory.fuzzy_search("corvete 2024")) == ["C24"]
+    (exact, _), = inventory.fuzzy_search("corvette 2024")
+    (typo, _), = inventory.fuzzy_search("corvete 2024")
+    assert exact == 1.0 and typo < exact
+    assert sorted(vins(inventory.fuzzy_search("corvete"))) == ["C23", "C24"]
+    # Years match exactly or by prefix, never by look-alike
+    assert inventory.fuzzy_search("corvette 2025") == []
+    assert len(inventory.fuzzy_search("202")) == 5
+    assert len(inventory.fuzzy_search("202", limit=2)) == 2
+    assert inventory.fuzzy_search("zonda") == []
+    assert inventory.index.similar_tokens("corvete")[0][0] == "corvette"
+
+    # Completions must still match a car together with the earlier words, most common first
+    assert inventory.suggest("chevrolet c") == [("chevrolet corvette", 2), ("chevrolet camaro", 1)]
+    assert sorted(query for query, _ in inventory.suggest("ford m")) == ["ford maverick", "ford mustang"]
+    assert inventory.suggest("tesla m") == []
+    assert inventory.suggest("") == []
+
+    # Cached results are dropped when the inventory changes
+    inventory.add_car(Car("Ford", "Mach-E", 2024, 45000, 480, 124, "Blue", 10, vin="ME24"))
+    assert "ford mach-e" in [query for query, _ in inventory.suggest("ford m")]
+    inventory.remove_car_by_vin("C23")
+    assert vins(inventory.fuzzy_search("corvete")) == ["C24"]
+
+
+def test_reprice_batches_undo_and_survive_a_reload(tmp_path, monkeypatch):
+    data_file = str(tmp_path / "inventory.json")
+    inventory = Inventory(data_file, journal=True, sample_cars=False)
+    inventory.add_car(Car("Dodge", "Challenger", 2022, 40000, 485, 165, "Black", 20000, vin="D22"))
+    inventory.add_car(Car("Dodge", "Charger", 2023, 45000, 370, 155, "White", 8000, vin="D23"))
+    inventory.add_car(Car("Ford", "Mustang GT", 2022, 50000, 450, 155, "Red", 60000, vin="F22"))
+    rules = ["make=Dodge year=2022 discount=10", "mileage=50000- per_mile=0.1 floor=46000"]
+
+    # A dry run plans the same changes with or without NumPy and changes nothing
+    planned = inventory.reprice(rules, dry_run=True)
+    assert planned == [["D22", 40000, 0, 40000, 10.0], ["F22", 50000, 0, 46000.0, 0]]
+    monkeypatch.setattr(CarStore, "np", None)
+    assert inventory.reprice(rules, dry_run=True) == planned
+    monkeypatch.undo()
+    assert inventory.reprice_log == []
+    assert inventory.index.by_vin["F22"].price == 50000
+
+    first = inventory.reprice(rules)
+    assert [change[:5] for change in first] == planned
+    inventory.reprice(["make=Dodge percent=-5"])
+    assert [batch.batch_id for batch in inventory.reprice_log] == [1, 2]
+    assert inventory.index.by_vin["D23"].price == 42750
+
+    # Undoing the older batch skips the Challenger, which the newer batch repriced again
+    assert inventory.undo_reprice(1) == 1
+    assert (inventory.index.by_vin["F22"].price, inventory.index.by_vin["D22"].price) == (50000, 38000)
+    assert inventory.index.by_vin["D22"].discount == 10.0
+
+    reloaded = Inventory(data_file, journal=True, sample_cars=False)
+    assert [batch.batch_id for batch in reloaded.reprice_log] == [2]
+    assert {vin: (car.price, car.discount) for vin, car in reloaded.index.by_vin.items()} == \
+        {"D22": (38000, 10.0), "D23": (42750, 0), "F22": (50000, 0)}
+    assert reloaded.undo_reprice() == 2
+    assert {vin: car.price for vin, car in reloaded.index.by_vin.items()} == {"D22": 40000, "D23": 45000, "F22": 50000}
+    assert reloaded.undo_reprice() == 0
+    assert sorted(car.vin for car in reloaded.find_cars(min_price=44000)) == ["D23", "F22"]
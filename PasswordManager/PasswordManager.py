@@ -1,61 +1,309 @@
 # A program for managing passwords securely
 # It allows users to store, retrieve, and manage their passwords with encryption
 import os
+import sys
 import json
-from cryptography.fernet import Fernet
+import time
+import hmac
+import base64
+import socket
+import struct
+import getpass
+import hashlib
+import argparse
+import tempfile
+import subprocess
+from collections import OrderedDict
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+# The vault is a text file of one record per line after a header line:
+#   <service digest> <Fernet token>    an entry (service, username and password, encrypted together)
+#   <service digest> -                 a tombstone for a deleted entry
+# The digest is a keyed hash of the service name, so the index can be rebuilt without decrypting
+# anything and without the file revealing service names. Only the last record for a digest counts.
+VAULT_HEADER = b"PMVAULT1\n"
+DIGEST_LENGTH = 32  # Hex characters kept from the HMAC-SHA256 of the service name
+TOMBSTONE = b"-"
+COMPACT_MIN_DEAD = 1000  # Rewrite the vault once it holds this many dead records and more dead than live
+# Service names live in a separate file (storage file + NAMES_SUFFIX), encrypted as a whole: a
+# digest -> name map. Because a digest is derived from the name, an out-of-date map is never wrong,
+# only incomplete, and the missing names are taken from their entries.
+NAMES_SUFFIX = ".names"
+# With a master password the key file is JSON: the KDF, its parameters and salt, the vault key
+# encrypted under the key derived from the password, and a check value (a keyed hash made with the
+# vault key) to recognize the right key without the password. Changing the password only rewrites this file.
+KDF_DEFAULTS = {'scrypt': {'n': 2 ** 15, 'r': 8, 'p': 1}, 'pbkdf2': {'iterations': 600000}}
+LEGACY_IMPORTED_SUFFIX = ".imported"  # Added to the legacy file's name once its entries are in the vault
+AGENT_IDLE_TIMEOUT = 15 * 60  # Seconds an unlock agent keeps the key after the last command that used it
+AGENT_REPLY_TIMEOUT = 5  # Seconds a command waits for the agent before asking for the master password
+# The agent listens on a Unix socket checked against the user's ID; elsewhere (e.g. Windows) every
+# command asks for the master password
+AGENT_SUPPORTED = hasattr(socket, 'AF_UNIX') and hasattr(os, 'getuid')
+AGENT_UNSUPPORTED_MESSAGE = "The unlock agent needs Unix domain sockets, which this platform doesn't have."
+
+def derive_key(master_password, params):
+    """
+    Derive a Fernet key from the master password.
+    Args:
+        master_password (str): The master password.
+        params (dict): Key file contents: 'kdf', base64 'salt' and the KDF's cost parameters.
+    Returns:
+        bytes: The derived key, base64 encoded as Fernet expects.
+    """
+    salt = base64.b64decode(params['salt'])
+    if params['kdf'] == 'scrypt':
+        kdf = Scrypt(salt=salt, length=32, n=params['n'], r=params['r'], p=params['p'])
+    elif params['kdf'] == 'pbkdf2':
+        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=params['iterations'])
+    else:
+        raise ValueError(f"Unknown key derivation function '{params['kdf']}'.")
+    return base64.urlsafe_b64encode(kdf.derive(master_password.encode()))
+
+def key_check(key):
+    """Check value stored with a protected vault key; reveals nothing about the key itself."""
+    return hmac.new(base64.urlsafe_b64decode(key), b"key check", hashlib.sha256).hexdigest()
 
 class PasswordManager:
-    def __init__(self, storage_file='passwords.json', key_file='secret.key'):
+    def __init__(self, storage_file='passwords.vault', key_file='secret.key', legacy_file='passwords.json',
+                 cache_size=256, cache_ttl=300, master_password=None, key=None):
         """
         Initialize the PasswordManager with storage and encryption key files.
         Args:
-            storage_file (str): File to store encrypted passwords.
+            storage_file (str): File to store encrypted passwords, one record per entry.
             key_file (str): File to store the encryption key.
+            legacy_file (str): Whole-vault encrypted file of older versions, imported into an empty storage_file
+                and then renamed (LEGACY_IMPORTED_SUFFIX added) so it is never imported again.
+            cache_size (int): Most decrypted entries kept in memory (0 to decrypt on every lookup).
+            cache_ttl (float): Seconds a decrypted entry is kept after it was last looked up.
+            master_password (str): Password protecting the key file; None for an unprotected key file.
+            key (bytes): Vault key already unlocked (by an agent), instead of reading the key file.
+        Raises:
+            ValueError: If the master password is wrong or missing.
         """
         self.storage_file = storage_file
         self.key_file = key_file
-        self.key = self.load_or_generate_key()
+        self.key = key or self.load_or_generate_key(master_password)
         self.cipher = Fernet(self.key)
-        self.passwords = self.load_passwords()
+        self.index_key = hmac.new(base64.urlsafe_b64decode(self.key), b"service index", hashlib.sha256).digest()
+        self.index = {}  # Service digest -> (offset, length) of its token in the vault
+        self.dead = 0  # Records superseded by a tombstone, or tombstones themselves
+        self.file = None
+        self.cache = OrderedDict()  # Service digest -> (expiry, entry), least recently used (and so soonest to expire) first
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.names = None  # Service digest -> name, read from the names file on first use
+        self.names_changed = False
+        self.load_passwords()
+        if legacy_file and not self.index and not self.dead and os.path.exists(legacy_file):
+            self.import_legacy(legacy_file)
 
-    def load_or_generate_key(self):
-        """Load existing encryption key or generate a new one."""
+    def load_or_generate_key(self, master_password=None):
+        """
+        Load existing encryption key or generate a new one. With a master password the key is kept
+        encrypted in the key file; an unprotected key file from older versions is protected with it.
+        """
         if os.path.exists(self.key_file):
             with open(self.key_file, 'rb') as file:
-                return file.read()
+                data = file.read()
+            if not data.startswith(b"{"):
+                if master_password is not None:
+                    self.protect_key(data, master_password)
+                return data
+            if master_password is None:
+                raise ValueError(f"{self.key_file} is protected by a master password.")
+            params = json.loads(data)
+            try:
+                return Fernet(derive_key(master_password, params)).decrypt(params['key'].encode())
+            except InvalidToken:
+                raise ValueError("Wrong master password.") from None
         else:
             key = Fernet.generate_key()
-            with open(self.key_file, 'wb') as file:
-                file.write(key)
+            if master_password is not None:
+                self.protect_key(key, master_password)
+            else:
+                with open(self.key_file, 'wb') as file:
+                    file.write(key)
             return key
 
+    def protect_key(self, key, master_password, kdf='scrypt', **cost):
+        """
+        Write key to the key file, encrypted under a key derived from the master password.
+        Args:
+            key (bytes): The vault key.
+            master_password (str): The master password.
+            kdf (str): 'scrypt' or 'pbkdf2'.
+            cost: KDF parameters overriding KDF_DEFAULTS (n, r, p for scrypt; iterations for pbkdf2).
+        """
+        params = {'kdf': kdf, 'salt': base64.b64encode(os.urandom(16)).decode(), **KDF_DEFAULTS[kdf], **cost}
+        params['key'] = Fernet(derive_key(master_password, params)).encrypt(key).decode()
+        params['check'] = key_check(key)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.key_file)), prefix=".key-")
+        with os.fdopen(fd, 'w') as file:  # mkstemp creates it readable by the owner only
+            json.dump(params, file)
+        os.replace(tmp_path, self.key_file)
+
+    def change_master_password(self, master_password, kdf='scrypt', **cost):
+        """Protect the vault key with a new master password (and KDF settings); entries are untouched."""
+        self.protect_key(self.key, master_password, kdf, **cost)
+
+    def service_digest(self, service):
+        """Keyed hash identifying a service in the vault without revealing its name."""
+        return hmac.new(self.index_key, service.encode(), hashlib.sha256).hexdigest()[:DIGEST_LENGTH].encode()
+
     def load_passwords(self):
         """
-        Load and decrypt passwords from the storage file.
-        Returns:
-            dict: Decrypted passwords dictionary or empty dict if file doesn't exist.
+        Open the storage file and index its records by service digest. Nothing is decrypted.
+        A record cut short by a crash while it was being appended is dropped.
         """
         try:
-            if os.path.exists(self.storage_file):
-                with open(self.storage_file, 'rb') as file:
-                    encrypted_data = file.read()
-                    decrypted_data = self.cipher.decrypt(encrypted_data)
-                    return json.loads(decrypted_data)
-            return {}
+            self.file = open(self.storage_file, 'a+b')
+            self.file.seek(0)
+            header = self.file.read(len(VAULT_HEADER))
+            if not header:
+                self.file.write(VAULT_HEADER)
+                self.file.flush()
+                return
+            if header != VAULT_HEADER:
+                raise ValueError(f"{self.storage_file} is not a password vault")
+            index, dead = {}, 0
+            offset = len(VAULT_HEADER)
+            for line in self.file:
+                if not line.endswith(b"\n"):
+                    print(f"Dropping an incomplete record at the end of {self.storage_file}.")
+                    self.file.truncate(offset)
+                    break
+                digest, token = line[:DIGEST_LENGTH], line[DIGEST_LENGTH + 1:-1]
+                if token == TOMBSTONE:
+                    dead += 1 + (index.pop(digest, None) is not None)
+                else:
+                    dead += digest in index
+                    index[digest] = (offset + DIGEST_LENGTH + 1, len(token))
+                offset += len(line)
+            self.index, self.dead = index, dead
         except Exception as e:
             print(f"Error loading passwords: {e}")
-            return {}
+            self.close()
+            self.index, self.dead = {}, 0
 
-    def save_passwords(self):
+    def import_legacy(self, legacy_file):
         """
-        Encrypt and save passwords to the storage file.
+        Copy the entries of a whole-vault encrypted file into the storage file, then rename the file
+        so that a vault emptied later (by deletes and compaction) doesn't bring them back.
         """
         try:
-            encrypted_data = self.cipher.encrypt(json.dumps(self.passwords).encode())
-            with open(self.storage_file, 'wb') as file:
-                file.write(encrypted_data)
+            with open(legacy_file, 'rb') as file:
+                passwords = json.loads(self.cipher.decrypt(file.read()))
+            for service, entry in passwords.items():
+                self.append_record(self.service_digest(service), self.encrypt_entry(service, entry['username'], entry['password']),
+                                   sync=False)
+            os.fsync(self.file.fileno())  # The entries must be safe before the file they came from is retired
+            os.replace(legacy_file, legacy_file + LEGACY_IMPORTED_SUFFIX)
+            print(f"Imported {len(passwords)} entries from {legacy_file} into {self.storage_file} "
+                  f"and renamed it to {legacy_file + LEGACY_IMPORTED_SUFFIX}.")
         except Exception as e:
-            print(f"Error saving passwords: {e}")
+            print(f"Error importing {legacy_file}: {e}")
+
+    def encrypt_entry(self, service, username, password):
+        return self.cipher.encrypt(json.dumps({'service': service, 'username': username, 'password': password}).encode())
+
+    def read_entry(self, digest):
+        """Decrypt the live entry for a service digest; returns its dict with service, username and password."""
+        offset, length = self.index[digest]
+        self.file.seek(offset)
+        return json.loads(self.cipher.decrypt(self.file.read(length)))
+
+    def append_record(self, digest, token, sync=True):
+        """
+        Append one record to the vault and update the index.
+        Args:
+            digest (bytes): Service digest.
+            token (bytes): Encrypted entry, or TOMBSTONE.
+            sync (bool): Fsync before returning, so an entry reported as saved (or deleted) survives a
+                power loss. Callers appending many records can pass False and fsync once at the end.
+        """
+        offset = self.file.seek(0, os.SEEK_END)
+        self.file.write(digest + b" " + token + b"\n")
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+        if token == TOMBSTONE:
+            self.index.pop(digest)
+            self.dead += 2  # The tombstone and the entry it hides
+        else:
+            self.index[digest] = (offset + DIGEST_LENGTH + 1, len(token))
+
+    def compact(self):
+        """
+        Rewrite the vault with only its live entries, dropping tombstones and what they hide.
+        Tokens are copied as they are, so this costs I/O but no encryption.
+        """
+        directory = os.path.dirname(os.path.abspath(self.storage_file))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".vault-")
+        index = {}
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.write(VAULT_HEADER)
+                offset = len(VAULT_HEADER)
+                for digest, (token_offset, length) in self.index.items():
+                    self.file.seek(token_offset)
+                    line = digest + b" " + self.file.read(length) + b"\n"
+                    out.write(line)
+                    index[digest] = (offset + DIGEST_LENGTH + 1, length)
+                    offset += len(line)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, self.storage_file)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.file.close()
+        self.file = open(self.storage_file, 'a+b')
+        self.index, self.dead = index, 0
+        if self.names is not None:
+            self.names = {digest: self.names[digest] for digest in index if digest in self.names}
+            self.save_names()
+
+    def load_names(self):
+        """Read the digest -> name map, or start an empty one if it is missing or unreadable."""
+        self.names = {}
+        try:
+            with open(self.storage_file + NAMES_SUFFIX, 'rb') as file:
+                self.names = {digest.encode(): name for digest, name in json.loads(self.cipher.decrypt(file.read())).items()}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading service names, rebuilding them: {e}")
+
+    def save_names(self):
+        """Encrypt the digest -> name map and replace the names file with it."""
+        names_file = self.storage_file + NAMES_SUFFIX
+        data = self.cipher.encrypt(json.dumps({digest.decode(): name for digest, name in self.names.items()}).encode())
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(names_file)), prefix=".names-")
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, names_file)
+        self.names_changed = False
+
+    def wipe_cache(self):
+        """
+        Forget every decrypted entry. Python can't overwrite the strings themselves, so this
+        drops the manager's references and leaves the memory to be reused.
+        """
+        self.cache.clear()
+
+    def close(self):
+        self.wipe_cache()
+        if self.names is not None and self.names_changed and self.file is not None:
+            try:
+                self.save_names()
+            except Exception as e:
+                print(f"Error saving service names: {e}")
+        if self.file is not None:
+            self.file.close()
+            self.file = None
 
     def add_password(self, service, username, password):
         """
@@ -70,11 +318,18 @@ class PasswordManager:
         if not service or not username or not password:
             print("Service, username, and password cannot be empty.")
             return False
-        if service in self.passwords:
+        digest = self.service_digest(service)
+        if digest in self.index:
             print(f"Service '{service}' already exists.")
             return False
-        self.passwords[service] = {'username': username, 'password': password}
-        self.save_passwords()
+        try:
+            self.append_record(digest, self.encrypt_entry(service, username, password))
+        except Exception as e:
+            print(f"Error saving passwords: {e}")
+            return False
+        if self.names is not None:
+            self.names[digest] = service
+            self.names_changed = True
         return True
 
     def get_password(self, service):
@@ -85,7 +340,22 @@ class PasswordManager:
         Returns:
             dict or None: Password entry if found, None otherwise.
         """
-        return self.passwords.get(service, None)
+        digest = self.service_digest(service)
+        if digest not in self.index:
+            return None
+        now = time.monotonic()
+        cache = self.cache
+        while cache and next(iter(cache.values()))[0] <= now:
+            cache.popitem(last=False)  # Expired
+        cached = cache.pop(digest, None)
+        if cached is None:
+            entry = self.read_entry(digest)
+            cached = (0, {'username': entry['username'], 'password': entry['password']})
+        if self.cache_size > 0:
+            cache[digest] = (now + self.cache_ttl, cached[1])
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return dict(cached[1])
 
     def delete_password(self, service):
         """
@@ -95,11 +365,21 @@ class PasswordManager:
         Returns:
             bool: True if deleted successfully, False if service not found.
         """
-        if service in self.passwords:
-            del self.passwords[service]
-            self.save_passwords()
-            return True
-        return False
+        digest = self.service_digest(service)
+        if digest not in self.index:
+            return False
+        self.cache.pop(digest, None)
+        try:
+            self.append_record(digest, TOMBSTONE)
+        except Exception as e:
+            print(f"Error saving passwords: {e}")
+            return False
+        if self.dead >= COMPACT_MIN_DEAD and self.dead > len(self.index):
+            try:
+                self.compact()
+            except Exception as e:  # The entry is deleted either way; the next delete tries again
+                print(f"Error compacting {self.storage_file}: {e}")
+        return True
 
     def list_services(self):
         """
@@ -107,19 +387,306 @@ class PasswordManager:
         Returns:
             list: List of service names.
         """
-        return list(self.passwords.keys())
+        if self.names is None:
+            self.load_names()
+        missing = [digest for digest in self.index if digest not in self.names]
+        for digest in missing:
+            self.names[digest] = self.read_entry(digest)['service']
+        if missing or len(self.names) > len(self.index):
+            self.names = {digest: self.names[digest] for digest in self.index}
+            self.names_changed = True
+        return [self.names[digest] for digest in self.index]
 
 
-if __name__ == "__main__":
+def agent_socket_path(key_file):
+    """
+    Where the unlock agent for a key file listens: one socket per key file, in a directory only
+    the current user can enter.
+    """
+    directory = os.environ.get('XDG_RUNTIME_DIR') or os.path.join(tempfile.gettempdir(), f"passwords-{os.getuid()}")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    status = os.stat(directory)
+    if status.st_uid != os.getuid() or status.st_mode & 0o077:
+        raise ValueError(f"{directory} must belong to you and be private to hold the unlock agent's socket.")
+    name = hashlib.sha256(os.path.abspath(key_file).encode()).hexdigest()[:16]
+    return os.path.join(directory, f"passwords-agent-{name}.sock")
+
+def run_agent(socket_path, key, idle_timeout=AGENT_IDLE_TIMEOUT, ready=None):
+    """
+    Hand the vault key to the current user's commands over a Unix socket, until none has asked for
+    it in idle_timeout seconds or one sends "lock". A client sends "key" or "lock" and reads the reply.
+    Args:
+        socket_path (str): Socket to listen on.
+        key (bytes): The unlocked vault key.
+        idle_timeout (float): Seconds without requests before the agent forgets the key and exits.
+        ready (callable): Called once the socket accepts connections.
+    """
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)  # Left by an agent that didn't exit cleanly
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(umask)
+    server.listen()
+    if ready:
+        ready()
+    peer_credentials = getattr(socket, 'SO_PEERCRED', None)
+    deadline = time.monotonic() + idle_timeout
+    try:
+        while (remaining := deadline - time.monotonic()) > 0:
+            server.settimeout(remaining)
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                break
+            with conn:
+                try:
+                    conn.settimeout(1)
+                    if peer_credentials is not None:
+                        _, uid, _ = struct.unpack('3i', conn.getsockopt(socket.SOL_SOCKET, peer_credentials, struct.calcsize('3i')))
+                        if uid != os.getuid():
+                            continue
+                    request = conn.recv(16).strip()
+                    if request == b"key":
+                        conn.sendall(key)
+                        deadline = time.monotonic() + idle_timeout
+                    elif request == b"lock":
+                        conn.sendall(b"locked")
+                        break
+                except OSError:
+                    continue
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+def agent_request(socket_path, request):
+    """
+    Send a request ("key" or "lock") to the unlock agent listening on socket_path.
+    Returns:
+        bytes or None: The agent's reply, or None if no agent is running.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(AGENT_REPLY_TIMEOUT)
+            client.connect(socket_path)
+            client.sendall(request + b"\n")
+            reply = b""
+            while chunk := client.recv(4096):
+                reply += chunk
+            return reply or None
+    except OSError:  # No agent, a stale socket, or one that doesn't answer
+        return None
+
+def start_agent(key_file, key, idle_timeout=AGENT_IDLE_TIMEOUT):
+    """Start an unlock agent for key_file in the background, holding key; returns once it is listening"""
+    agent = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--key-file", key_file,
+                              "agent", "--idle-timeout", str(idle_timeout)],
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                             start_new_session=True)
+    agent.stdin.write(key)
+    agent.stdin.close()
+    if agent.stdout.readline() != b"ready\n":
+        raise RuntimeError("The unlock agent failed to start.")
+    agent.stdout.close()
+
+def ask_master_password(key_file):
+    """
+    Prompt for the master password, twice when one is being chosen: for a new or unprotected key
+    file, or when key_file is None.
+    """
+    if key_file and os.path.exists(key_file):
+        with open(key_file, 'rb') as file:
+            protected = file.read(1) == b"{"
+        if protected:
+            return getpass.getpass("Master password: ")
+    while True:
+        master_password = getpass.getpass("Choose a master password: ")
+        if not master_password:
+            print("Master password cannot be empty.")
+        elif getpass.getpass("Repeat the master password: ") != master_password:
+            print("Passwords don't match.")
+        else:
+            return master_password
+
+def agent_key_matches(key, key_file, storage_file):
+    """
+    Whether a key handed over by an unlock agent is the vault key of key_file: compared with the
+    key file's check value, or, for a key file written before check values, with the key itself
+    (unprotected) or by decrypting the vault's first entry.
+    """
+    try:
+        with open(key_file, 'rb') as file:
+            data = file.read()
+        if not data.startswith(b"{"):
+            return hmac.compare_digest(data, key)
+        check = json.loads(data).get('check')
+        if check is not None:
+            return hmac.compare_digest(check, key_check(key))
+        cipher = Fernet(key)
+        with open(storage_file, 'rb') as file:
+            file.readline()  # Header
+            for line in file:
+                token = line[DIGEST_LENGTH + 1:-1]
+                if token != TOMBSTONE:
+                    cipher.decrypt(token)
+                    break
+        return True
+    except (OSError, ValueError, InvalidToken):
+        return False
+
+def open_manager(storage_file='passwords.vault', key_file='secret.key', use_agent=True):
+    """
+    Open the vault with the key held by a running unlock agent if there is one (and its key is the
+    right one), otherwise by asking for the master password.
+    """
+    if use_agent and AGENT_SUPPORTED and os.path.exists(key_file):
+        key = agent_request(agent_socket_path(key_file), b"key")
+        if key and agent_key_matches(key, key_file, storage_file):
+            return PasswordManager(storage_file, key_file, key=key)
+    return PasswordManager(storage_file, key_file, master_password=ask_master_password(key_file))
+
+
+def benchmark_vault(entries=20000, operations=2000):
+    """Time adds, lookups and deletes on a vault of the given size, against re-encrypting the whole vault"""
+    with tempfile.TemporaryDirectory() as directory:
+        pm = PasswordManager(os.path.join(directory, 'passwords.vault'), os.path.join(directory, 'secret.key'), None)
+        start = time.perf_counter()
+        for i in range(entries):
+            pm.add_password(f"service-{i}", f"user-{i}", f"password-{i}")
+        fill = time.perf_counter() - start
+        print(f"Vault of {entries:,} entries, {operations:,} operations each:")
+        print(f"  filled in {fill:.2f}s ({fill / entries * 1e6:.1f} us per add)")
+
+        pm.close()
+        start = time.perf_counter()
+        pm = PasswordManager(pm.storage_file, pm.key_file, None)
+        print(f"  open (index only)      {(time.perf_counter() - start) * 1e3:9.1f} ms")
+
+        start = time.perf_counter()
+        for i in range(operations):
+            pm.add_password(f"extra-{i}", "user", "password")
+        print(f"  add                    {(time.perf_counter() - start) / operations * 1e6:9.1f} us")
+        start = time.perf_counter()
+        for i in range(operations):
+            pm.get_password(f"service-{i * entries // operations}")
+        print(f"  get                    {(time.perf_counter() - start) / operations * 1e6:9.1f} us")
+        start = time.perf_counter()
+        for i in range(operations):
+            pm.delete_password(f"extra-{i}")
+        print(f"  delete                 {(time.perf_counter() - start) / operations * 1e6:9.1f} us")
+        start = time.perf_counter()
+        pm.compact()
+        print(f"  compact                {(time.perf_counter() - start) * 1e3:9.1f} ms")
+
+        # What every add or delete used to cost: serialize and encrypt all entries
+        passwords = {f"service-{i}": {'username': f"user-{i}", 'password': f"password-{i}"} for i in range(entries)}
+        start = time.perf_counter()
+        with open(os.path.join(directory, 'passwords.json'), 'wb') as file:
+            file.write(pm.cipher.encrypt(json.dumps(passwords).encode()))
+        print(f"  whole-vault save       {(time.perf_counter() - start) * 1e6:9.1f} us")
+        pm.close()
+
+def benchmark_cache(entries=100000, lookups=100000, hot=100):
+    """Time cold start, repeated lookups and listing on a large vault, with and without the entry cache"""
+    with tempfile.TemporaryDirectory() as directory:
+        storage_file, key_file = os.path.join(directory, 'passwords.vault'), os.path.join(directory, 'secret.key')
+        pm = PasswordManager(storage_file, key_file, None)
+        start = time.perf_counter()
+        for i in range(entries):
+            pm.add_password(f"service-{i}", f"user-{i}", f"password-{i}")
+        print(f"Vault of {entries:,} entries (filled in {time.perf_counter() - start:.1f}s):")
+        pm.close()
+        passwords = {f"service-{i}": {'username': f"user-{i}", 'password': f"password-{i}"} for i in range(entries)}
+        legacy = pm.cipher.encrypt(json.dumps(passwords).encode())
+        del passwords
+
+        # Cold start: decrypt everything up front (as before) against indexing the records
+        start = time.perf_counter()
+        passwords = json.loads(pm.cipher.decrypt(legacy))
+        print(f"  cold start, whole vault decrypted    {(time.perf_counter() - start) * 1e3:9.1f} ms "
+              f"({len(passwords):,} plaintext entries in memory)")
+        del passwords, legacy
+        start = time.perf_counter()
+        pm = PasswordManager(storage_file, key_file, None)
+        print(f"  cold start, index only               {(time.perf_counter() - start) * 1e3:9.1f} ms")
+
+        services = [f"service-{i * entries // hot}" for i in range(hot)]
+        for cache_size in (0, pm.cache_size):
+            pm.cache_size = cache_size
+            pm.wipe_cache()
+            start = time.perf_counter()
+            for i in range(lookups):
+                pm.get_password(services[i % hot])
+            print(f"  lookup, {hot} services, cache {cache_size:<4}  {(time.perf_counter() - start) / lookups * 1e6:9.1f} us "
+                  f"({len(pm.cache)} plaintext entries in memory)")
+
+        start = time.perf_counter()
+        pm.list_services()
+        print(f"  list services, no names file         {(time.perf_counter() - start) * 1e3:9.1f} ms")
+        pm.close()
+        pm = PasswordManager(storage_file, key_file, None)
+        start = time.perf_counter()
+        pm.list_services()
+        print(f"  list services, names file            {(time.perf_counter() - start) * 1e3:9.1f} ms")
+        pm.close()
+
+def benchmark_unlock(commands=20, entries=1000):
+    """Time one command (open the vault and look up an entry) with and without an unlock agent"""
+    with tempfile.TemporaryDirectory() as directory:
+        storage_file, key_file = os.path.join(directory, 'passwords.vault'), os.path.join(directory, 'secret.key')
+        master_password = "benchmark master password"
+        pm = PasswordManager(storage_file, key_file, None, master_password=master_password)
+        for i in range(entries):
+            pm.add_password(f"service-{i}", f"user-{i}", f"password-{i}")
+        pm.close()
+        with open(key_file) as file:
+            params = {key: value for key, value in json.load(file).items() if key not in ('salt', 'key')}
+        print(f"One command on a vault of {entries:,} entries, {params}, {commands} commands each:")
+
+        start = time.perf_counter()
+        for i in range(commands):
+            pm = PasswordManager(storage_file, key_file, None, master_password=master_password)
+            pm.get_password(f"service-{i}")
+            pm.close()
+        print(f"  master password, in process      {(time.perf_counter() - start) / commands * 1e3:8.2f} ms")
+
+        start_agent(key_file, pm.key)
+        socket_path = agent_socket_path(key_file)
+        try:
+            start = time.perf_counter()
+            for i in range(commands):
+                pm = PasswordManager(storage_file, key_file, None, key=agent_request(socket_path, b"key"))
+                pm.get_password(f"service-{i}")
+                pm.close()
+            print(f"  unlock agent, in process         {(time.perf_counter() - start) / commands * 1e3:8.2f} ms")
+
+            # A real command also pays for starting Python and importing cryptography
+            command = [sys.executable, os.path.abspath(__file__), "--vault", storage_file, "--key-file", key_file]
+            start = time.perf_counter()
+            for i in range(commands):
+                subprocess.run(command + ["get", f"service-{i}"], check=True, stdout=subprocess.DEVNULL)
+            print(f"  unlock agent, new process        {(time.perf_counter() - start) / commands * 1e3:8.2f} ms")
+        finally:
+            agent_request(socket_path, b"lock")
+
+def main(storage_file='passwords.vault', key_file='secret.key'):
     try:
-        pm = PasswordManager()
+        try:
+            pm = open_manager(storage_file, key_file)
+        except ValueError as e:
+            print(e)
+            return
         while True:
             print("\nPassword Manager")
             print("1. Add Password")
             print("2. Get Password")
             print("3. Delete Password")
             print("4. List Services")
-            print("5. Exit")
+            print("5. Forget Decrypted Passwords")
+            print("6. Exit")
             choice = input("Choose an option: ").strip()
 
             if choice == '1':
@@ -156,11 +723,107 @@ if __name__ == "__main__":
                 else:
                     print("No services stored.")
             elif choice == '5':
+                pm.wipe_cache()
+                print("Decrypted passwords cleared from memory.")
+            elif choice == '6':
                 print("Exiting Password Manager.")
+                pm.close()
                 break
             else:
-                print("Invalid option. Please choose a number between 1 and 5.")
+                print("Invalid option. Please choose a number between 1 and 6.")
     except KeyboardInterrupt:
         print("\nProgram interrupted by user. Exiting.")
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
\ No newline at end of file
+        print(f"An unexpected error occurred: {e}")
+
+def run_cli(argv=None):
+    parser = argparse.ArgumentParser(prog="passwords", description="Password Manager")
+    parser.add_argument("--vault", default="passwords.vault", help="Vault file")
+    parser.add_argument("--key-file", default="secret.key", help="Key file, protected by the master password")
+    commands = parser.add_subparsers(dest="command")
+    add_parser = commands.add_parser("add", help="Add a password (asked for, not echoed)")
+    add_parser.add_argument("service")
+    add_parser.add_argument("username")
+    get_parser = commands.add_parser("get", help="Show the username and password for a service")
+    get_parser.add_argument("service")
+    delete_parser = commands.add_parser("delete", help="Delete the password for a service")
+    delete_parser.add_argument("service")
+    commands.add_parser("list", help="List stored services")
+    unlock_parser = commands.add_parser("unlock", help="Keep the vault unlocked for the following commands")
+    unlock_parser.add_argument("--idle-timeout", type=float, default=AGENT_IDLE_TIMEOUT,
+                               help="Seconds without a command before it locks again")
+    commands.add_parser("lock", help="Stop the unlock agent")
+    passwd_parser = commands.add_parser("passwd", help="Change the master password")
+    passwd_parser.add_argument("--kdf", choices=sorted(KDF_DEFAULTS), default="scrypt")
+    passwd_parser.add_argument("--cost", type=int, help="scrypt n or PBKDF2 iterations (default: "
+                               + ", ".join(f"{kdf} {next(iter(cost.values()))}" for kdf, cost in KDF_DEFAULTS.items()) + ")")
+    agent_parser = commands.add_parser("agent", help="Run the unlock agent, reading the key from stdin (used by unlock)")
+    agent_parser.add_argument("--idle-timeout", type=float, default=AGENT_IDLE_TIMEOUT)
+    vault_parser = commands.add_parser("bench-vault", help="Measure per-entry vault operations")
+    vault_parser.add_argument("--entries", type=int, default=20000)
+    vault_parser.add_argument("--operations", type=int, default=2000)
+    cache_parser = commands.add_parser("bench-cache", help="Measure cold start and repeated lookups on a large vault")
+    cache_parser.add_argument("--entries", type=int, default=100000)
+    cache_parser.add_argument("--lookups", type=int, default=100000)
+    cache_parser.add_argument("--hot", type=int, default=100, help="Number of distinct services looked up")
+    unlock_bench_parser = commands.add_parser("bench-unlock", help="Measure command latency with and without the unlock agent")
+    unlock_bench_parser.add_argument("--commands", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.command in ("agent", "lock", "unlock", "bench-unlock") and not AGENT_SUPPORTED:
+        sys.exit(AGENT_UNSUPPORTED_MESSAGE)
+    if args.command == "agent":
+        run_agent(agent_socket_path(args.key_file), sys.stdin.buffer.read().strip(), args.idle_timeout,
+                  ready=lambda: print("ready", flush=True))
+    elif args.command == "lock":
+        if agent_request(agent_socket_path(args.key_file), b"lock"):
+            print("Vault locked.")
+        else:
+            print("The vault wasn't unlocked.")
+    elif args.command in ("add", "get", "delete", "list", "unlock", "passwd"):
+        try:
+            pm = open_manager(args.vault, args.key_file, use_agent=args.command != "unlock")
+        except ValueError as e:
+            sys.exit(e)
+        try:
+            if args.command == "add":
+                if pm.add_password(args.service, args.username, getpass.getpass("Password: ")):
+                    print(f"Password for {args.service} added successfully.")
+            elif args.command == "get":
+                entry = pm.get_password(args.service)
+                if entry:
+                    print(f"Service: {args.service}, Username: {entry['username']}, Password: {entry['password']}")
+                else:
+                    sys.exit(f"No entry found for {args.service}.")
+            elif args.command == "delete":
+                if pm.delete_password(args.service):
+                    print(f"Password for {args.service} deleted successfully.")
+                else:
+                    sys.exit(f"No entry found for {args.service}.")
+            elif args.command == "list":
+                for service in pm.list_services():
+                    print(service)
+            elif args.command == "unlock":
+                agent_request(agent_socket_path(args.key_file), b"lock")  # Replace an agent already running
+                start_agent(args.key_file, pm.key, args.idle_timeout)
+                print(f"Vault unlocked until {args.idle_timeout / 60:.3g} minutes pass without a command.")
+            elif args.command == "passwd":
+                cost = {}
+                if args.cost:
+                    cost = {'n': args.cost} if args.kdf == 'scrypt' else {'iterations': args.cost}
+                pm.change_master_password(ask_master_password(None), args.kdf, **cost)
+                print("Master password changed.")
+        finally:
+            pm.close()
+    elif args.command == "bench-unlock":
+        benchmark_unlock(args.commands)
+    elif args.command == "bench-vault":
+        benchmark_vault(args.entries, args.operations)
+    elif args.command == "bench-cache":
+        benchmark_cache(args.entries, args.lookups, args.hot)
+    else:
+        main(args.vault, args.key_file)
+
+
+if __name__ == "__main__":
+    run_cli()
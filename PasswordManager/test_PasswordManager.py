@@ -0,0 +1,107 @@
+import json
+import os
+import socket
+import threading
+
+from cryptography.fernet import Fernet
+
+import PasswordManager as pm_module
+from PasswordManager import PasswordManager
+
+
+def test_legacy_entries_are_not_imported_again_after_they_are_deleted(tmp_path, monkeypatch):
+    monkeypatch.setattr(pm_module, "COMPACT_MIN_DEAD", 2)
+    storage_file, key_file, legacy_file = (str(tmp_path / name) for name in ("passwords.vault", "secret.key", "passwords.json"))
+    key = Fernet.generate_key()
+    with open(key_file, 'wb') as file:
+        file.write(key)
+    services = [f"service-{i}" for i in range(5)]
+    with open(legacy_file, 'wb') as file:
+        file.write(Fernet(key).encrypt(json.dumps({service: {'username': 'user', 'password': 'secret'}
+                                                   for service in services}).encode()))
+
+    pm = PasswordManager(storage_file, key_file, legacy_file)
+    assert sorted(pm.list_services()) == services
+    assert not os.path.exists(legacy_file) and os.path.exists(legacy_file + pm_module.LEGACY_IMPORTED_SUFFIX)
+    for service in services:
+        assert pm.delete_password(service)
+    assert pm.dead == 0  # Compacted down to an empty vault
+    pm.close()
+
+    pm = PasswordManager(storage_file, key_file, legacy_file)
+    assert pm.list_services() == []
+    pm.close()
+
+
+def test_open_manager_skips_the_agent_where_unix_sockets_are_missing(tmp_path, monkeypatch):
+    monkeypatch.setattr(pm_module, "AGENT_SUPPORTED", False)
+    monkeypatch.delattr(os, "getuid")
+    monkeypatch.setattr(pm_module, "ask_master_password", lambda key_file: "master password")
+    key_file = str(tmp_path / "secret.key")
+    PasswordManager(str(tmp_path / "passwords.vault"), key_file, None, master_password="master password").close()
+
+    pm = pm_module.open_manager(str(tmp_path / "passwords.vault"), key_file)
+    assert pm.list_services() == []
+    pm.close()
+
+
+def test_delete_succeeds_when_the_compaction_after_it_fails(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(pm_module, "COMPACT_MIN_DEAD", 2)
+    pm = PasswordManager(str(tmp_path / "passwords.vault"), str(tmp_path / "secret.key"), None)
+    pm.add_password("mail", "ann", "secret")
+
+    def fail():
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pm, "compact", fail)
+    assert pm.delete_password("mail")
+    assert "Error compacting" in capsys.readouterr().out
+    pm.close()
+    pm = PasswordManager(pm.storage_file, pm.key_file, None)
+    assert pm.get_password("mail") is None
+    pm.close()
+
+
+def agent_holding(key, socket_path):
+    """Run an unlock agent holding key in a thread; returns the thread once the agent is listening."""
+    ready = threading.Event()
+    agent = threading.Thread(target=pm_module.run_agent, args=(socket_path, key, 5, ready.set))
+    agent.start()
+    assert ready.wait(5)
+    return agent
+
+
+def test_open_manager_asks_for_the_password_when_the_agent_fails_or_has_the_wrong_key(tmp_path, monkeypatch):
+    runtime_dir = tmp_path / "run"
+    runtime_dir.mkdir(mode=0o700)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(runtime_dir))
+    monkeypatch.setattr(pm_module, "AGENT_REPLY_TIMEOUT", 0.2)
+    prompts = []
+    monkeypatch.setattr(pm_module, "ask_master_password", lambda key_file: prompts.append(key_file) or "master password")
+    storage_file, key_file = str(tmp_path / "passwords.vault"), str(tmp_path / "secret.key")
+    pm = PasswordManager(storage_file, key_file, None, master_password="master password")
+    pm.add_password("mail", "ann", "secret")
+    key = pm.key
+    pm.close()
+    socket_path = pm_module.agent_socket_path(key_file)
+
+    agent = agent_holding(key, socket_path)
+    pm = pm_module.open_manager(storage_file, key_file)
+    assert prompts == [] and pm.get_password("mail")["password"] == "secret"
+    pm.close()
+    pm_module.agent_request(socket_path, b"lock")
+    agent.join()
+
+    agent = agent_holding(Fernet.generate_key(), socket_path)  # e.g. an agent left from a replaced key file
+    pm = pm_module.open_manager(storage_file, key_file)
+    assert prompts == [key_file] and pm.get_password("mail")["password"] == "secret"
+    pm.close()
+    pm_module.agent_request(socket_path, b"lock")
+    agent.join()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as hung:  # Listens but never answers
+        hung.bind(socket_path)
+        hung.listen()
+        pm = pm_module.open_manager(storage_file, key_file)
+    assert prompts == [key_file, key_file]
+    pm.close()